@@ -0,0 +1,171 @@
+import numpy as np
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the on-disk layout changes; older files are ignored and must be rebuilt
+ANN_INDEX_FORMAT_VERSION = 1
+
+
+def shard_index_path(directory: str, subject_id: int) -> str:
+    """File holding the IVF index of one subject shard"""
+    return os.path.join(directory, f"subject_{subject_id}.npz")
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: int = 0,
+    chunk_size: int = 65536
+) -> np.ndarray:
+    """Cluster L2-normalised vectors by cosine similarity and return unit centroids"""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids, chunk_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+
+        # Reseed empty clusters from random points so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+def assign_to_centroids(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Index of the most similar centroid for each vector"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """Inverted-file ANN structure: k-means centroids plus the list each embedding id falls in"""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        ids: np.ndarray,
+        assignments: np.ndarray,
+        model_name: str = "",
+        built_at: float = 0.0
+    ):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        order = np.argsort(ids, kind="stable")
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.assignments = np.asarray(assignments, dtype=np.int32)[order]
+        self.model_name = model_name
+        self.built_at = built_at
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def dimension(self) -> int:
+        return self.centroids.shape[1]
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        n_lists: int,
+        n_iter: int = 20,
+        sample_size: Optional[int] = None,
+        seed: int = 0,
+        model_name: str = ""
+    ) -> "IVFIndex":
+        """Train the coarse quantiser on (a sample of) normalised vectors"""
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if sample_size and len(vectors) > sample_size:
+            sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        centroids = spherical_kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        return cls(centroids, ids, assign_to_centroids(vectors, centroids), model_name, time.time())
+
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """Stored list for each id, or -1 where the id was not part of the build"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        found = self.ids[positions] == ids
+        return np.where(found, self.assignments[positions], -1).astype(np.int32)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Assign new normalised vectors to their nearest list"""
+        return assign_to_centroids(np.asarray(vectors, dtype=np.float32), self.centroids)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Lists to scan for a normalised query, most similar first"""
+        scores = self.centroids @ query
+        nprobe = min(max(nprobe, 1), self.n_lists)
+        lists = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return lists[np.argsort(-scores[lists])]
+
+    def save(self, path: str):
+        """Write the index atomically to a versioned .npz file"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.int32(ANN_INDEX_FORMAT_VERSION),
+                model_name=np.str_(self.model_name),
+                built_at=np.float64(self.built_at),
+                centroids=self.centroids,
+                ids=self.ids,
+                assignments=self.assignments
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dimension: int, model_name: str) -> Optional["IVFIndex"]:
+        """Load a saved index, returning None if it is missing or incompatible"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["format_version"])
+            if version != ANN_INDEX_FORMAT_VERSION:
+                logger.warning(f"Ignoring ANN index {path}: format version {version}, expected {ANN_INDEX_FORMAT_VERSION}")
+                return None
+            saved_model = str(data["model_name"])
+            if saved_model != model_name or data["centroids"].shape[1] != dimension:
+                logger.warning(f"Ignoring ANN index {path}: built for {saved_model}")
+                return None
+            return cls(
+                data["centroids"],
+                data["ids"],
+                data["assignments"],
+                saved_model,
+                float(data["built_at"])
+            )
+
+    def info(self) -> Dict[str, Any]:
+        """Describe the index for logs and health checks"""
+        counts = np.bincount(self.assignments, minlength=self.n_lists) if len(self.assignments) else np.zeros(self.n_lists)
+        return {
+            "format_version": ANN_INDEX_FORMAT_VERSION,
+            "model_name": self.model_name,
+            "built_at": self.built_at,
+            "n_lists": self.n_lists,
+            "vectors": int(len(self.ids)),
+            "max_list_size": int(counts.max()) if len(counts) else 0
+        }
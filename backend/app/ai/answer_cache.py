@@ -0,0 +1,162 @@
+import numpy as np
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from ..core.config import settings
+from .vector_index import normalize_vectors
+
+logger = logging.getLogger(__name__)
+
+
+def context_key(chunk_ids: Sequence[int]) -> str:
+    """Order-independent key of the chunks an answer was grounded on"""
+    return hashlib.blake2b(",".join(map(str, sorted(chunk_ids))).encode("ascii"), digest_size=8).hexdigest()
+
+
+class _Scope:
+    """Fixed-capacity ring of cached answers for one (subject, chat type)"""
+
+    def __init__(self, dimension: int, capacity: int):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        # (context key, index generation, answer, expiry) per slot
+        self.entries: List[Optional[Tuple[str, int, str, float]]] = [None] * capacity
+        self.next_slot = 0
+
+    def slot_for_insert(self) -> Tuple[int, bool]:
+        """Free or expired slot if there is one, else the oldest; returns (slot, evicted a live entry)"""
+        now = time.monotonic()
+        for slot, entry in enumerate(self.entries):
+            if entry is None or entry[3] <= now:
+                return slot, False
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % len(self.entries)
+        return slot, True
+
+
+class SemanticAnswerCache:
+    """Chat answers reused for new questions that mean the same as a cached one.
+
+    Entries are scoped by (subject, chat type). A lookup hits when a cached
+    question's embedding is within the cosine threshold of the new one, the
+    answer was grounded on the same retrieved chunks, and the subject's index
+    generation has not moved since, so new or deleted material invalidates
+    every answer of that subject.
+    """
+
+    def __init__(self, dimension: int, threshold: float = 0.95, ttl: int = 3600, max_entries: int = 512):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._scopes: Dict[Hashable, _Scope] = {}
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.context_mismatches = 0
+        self.stale = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(
+        self,
+        scope: Hashable,
+        vector: np.ndarray,
+        context: str,
+        generation: int
+    ) -> Optional[str]:
+        """Cached answer for a question in scope, or None"""
+        query = normalize_vectors(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                self.misses += 1
+                return None
+
+            scores = entries.vectors @ query
+            now = time.monotonic()
+            mismatched = False
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                entry = entries.entries[slot]
+                if entry is None:
+                    continue
+                cached_context, cached_generation, answer, expires_at = entry
+                if expires_at <= now or cached_generation != generation:
+                    entries.entries[slot] = None
+                    entries.vectors[slot] = 0.0
+                    self.stale += 1
+                    continue
+                if cached_context != context:
+                    mismatched = True
+                    continue
+                self.hits += 1
+                return answer
+
+            self.misses += 1
+            self.context_mismatches += mismatched
+            return None
+
+    def store(
+        self,
+        scope: Hashable,
+        vector: np.ndarray,
+        context: str,
+        generation: int,
+        answer: str,
+        ttl: Optional[int] = None
+    ):
+        """Cache an answer to a question in scope"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            entries = self._scopes.get(scope)
+            if entries is None:
+                entries = self._scopes[scope] = _Scope(self.dimension, self.max_entries)
+            slot, evicted = entries.slot_for_insert()
+            entries.vectors[slot] = normalize_vectors(np.asarray(vector, dtype=np.float32))
+            entries.entries[slot] = (context, generation, answer, time.monotonic() + (ttl or self.ttl))
+            self.stores += 1
+            self.evictions += evicted
+
+    def invalidate(self, subject_id: Optional[int] = None):
+        """Drop the cached answers of one subject (all chat types), or of every subject"""
+        with self._lock:
+            if subject_id is None:
+                self._scopes.clear()
+            else:
+                self._scopes = {
+                    scope: entries for scope, entries in self._scopes.items()
+                    if not (isinstance(scope, tuple) and scope[0] == subject_id)
+                }
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and entry counts for the metrics endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "scopes": len(self._scopes),
+                "entries": sum(
+                    sum(entry is not None for entry in entries.entries) for entries in self._scopes.values()
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "context_mismatches": self.context_mismatches,
+                "stale": self.stale,
+                "stores": self.stores,
+                "evictions": self.evictions
+            }
+
+
+# Global instance
+answer_cache = SemanticAnswerCache(
+    settings.VECTOR_DIMENSION,
+    threshold=settings.ANSWER_CACHE_SIMILARITY,
+    ttl=settings.ANSWER_CACHE_TTL,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+)
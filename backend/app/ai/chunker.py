@@ -0,0 +1,137 @@
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+# A sentence ends after . ! ? or … (plus closing quotes/brackets) followed by
+# whitespace, or at a line break; blank lines end paragraphs.
+BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+|\n+")
+CLOSING_CHARS = "\"'”’)]"
+LAST_SPACE_PATTERN = re.compile(r".*\s", re.DOTALL)
+# Text without sentence or line breaks (e.g. some PDF extractions) is cut at a word boundary past this
+MAX_SENTENCE_CHARS = 8192
+WORD_PATTERN = re.compile(r"\S+\s*")
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def approximate_token_count(text: str) -> int:
+    """Rough token count (words and punctuation) when no tokenizer is available"""
+    return len(APPROX_TOKEN_PATTERN.findall(text))
+
+
+def iter_sentences(
+    pieces: Union[str, Iterable[str]],
+    max_chars: int = MAX_SENTENCE_CHARS
+) -> Iterator[Tuple[int, str]]:
+    """Yield (start offset, sentence) from text that may arrive in pieces.
+
+    Only the unfinished tail of the stream is buffered, and at most
+    max_chars of it, so memory does not grow with the document. Each
+    piece is scanned once: scanning resumes where a boundary left
+    unfinished by the previous piece could start.
+    """
+    if isinstance(pieces, str):
+        pieces = (pieces,)
+
+    buffer = ""
+    offset = 0
+    for piece in pieces:
+        # Closing quotes and whitespace at the end may be the start of a boundary
+        scan = len(buffer)
+        while scan and (buffer[scan - 1].isspace() or buffer[scan - 1] in CLOSING_CHARS):
+            scan -= 1
+        buffer += piece
+        cut = 0
+        for match in BOUNDARY_PATTERN.finditer(buffer, scan):
+            # A boundary touching the end of the buffer may continue in the next piece
+            if match.end() == len(buffer):
+                break
+            yield offset + cut, buffer[cut:match.end()]
+            cut = match.end()
+        while len(buffer) - cut > max_chars:
+            space = LAST_SPACE_PATTERN.match(buffer, cut, cut + max_chars)
+            end = space.end() if space else cut + max_chars
+            yield offset + cut, buffer[cut:end]
+            cut = end
+        buffer = buffer[cut:]
+        offset += cut
+    if buffer:
+        yield offset, buffer
+
+
+class StreamingChunker:
+    """Token-budgeted chunker that packs whole sentences and overlaps by sentences"""
+
+    def __init__(
+        self,
+        max_tokens: int,
+        overlap_tokens: int = 0,
+        count_tokens: Callable[[str], int] = approximate_token_count
+    ):
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.count_tokens = count_tokens
+
+    def _split_long(self, start: int, sentence: str) -> Iterator[Tuple[int, str, int]]:
+        """Break a sentence that alone exceeds the budget at word boundaries"""
+        part = ""
+        part_start = start
+        part_tokens = 0
+        for match in WORD_PATTERN.finditer(sentence):
+            word = match.group()
+            tokens = self.count_tokens(word)
+            if part and part_tokens + tokens > self.max_tokens:
+                yield part_start, part, part_tokens
+                part, part_tokens = "", 0
+                part_start = start + match.start()
+            part += word
+            part_tokens += tokens
+        if part:
+            yield part_start, part, part_tokens
+
+    def _units(self, pieces: Union[str, Iterable[str]]) -> Iterator[Tuple[int, str, int]]:
+        for start, sentence in iter_sentences(pieces):
+            if not sentence.strip():
+                continue
+            tokens = self.count_tokens(sentence)
+            if tokens > self.max_tokens:
+                yield from self._split_long(start, sentence)
+            else:
+                yield start, sentence, tokens
+
+    def chunks(self, pieces: Union[str, Iterable[str]], material_id: int) -> Iterator[Dict[str, Any]]:
+        """Lazily yield chunk dicts (chunk_id, chunk_text, start_pos, end_pos)"""
+        window: List[Tuple[int, str, int]] = []
+        window_tokens = 0
+        index = 0
+
+        for unit in self._units(pieces):
+            if window and window_tokens + unit[2] > self.max_tokens:
+                yield self._make_chunk(window, material_id, index)
+                index += 1
+                # Carry trailing sentences into the next chunk as overlap
+                carried: List[Tuple[int, str, int]] = []
+                carried_tokens = 0
+                for previous in reversed(window):
+                    if carried_tokens + previous[2] > self.overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous[2]
+                while carried and carried_tokens + unit[2] > self.max_tokens:
+                    carried_tokens -= carried.pop(0)[2]
+                window, window_tokens = carried, carried_tokens
+            window.append(unit)
+            window_tokens += unit[2]
+
+        # The window always ends with a unit no chunk has emitted yet
+        if window:
+            yield self._make_chunk(window, material_id, index)
+
+    @staticmethod
+    def _make_chunk(window: List[Tuple[int, str, int]], material_id: int, index: int) -> Dict[str, Any]:
+        start = window[0][0]
+        last_start, last_text, _ = window[-1]
+        return {
+            "chunk_id": f"{material_id}_{index}",
+            "chunk_text": "".join(text for _, text, _ in window).strip(),
+            "start_pos": start,
+            "end_pos": last_start + len(last_text)
+        }
@@ -0,0 +1,168 @@
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Chunks whose character ranges are at most this far apart are joined into one passage
+ADJACENT_GAP = 2
+
+
+def mmr_order(
+    relevance: np.ndarray,
+    similarity: np.ndarray,
+    lambda_: float = 0.7,
+    limit: Optional[int] = None
+) -> List[int]:
+    """Rank candidates by Maximal Marginal Relevance.
+
+    relevance holds query similarity per candidate and similarity the
+    candidate-by-candidate cosine matrix; each step picks the candidate that
+    maximises lambda * relevance - (1 - lambda) * max similarity to the
+    already selected ones.
+    """
+    n = len(relevance)
+    limit = n if limit is None else min(limit, n)
+    if not limit:
+        return []
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    order = []
+    for step in range(limit):
+        if step == 0:
+            scores = relevance.copy()
+        else:
+            scores = lambda_ * relevance - (1.0 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[:, best])
+    return order
+
+
+def join_overlapping(left: str, right: str, overlap: int) -> str:
+    """Concatenate two chunk texts, dropping the characters they share"""
+    if overlap > 0:
+        # Chunk texts are stripped, so the shared run can be a little shorter than the range overlap
+        for k in range(min(overlap, len(left), len(right)), max(overlap - 64, 0), -1):
+            if left.endswith(right[:k]):
+                return left + right[k:]
+    return f"{left} {right}"
+
+
+def _span(chunk: Dict[str, Any]) -> Optional[tuple]:
+    metadata = chunk.get("metadata") or {}
+    start, end = metadata.get("start_pos"), metadata.get("end_pos")
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+def merge_chunks(chunks: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge overlapping or adjacent chunks of the same material into passages"""
+    by_material: Dict[int, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        by_material.setdefault(chunk["material_id"], []).append(chunk)
+
+    passages = []
+    for material_id, material_chunks in by_material.items():
+        positioned = sorted((c for c in material_chunks if _span(c)), key=lambda c: _span(c))
+        passages.extend(
+            {
+                "material_id": material_id,
+                "text": c["chunk_text"],
+                "ids": [c["id"]],
+                "similarity": c.get("similarity"),
+                "rank": c["rank"]
+            }
+            for c in material_chunks if not _span(c)
+        )
+
+        current = None
+        for chunk in positioned:
+            start, end = _span(chunk)
+            if current is not None and start <= current["end_pos"] + ADJACENT_GAP:
+                if end > current["end_pos"]:
+                    current["text"] = join_overlapping(current["text"], chunk["chunk_text"], current["end_pos"] - start)
+                    current["end_pos"] = end
+                current["ids"].append(chunk["id"])
+                current["rank"] = min(current["rank"], chunk["rank"])
+                if chunk.get("similarity") is not None:
+                    current["similarity"] = max(current["similarity"] or -1.0, chunk["similarity"])
+                continue
+            current = {
+                "material_id": material_id,
+                "text": chunk["chunk_text"],
+                "ids": [chunk["id"]],
+                "similarity": chunk.get("similarity"),
+                "rank": chunk["rank"],
+                "start_pos": start,
+                "end_pos": end
+            }
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages
+
+
+class ContextBuilder:
+    """Assemble a token-budgeted, de-duplicated RAG context from retrieved chunks"""
+
+    def __init__(self, count_tokens: Callable[[str], int], max_tokens: int, mmr_lambda: float = 0.7):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+
+    def build(self, query_vector: Optional[np.ndarray], candidates: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Select candidates by MMR and merge them until the token budget is spent.
+
+        candidates are search results carrying an "embedding" vector; passages
+        come back in MMR order, each with merged text and its best similarity.
+        """
+        if not candidates:
+            return []
+
+        matrix = np.vstack([np.asarray(c["embedding"], dtype=np.float32) for c in candidates])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+
+        if query_vector is not None:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            relevance = matrix @ (query_vector / (np.linalg.norm(query_vector) or 1.0))
+        else:
+            # No query vector: keep the retrieval order as relevance
+            relevance = np.linspace(1.0, 0.5, len(candidates), dtype=np.float32)
+        order = mmr_order(relevance, matrix @ matrix.T, self.mmr_lambda)
+
+        selected: List[Dict[str, Any]] = []
+        material_tokens: Dict[int, int] = {}
+        used = 0
+        for rank, position in enumerate(order):
+            candidate = dict(candidates[position], rank=rank)
+            if query_vector is not None:
+                candidate["similarity"] = float(relevance[position])
+            material_id = candidate["material_id"]
+
+            # Only the material the candidate belongs to can change when it is merged in
+            trial = [c for c in selected if c["material_id"] == material_id] + [candidate]
+            tokens = sum(self.count_tokens(p["text"]) for p in merge_chunks(trial))
+            cost = tokens - material_tokens.get(material_id, 0)
+            if used + cost > self.max_tokens:
+                continue
+            selected.append(candidate)
+            material_tokens[material_id] = tokens
+            used += cost
+
+        return merge_chunks(selected)
+
+
+def format_context(passages: Sequence[Dict[str, Any]]) -> str:
+    """Render passages as the context block sent to the LLM"""
+    parts = []
+    for passage in passages:
+        if passage["similarity"] is not None:
+            parts.append(f"[Similarity: {passage['similarity']:.2f}] {passage['text']}")
+        else:
+            parts.append(f"[Keyword match] {passage['text']}")
+    return "\n\n".join(parts)
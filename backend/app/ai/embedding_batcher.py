@@ -0,0 +1,144 @@
+import numpy as np
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..utils.histogram import observe
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets for batch sizes and queue depths
+HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class EmbeddingBatcher:
+    """Micro-batcher that coalesces concurrent single-text encode requests.
+
+    Callers get a future immediately; a single worker thread waits up to
+    max_wait seconds (or until max_batch_size texts are queued), encodes the
+    whole batch with one model call and resolves every future. Sync callers
+    block on embed(), async callers await embed_async().
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005
+    ):
+        self.encode = encode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        self.batch_sizes: Dict[str, int] = {}
+        self.queue_depths: Dict[str, int] = {}
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for the next batch and return a future for its vector"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed one text through the batcher, blocking until its batch is done"""
+        return self.submit(text).result(timeout)
+
+    async def embed_async(self, text: str) -> np.ndarray:
+        """Embed one text through the batcher without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stop(self, timeout: float = 5.0):
+        """Finish queued work and stop the worker thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            depth = self._queue.qsize() + 1
+            batch, stopping = self._collect(first)
+            self._process(batch, depth)
+            if stopping:
+                return
+
+    def _process(self, batch: List[Tuple[str, Future]], depth: int):
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        # Identical texts in one batch (popular questions) are encoded once
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        try:
+            vectors = np.asarray(self.encode(list(unique)), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error encoding batch of {len(batch)} texts: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for text, future in batch:
+            future.set_result(vectors[unique[text]])
+
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            observe(self.batch_sizes, len(batch), HISTOGRAM_BOUNDS)
+            observe(self.queue_depths, depth, HISTOGRAM_BOUNDS)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters and histograms for the metrics endpoint"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_size_histogram": dict(self.batch_sizes),
+                "queue_depth_histogram": dict(self.queue_depths)
+            }
@@ -0,0 +1,54 @@
+import numpy as np
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any, Iterable, Optional, Sequence, Union
+
+# Storage formats for MaterialEmbedding.embedding. Rows whose embedding_dtype is
+# NULL still hold the legacy JSON text and are decoded with json.loads.
+STORAGE_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+def get_storage_dtype(name: str) -> np.dtype:
+    """Resolve a storage dtype name to a little-endian NumPy dtype"""
+    try:
+        return STORAGE_DTYPES[name]
+    except KeyError:
+        raise ValueError(f"Unsupported embedding storage dtype: {name}")
+
+
+def encode_embedding(vector: Union[Sequence[float], np.ndarray], dtype: str = "float32") -> bytes:
+    """Pack an embedding vector into raw little-endian bytes"""
+    return np.asarray(vector, dtype=get_storage_dtype(dtype)).tobytes()
+
+
+def decode_embedding(value: Any, dtype: Optional[str]) -> np.ndarray:
+    """Unpack a stored embedding (binary or legacy JSON) into a float32 vector"""
+    if dtype is None:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value).decode("utf-8")
+        return np.asarray(json.loads(value), dtype=np.float32)
+    return np.frombuffer(value, dtype=get_storage_dtype(dtype)).astype(np.float32)
+
+
+def decode_embedding_matrix(values: Iterable[Any], dtype: str, dimension: int) -> np.ndarray:
+    """Unpack many same-format binary embeddings with a single frombuffer call"""
+    buffer = b"".join(bytes(value) for value in values)
+    matrix = np.frombuffer(buffer, dtype=get_storage_dtype(dtype))
+    return matrix.reshape(-1, dimension).astype(np.float32)
+
+
+def chunk_content_hash(text: str, model_name: str) -> str:
+    """Key of a chunk's embedding: blake2b of the model name and NFC, whitespace-collapsed text"""
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.blake2b(f"{model_name}\x00{normalized}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def embedding_nbytes(dimension: int, dtype: str = "float32") -> int:
+    """Size in bytes of one stored embedding"""
+    return dimension * get_storage_dtype(dtype).itemsize
+
@@ -0,0 +1,206 @@
+import numpy as np
+import json
+import logging
+import queue
+import socket
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Wire format shared by EmbeddingClient and app.workers.embedding_server.
+#
+# Request:  header <4sBI> (magic, op, text count), then per text <I> byte length + UTF-8 bytes
+# Response: header <4sBI> (magic, status, payload length), then the payload:
+#   OP_ENCODE ok -> <II> (rows, dimension) + little-endian float32 matrix
+#   OP_INFO ok   -> UTF-8 JSON object
+#   error        -> UTF-8 message
+PROTOCOL_MAGIC = b"EMB1"
+HEADER = struct.Struct("<4sBI")
+LENGTH = struct.Struct("<I")
+SHAPE = struct.Struct("<II")
+
+OP_ENCODE = 1
+OP_INFO = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+MAX_TEXTS_PER_REQUEST = 4096
+MAX_TEXT_BYTES = 1 << 20
+
+
+class EmbeddingServerError(Exception):
+    """Raised when the embedding server is unreachable or returns an error"""
+
+
+class EmbeddingModelMismatch(RuntimeError):
+    """Raised when the embedding server serves a different model than this process expects.
+
+    Deliberately not an EmbeddingServerError: vectors from another model must
+    never be mixed into the index, so callers should not quietly fall back.
+    """
+
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    """Read exactly size bytes or raise ConnectionError on EOF"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return bytes(buffer)
+
+
+def encode_request(op: int, texts: Sequence[str] = ()) -> bytes:
+    parts = [HEADER.pack(PROTOCOL_MAGIC, op, len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def read_request(sock: socket.socket) -> Tuple[int, List[str]]:
+    magic, op, count = HEADER.unpack(recv_exact(sock, HEADER.size))
+    if magic != PROTOCOL_MAGIC:
+        raise ValueError("Bad protocol magic")
+    if count > MAX_TEXTS_PER_REQUEST:
+        raise ValueError(f"Too many texts in one request: {count}")
+    texts = []
+    for _ in range(count):
+        (size,) = LENGTH.unpack(recv_exact(sock, LENGTH.size))
+        if size > MAX_TEXT_BYTES:
+            raise ValueError(f"Text too large: {size} bytes")
+        texts.append(recv_exact(sock, size).decode("utf-8"))
+    return op, texts
+
+
+def encode_response(status: int, payload: bytes) -> bytes:
+    return HEADER.pack(PROTOCOL_MAGIC, status, len(payload)) + payload
+
+
+def encode_matrix(matrix: np.ndarray) -> bytes:
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    return SHAPE.pack(*matrix.shape) + matrix.tobytes()
+
+
+def read_response(sock: socket.socket) -> Tuple[int, bytes]:
+    magic, status, size = HEADER.unpack(recv_exact(sock, HEADER.size))
+    if magic != PROTOCOL_MAGIC:
+        raise ValueError("Bad protocol magic")
+    return status, recv_exact(sock, size)
+
+
+class EmbeddingClient:
+    """Client for the shared embedding server, keeping a small pool of socket connections.
+
+    When expected_model/expected_dimension are given, the first connection
+    checks them against the server's info() and raises EmbeddingModelMismatch
+    if they differ.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        timeout: float = 30.0,
+        pool_size: int = 8,
+        expected_model: Optional[str] = None,
+        expected_dimension: Optional[int] = None
+    ):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.expected_model = expected_model
+        self.expected_dimension = expected_dimension
+        self._verified = expected_model is None and expected_dimension is None
+        self._pool: "queue.LifoQueue[socket.socket]" = queue.LifoQueue(maxsize=pool_size)
+        # At most pool_size requests in flight, so callers queue here instead of flooding the server
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _verify(self, sock: socket.socket):
+        sock.sendall(encode_request(OP_INFO))
+        status, payload = read_response(sock)
+        if status != STATUS_OK:
+            raise EmbeddingServerError(payload.decode("utf-8", "replace"))
+        info = json.loads(payload.decode("utf-8"))
+        model, dimension = info.get("model"), info.get("dimension")
+        if (
+            (self.expected_model is not None and model != self.expected_model)
+            or (self.expected_dimension is not None and dimension != self.expected_dimension)
+        ):
+            sock.close()
+            message = (
+                f"Embedding server at {self.socket_path} serves {model} ({dimension} dims), "
+                f"expected {self.expected_model} ({self.expected_dimension} dims)"
+            )
+            logger.error(message)
+            raise EmbeddingModelMismatch(message)
+        self._verified = True
+
+    def _call(self, request: bytes) -> bytes:
+        with self._slots:
+            return self._call_pooled(request)
+
+    def _call_pooled(self, request: bytes) -> bytes:
+        try:
+            sock = self._pool.get_nowait()
+        except queue.Empty:
+            sock = None
+
+        try:
+            if sock is None:
+                sock = self._connect()
+                if not self._verified:
+                    self._verify(sock)
+            sock.sendall(request)
+            status, payload = read_response(sock)
+        except (OSError, ValueError, struct.error) as e:
+            if sock is not None:
+                sock.close()
+            raise EmbeddingServerError(f"Embedding server at {self.socket_path} failed: {e}") from e
+
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+        if status != STATUS_OK:
+            raise EmbeddingServerError(payload.decode("utf-8", "replace"))
+        return payload
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts on the server, returning a float32 matrix"""
+        vectors = []
+        for start in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            payload = self._call(encode_request(OP_ENCODE, texts[start:start + MAX_TEXTS_PER_REQUEST]))
+            rows, dimension = SHAPE.unpack_from(payload)
+            vectors.append(np.frombuffer(payload, dtype="<f4", offset=SHAPE.size).reshape(rows, dimension))
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def info(self) -> Dict[str, Any]:
+        """Model name, dimension and max sequence length served by the server"""
+        return json.loads(self._call(encode_request(OP_INFO)).decode("utf-8"))
+
+    def close(self):
+        """Close pooled connections"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
@@ -0,0 +1,279 @@
+import asyncio
+import json
+import logging
+import time
+import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional
+from ..utils.histogram import observe
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (milliseconds) of the queue-wait and request-latency histogram buckets
+LATENCY_BOUNDS_MS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _remaining(deadline: float) -> float:
+    return max(deadline - time.monotonic(), 0.0)
+
+
+class GeminiError(Exception):
+    """Raised when the Gemini API fails, times out or rejects a request"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def response_text(payload: Dict[str, Any]) -> str:
+    """Text of the first candidate of a generateContent response"""
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def is_blocked(payload: Dict[str, Any]) -> bool:
+    return bool((payload.get("promptFeedback") or {}).get("blockReason"))
+
+
+class GeminiTransport:
+    """Async Gemini REST client sharing one pooled HTTP connection pool per process.
+
+    Calls pass a global and a per-model semaphore before a connection is
+    used, so a burst of chat requests queues here (with the wait measured)
+    instead of opening unbounded connections or exceeding the upstream
+    quota. The timeout of a call covers its queue wait and the request.
+    A missing API key fails each call with GeminiError, not construction,
+    so an unconfigured server still starts and reports itself unhealthy.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta",
+        max_concurrency: int = 32,
+        max_concurrency_per_model: int = 16,
+        timeout: float = 60.0
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_concurrency_per_model = max(1, max_concurrency_per_model)
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        self._model_slots: Dict[str, asyncio.Semaphore] = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.queued = 0
+        self.in_flight: Dict[str, int] = {}
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_times: Dict[str, int] = {}
+        self.latencies: Dict[str, int] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared HTTP client, created on first use inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=10.0)
+            )
+        return self._client
+
+    def _slots(self, model: str) -> List[asyncio.Semaphore]:
+        if self._global_slots is None:
+            self._global_slots = asyncio.Semaphore(self.max_concurrency)
+        slots = self._model_slots.get(model)
+        if slots is None:
+            slots = self._model_slots[model] = asyncio.Semaphore(self.max_concurrency_per_model)
+        return [self._global_slots, slots]
+
+    async def _acquire(self, model: str) -> List[asyncio.Semaphore]:
+        """Wait for a global and a per-model slot, recording how long that took"""
+        started = time.perf_counter()
+        self.queued += 1
+        acquired = []
+        try:
+            for slots in self._slots(model):
+                await slots.acquire()
+                acquired.append(slots)
+        except BaseException:
+            for slots in acquired:
+                slots.release()
+            raise
+        finally:
+            self.queued -= 1
+
+        wait = time.perf_counter() - started
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        observe(self.wait_times, wait * 1000, LATENCY_BOUNDS_MS, "ms")
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        return acquired
+
+    def _release(self, model: str, acquired: List[asyncio.Semaphore], started: float, failed: bool):
+        for slots in acquired:
+            slots.release()
+        self.in_flight[model] -= 1
+        self.requests += 1
+        self.errors += failed
+        observe(self.latencies, (time.perf_counter() - started) * 1000, LATENCY_BOUNDS_MS, "ms")
+
+    def _check_key(self):
+        if not self.api_key:
+            raise GeminiError("GEMINI_API_KEY is not set; configure it or use LLM_PROVIDER=fake")
+
+    @staticmethod
+    def _body(prompt: str, safety_settings: Optional[List[Dict[str, str]]], generation_config: Optional[Dict[str, Any]]):
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if safety_settings:
+            body["safetySettings"] = safety_settings
+        if generation_config:
+            body["generationConfig"] = generation_config
+        return body
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, model: str, body: bytes):
+        if response.status_code >= 400:
+            detail = body[:500].decode("utf-8", "replace")
+            raise GeminiError(f"Gemini {model} returned {response.status_code}: {detail}", response.status_code)
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Call generateContent and return the decoded response"""
+        self._check_key()
+        try:
+            return await asyncio.wait_for(
+                self._generate(model, prompt, safety_settings, generation_config),
+                timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise GeminiError(f"Gemini {model} call timed out after {timeout or self.timeout}s")
+
+    async def _generate(self, model, prompt, safety_settings, generation_config) -> Dict[str, Any]:
+        acquired = await self._acquire(model)
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = await self.client.post(
+                f"/models/{model}:generateContent",
+                json=self._body(prompt, safety_settings, generation_config)
+            )
+            self._raise_for_status(response, model, response.content)
+            payload = response.json()
+            failed = False
+            return payload
+        except httpx.HTTPError as e:
+            raise GeminiError(f"Gemini {model} request failed: {e}") from e
+        finally:
+            self._release(model, acquired, started, failed)
+
+    async def stream(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Call streamGenerateContent and yield each decoded server-sent event.
+
+        One deadline of `timeout` seconds covers the wait for a slot, the
+        response headers and the first event; after that each read has the
+        same timeout. Closing the generator early cancels the upstream request.
+        """
+        self._check_key()
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        try:
+            acquired = await asyncio.wait_for(self._acquire(model), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise GeminiError(f"Gemini {model} call timed out waiting for a slot")
+
+        started = time.perf_counter()
+        failed = True
+        response = None
+        try:
+            request = self.client.build_request(
+                "POST",
+                f"/models/{model}:streamGenerateContent",
+                params={"alt": "sse"},
+                json=self._body(prompt, safety_settings, generation_config),
+                timeout=httpx.Timeout(timeout, connect=10.0)
+            )
+            response = await asyncio.wait_for(self.client.send(request, stream=True), _remaining(deadline))
+            if response.status_code >= 400:
+                self._raise_for_status(response, model, await response.aread())
+            lines = response.aiter_lines()
+            waiting_for_first = True
+            while True:
+                try:
+                    if waiting_for_first:
+                        line = await asyncio.wait_for(lines.__anext__(), _remaining(deadline))
+                    else:
+                        line = await lines.__anext__()
+                except StopAsyncIteration:
+                    break
+                if line.startswith("data:"):
+                    waiting_for_first = False
+                    yield json.loads(line[5:])
+            failed = False
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise GeminiError(f"Gemini {model} sent no event within {timeout}s")
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer went away (client disconnect); not an upstream failure
+            failed = False
+            raise
+        except httpx.TimeoutException as e:
+            self.timeouts += 1
+            raise GeminiError(f"Gemini {model} stream timed out: {e}") from e
+        except httpx.HTTPError as e:
+            raise GeminiError(f"Gemini {model} stream failed: {e}") from e
+        finally:
+            if response is not None:
+                await response.aclose()
+            self._release(model, acquired, started, failed)
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Concurrency, queue-wait and latency figures for the metrics endpoint"""
+        acquired = sum(self.wait_times.values())
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_concurrency_per_model": self.max_concurrency_per_model,
+            "queued": self.queued,
+            "in_flight": dict(self.in_flight),
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": self.total_wait / acquired * 1000 if acquired else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "wait_histogram": dict(self.wait_times),
+            "latency_histogram": dict(self.latencies)
+        }
@@ -0,0 +1,138 @@
+import numpy as np
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Flat snapshot of the vector index, memory-mapped read-only by every worker on a node.
+#
+# Layout (little-endian): header, then each array starting on a 64-byte boundary:
+#   float32 matrix (rows x dimension, L2-normalised), int64 ids, int64 material_ids, int64 subject_ids
+# Rows are sorted by subject (and by IVF list within a subject when an ANN index
+# was attached at export time), so every shard is a contiguous, zero-copy slice.
+INDEX_FILE_MAGIC = b"RAGIDX\x00\x00"
+INDEX_FILE_FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQd")  # magic, format, dimension, rows, version, high_water_id, created_at
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(rows: int, dimension: int):
+    """Byte offsets of the matrix and the three id arrays, plus the total file size"""
+    matrix = _align(HEADER.size)
+    ids = _align(matrix + rows * dimension * 4)
+    material_ids = _align(ids + rows * 8)
+    subject_ids = _align(material_ids + rows * 8)
+    return matrix, ids, material_ids, subject_ids, subject_ids + rows * 8
+
+
+def write_index_file(
+    path: str,
+    matrix: np.ndarray,
+    ids: np.ndarray,
+    material_ids: np.ndarray,
+    subject_ids: np.ndarray,
+    high_water_id: int,
+    version: Optional[int] = None
+) -> int:
+    """Write a snapshot next to path and atomically rename it into place; returns its version"""
+    rows, dimension = matrix.shape
+    version = version or time.time_ns()
+    offsets = _layout(rows, dimension)
+    arrays = (
+        np.ascontiguousarray(matrix, dtype="<f4"),
+        np.ascontiguousarray(ids, dtype="<i8"),
+        np.ascontiguousarray(material_ids, dtype="<i8"),
+        np.ascontiguousarray(subject_ids, dtype="<i8")
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(
+                INDEX_FILE_MAGIC, INDEX_FILE_FORMAT_VERSION, dimension, rows, version, high_water_id, time.time()
+            ))
+            for offset, array in zip(offsets, arrays):
+                f.write(b"\x00" * (offset - f.tell()))
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # Readers keep their old mapping (and its inode) until they remap, so they never see a torn file
+    os.replace(tmp_path, path)
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return version
+
+
+def read_index_version(path: str) -> Optional[int]:
+    """Version in the header of the current snapshot, or None if there is no usable file"""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    magic, file_format, _, _, version, _, _ = HEADER.unpack(header)
+    if magic != INDEX_FILE_MAGIC or file_format != INDEX_FILE_FORMAT_VERSION:
+        return None
+    return version
+
+
+class MappedIndexFile:
+    """Read-only memory map of a vector index snapshot; arrays are views into the page cache"""
+
+    def __init__(self, path: str, mapping: mmap.mmap):
+        self.path = path
+        self._mapping = mapping
+        magic, file_format, dimension, rows, version, high_water_id, created_at = HEADER.unpack_from(mapping)
+        if magic != INDEX_FILE_MAGIC or file_format != INDEX_FILE_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a vector index file of format {INDEX_FILE_FORMAT_VERSION}")
+        matrix, ids, material_ids, subject_ids, size = _layout(rows, dimension)
+        if len(mapping) < size:
+            raise ValueError(f"{path} is truncated: {len(mapping)} of {size} bytes")
+
+        self.dimension = dimension
+        self.rows = rows
+        self.version = version
+        self.high_water_id = high_water_id
+        self.created_at = created_at
+        self.matrix = np.frombuffer(mapping, dtype="<f4", count=rows * dimension, offset=matrix).reshape(rows, dimension)
+        self.ids = np.frombuffer(mapping, dtype="<i8", count=rows, offset=ids)
+        self.material_ids = np.frombuffer(mapping, dtype="<i8", count=rows, offset=material_ids)
+        self.subject_ids = np.frombuffer(mapping, dtype="<i8", count=rows, offset=subject_ids)
+
+    @classmethod
+    def open(cls, path: str, dimension: int) -> Optional["MappedIndexFile"]:
+        """Map a snapshot, returning None if it is missing or built for another dimension"""
+        try:
+            with open(path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot map vector index file {path}: {e}")
+            return None
+        try:
+            index_file = cls(path, mapping)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Ignoring vector index file {path}: {e}")
+            return None
+        if index_file.dimension != dimension:
+            logger.warning(f"Ignoring vector index file {path}: dimension {index_file.dimension}, expected {dimension}")
+            return None
+        return index_file
@@ -0,0 +1,309 @@
+import numpy as np
+import logging
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from unidecode import unidecode
+from sqlalchemy.orm import Session
+from ..models.content import Material, MaterialEmbedding
+from .vector_index import served_embeddings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def fold_accents(token: str) -> str:
+    """Strip Vietnamese diacritics (including đ -> d) from a token"""
+    return unidecode(token)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased NFC word tokens (letters and digits, so course codes survive)"""
+    return TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).casefold())
+
+
+def index_terms(text: str) -> List[str]:
+    """Terms stored for a document.
+
+    Every token is stored accent-folded (prefixed with ~); tokens with
+    diacritics are also stored as typed. query_terms only looks up the raw
+    form of accented tokens, so raw ASCII postings would never be read.
+    """
+    terms = []
+    for token in tokenize(text):
+        folded = fold_accents(token)
+        if folded != token:
+            terms.append(token)
+        terms.append(f"~{folded}")
+    return terms
+
+
+def query_terms(text: str) -> List[str]:
+    """Terms looked up for a query.
+
+    Tokens typed with diacritics match exactly; tokens typed without any
+    match the folded form, so "chu nghia duy vat" finds "chủ nghĩa duy vật".
+    """
+    terms = []
+    for token in tokenize(text):
+        folded = fold_accents(token)
+        terms.append(token if folded != token else f"~{token}")
+    return terms
+
+
+class _Postings:
+    """Compact postings list: parallel doc-number and term-frequency arrays"""
+
+    __slots__ = ("docs", "freqs")
+
+    def __init__(self):
+        self.docs = array("I")
+        self.freqs = array("H")
+
+
+class LexicalIndex:
+    """Incremental BM25 inverted index over chunk texts.
+
+    Documents are numbered densely; postings hold doc numbers as array('I')
+    and term frequencies as array('H'), and per-document data lives in
+    typed arrays, so memory stays close to the size of the postings alone.
+    Removed documents are tombstoned and dropped by compact().
+
+    NumPy views over those arrays only live inside helpers called with the
+    lock held: array and bytearray raise BufferError when appended to while
+    a view is exported.
+    """
+
+    # Everything _reset replaces; load_from_db swaps these in from a freshly built index
+    _STATE = (
+        "_terms", "_doc_ids", "_doc_materials", "_doc_subjects", "_doc_lengths",
+        "_alive", "_live_count", "_live_length", "high_water_id"
+    )
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.high_water_id = 0
+        self._terms: Dict[str, _Postings] = {}
+        self._doc_ids = array("q")
+        self._doc_materials = array("q")
+        self._doc_subjects = array("q")
+        self._doc_lengths = array("I")
+        self._alive = bytearray()
+        self._live_count = 0
+        self._live_length = 0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    @property
+    def dead_ratio(self) -> float:
+        total = len(self._doc_ids)
+        return (total - self._live_count) / total if total else 0.0
+
+    def _add_locked(self, embedding_id: int, material_id: int, subject_id: int, text: str):
+        terms = index_terms(text)
+        length = sum(term.startswith("~") for term in terms)  # One folded term per token
+        doc = len(self._doc_ids)
+        self._doc_ids.append(embedding_id)
+        self._doc_materials.append(material_id)
+        self._doc_subjects.append(subject_id)
+        self._doc_lengths.append(length)
+        self._alive.append(1)
+        self._live_count += 1
+        self._live_length += length
+
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            postings = self._terms.get(term)
+            if postings is None:
+                postings = self._terms[term] = _Postings()
+            postings.docs.append(doc)
+            postings.freqs.append(min(count, 65535))
+        self.high_water_id = max(self.high_water_id, embedding_id)
+
+    def add_documents(self, documents: Iterable[Tuple[int, int, int, str]]) -> int:
+        """Index (embedding id, material id, subject id, chunk text) tuples"""
+        added = 0
+        with self._lock:
+            for embedding_id, material_id, subject_id, text in documents:
+                self._add_locked(embedding_id, material_id, subject_id, text)
+                added += 1
+        return added
+
+    def remove_materials(self, material_ids: Sequence[int]):
+        """Tombstone every document of the given materials"""
+        if not len(material_ids):
+            return
+        with self._lock:
+            hits, removed_length = self._find_materials_locked(material_ids)
+            for doc in hits:
+                self._alive[doc] = 0
+            self._live_count -= len(hits)
+            self._live_length -= removed_length
+
+    def _find_materials_locked(self, material_ids: Sequence[int]) -> Tuple[List[int], int]:
+        # Live docs of the materials and their total length; the views are released on return
+        materials = np.frombuffer(self._doc_materials, dtype=np.int64)
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        hits = np.flatnonzero(np.isin(materials, np.asarray(material_ids, dtype=np.int64)) & (alive == 1))
+        return hits.tolist(), int(lengths[hits].sum())
+
+    def load_from_db(self, db: Session, batch_size: int = 1000) -> int:
+        """Build the index from every stored chunk.
+
+        The new index is built on the side and swapped in whole, so searches
+        keep using the old one until it is complete.
+        """
+        fresh = LexicalIndex(self.k1, self.b)
+        count = fresh._load_rows(db, batch_size=batch_size)
+        with self._lock:
+            for name in self._STATE:
+                setattr(self, name, getattr(fresh, name))
+        self.loaded = True
+        logger.info(f"Lexical index loaded with {count} chunks and {len(fresh._terms)} terms")
+        return count
+
+    def refresh_from_db(self, db: Session) -> int:
+        """Index chunks inserted since the last load"""
+        return self._load_rows(db, MaterialEmbedding.id > self.high_water_id)
+
+    def reload_materials(self, db: Session, material_ids: Sequence[int]) -> int:
+        """Re-read the given materials' chunks after they changed in the database"""
+        if not len(material_ids):
+            return 0
+        self.remove_materials(material_ids)
+        return self._load_rows(
+            db,
+            MaterialEmbedding.material_id.in_(list(material_ids)),
+            MaterialEmbedding.id <= self.high_water_id
+        )
+
+    def _load_rows(self, db: Session, *filters, batch_size: int = 1000) -> int:
+        rows = db.query(
+            MaterialEmbedding.id,
+            MaterialEmbedding.material_id,
+            Material.subject_id,
+            MaterialEmbedding.chunk_text
+        ).join(Material, Material.id == MaterialEmbedding.material_id).filter(served_embeddings(), *filters).order_by(
+            MaterialEmbedding.id
+        ).yield_per(batch_size)
+        return self.add_documents(rows)
+
+    def compact(self) -> bool:
+        """Rebuild postings without tombstoned documents"""
+        with self._lock:
+            if self._live_count == len(self._doc_ids):
+                return False
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+            remap = np.full(len(alive), -1, dtype=np.int64)
+            remap[alive] = np.arange(int(alive.sum()))
+
+            terms = {}
+            for term, postings in self._terms.items():
+                docs = np.frombuffer(postings.docs, dtype=np.uint32)
+                keep = alive[docs]
+                if not keep.any():
+                    continue
+                compacted = _Postings()
+                compacted.docs = array("I", remap[docs[keep]].astype(np.uint32).tobytes())
+                compacted.freqs = array("H", np.frombuffer(postings.freqs, dtype=np.uint16)[keep].tobytes())
+                terms[term] = compacted
+
+            def _keep(values: array, typecode: str) -> array:
+                kept = np.frombuffer(values, dtype=np.dtype(typecode))[alive]
+                return array(typecode, kept.tobytes())
+
+            self._terms = terms
+            self._doc_ids = _keep(self._doc_ids, "q")
+            self._doc_materials = _keep(self._doc_materials, "q")
+            self._doc_subjects = _keep(self._doc_subjects, "q")
+            self._doc_lengths = _keep(self._doc_lengths, "I")
+            self._alive = bytearray(b"\x01" * self._live_count)
+        logger.info(f"Lexical index compacted to {self._live_count} chunks")
+        return True
+
+    def search(self, query: str, limit: int = 10, subject_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (embedding id, BM25 score) pairs, best first"""
+        terms = query_terms(query)
+        if not terms or not self._live_count or limit <= 0:
+            return []
+
+        with self._lock:
+            return self._search_locked(terms, limit, subject_id)
+
+    def _search_locked(self, terms: List[str], limit: int, subject_id: Optional[int]) -> List[Tuple[int, float]]:
+        # Only Python values leave this frame, so every view is gone before the lock is released
+        n_docs = self._live_count
+        if not n_docs:
+            return []
+        avg_length = self._live_length / n_docs
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32)
+        alive = np.frombuffer(self._alive, dtype=np.uint8)
+        subjects = np.frombuffer(self._doc_subjects, dtype=np.int64)
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.int64)
+
+        doc_parts = []
+        score_parts = []
+        for term in set(terms):
+            postings = self._terms.get(term)
+            if postings is None:
+                continue
+            docs = np.frombuffer(postings.docs, dtype=np.uint32)
+            freqs = np.frombuffer(postings.freqs, dtype=np.uint16).astype(np.float32)
+            df = len(docs)
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / max(avg_length, 1e-9))
+            doc_parts.append(docs)
+            score_parts.append(idf * freqs * (self.k1 + 1.0) / (freqs + norm))
+
+        if not doc_parts:
+            return []
+        docs = np.concatenate(doc_parts)
+        scores = np.concatenate(score_parts)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=scores).astype(np.float32)
+
+        keep = alive[unique_docs] == 1
+        if subject_id is not None:
+            keep &= subjects[unique_docs] == subject_id
+        unique_docs = unique_docs[keep]
+        totals = totals[keep]
+        if not len(totals):
+            return []
+
+        k = min(limit, len(totals))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top])]
+        return [(int(doc_ids[unique_docs[i]]), float(totals[i])) for i in top]
+
+    def stats(self) -> Dict[str, float]:
+        """Size of the index for health checks"""
+        postings = sum(len(p.docs) for p in self._terms.values())
+        return {
+            "documents": self._live_count,
+            "tombstones": len(self._doc_ids) - self._live_count,
+            "terms": len(self._terms),
+            "postings": postings,
+            "postings_bytes": postings * 6
+        }
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked id lists with RRF: score = sum of 1 / (k + rank)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Optional
+from ..core.config import settings
+from ..utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Parsed results of deterministic generation calls (quiz, debate, Socratic), with optional Redis tier.
+
+    Keys hash the method, its prompt template version, the model and every
+    input, so editing a template (and bumping its version), switching
+    models or changing a material's content all miss instead of serving an
+    answer to a different prompt. Each method has its own TTL. The local tier
+    holds JSON text, so every hit decodes a fresh copy that callers may mutate.
+    """
+
+    def __init__(self, ttls: Dict[str, int], max_size: int = 256, redis_service=None, enabled: bool = True):
+        self.ttls = ttls
+        self.enabled = enabled
+        self.local = LRUCache(max_size=max_size)
+        self.redis = redis_service
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.redis_hits = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def key(method: str, template_version: int, model: str, *inputs: Any) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (method, template_version, model, *inputs):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return f"llm_response:{method}:{digest.hexdigest()}"
+
+    def get(self, method: str, key: str, bypass: bool = False) -> Optional[Any]:
+        """Cached result for key, or None on a miss, when bypassed or when disabled"""
+        if not self.enabled:
+            return None
+        if bypass:
+            self.bypassed += 1
+            return None
+
+        encoded = self.local.get(key)
+        value = json.loads(encoded) if encoded is not None else None
+        if value is None and self.redis is not None:
+            value = self.redis.get_cache(key)
+            if value is not None:
+                self.redis_hits += 1
+                self.local.set(key, json.dumps(value), self.ttls.get(method))
+
+        counts = self.misses if value is None else self.hits
+        counts[method] = counts.get(method, 0) + 1
+        return value
+
+    def set(self, method: str, key: str, value: Any):
+        """Cache a result in every tier for the method's TTL"""
+        if not self.enabled:
+            return
+        ttl = self.ttls.get(method)
+        self.local.set(key, json.dumps(value), ttl)
+        if self.redis is not None:
+            self.redis.set_cache(key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-method hit/miss counters for both tiers"""
+        stats = self.local.stats()
+        stats.update({
+            "enabled": self.enabled,
+            "method_hits": dict(self.hits),
+            "method_misses": dict(self.misses),
+            "bypassed": self.bypassed
+        })
+        if self.redis is not None:
+            stats["redis_hits"] = self.redis_hits
+        return stats
+
+
+def build_llm_response_cache() -> LLMResponseCache:
+    """Response cache configured from settings, sharing Redis when it is reachable"""
+    redis = None
+    if settings.LLM_RESPONSE_CACHE_ENABLED and settings.LLM_RESPONSE_CACHE_REDIS:
+        from ..services.redis_service import redis_service
+        redis = redis_service if redis_service.is_connected() else None
+    return LLMResponseCache(
+        {
+            "quiz": settings.LLM_CACHE_TTL_QUIZ,
+            "debate": settings.LLM_CACHE_TTL_DEBATE,
+            "socratic": settings.LLM_CACHE_TTL_SOCRATIC
+        },
+        max_size=settings.LLM_RESPONSE_CACHE_SIZE,
+        redis_service=redis,
+        enabled=settings.LLM_RESPONSE_CACHE_ENABLED
+    )
@@ -0,0 +1,407 @@
+import google.generativeai as genai
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from ..core.config import settings
+from ..utils.histogram import observe
+from .gemini_transport import LATENCY_BOUNDS_MS, GeminiError, GeminiTransport
+
+logger = logging.getLogger(__name__)
+
+
+class LLMProvider:
+    """Model backend GeminiClient calls through.
+
+    Every method takes a model name and a full prompt and returns (or, when
+    streaming, yields) payloads shaped like a Gemini generateContent
+    response, so response_text and is_blocked read all providers alike.
+    Failures raise GeminiError.
+    """
+
+    name = "base"
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None,
+        generation_config: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def generate_sync(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """Blocking generate for worker jobs and sync endpoints"""
+        raise NotImplementedError
+
+    def stream_sync(
+        self,
+        model: str,
+        prompt: str,
+        safety_settings: Optional[List[Dict[str, str]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def aclose(self):
+        """Release pooled connections"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name}
+
+
+def _text_payload(text: str) -> Dict[str, Any]:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def _blocked_payload(reason: str) -> Dict[str, Any]:
+    return {"promptFeedback": {"blockReason": reason}}
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini: async calls over the pooled REST transport, blocking calls through the SDK"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, transport: GeminiTransport):
+        genai.configure(api_key=api_key)
+        self.api_key = api_key
+        self.transport = transport
+        self._models: Dict[str, Any] = {}
+
+    def _model(self, model: str):
+        if not self.api_key:
+            raise GeminiError("GEMINI_API_KEY is not set; configure it or use LLM_PROVIDER=fake")
+        if model not in self._models:
+            self._models[model] = genai.GenerativeModel(model)
+        return self._models[model]
+
+    @staticmethod
+    def _sdk_payload(response) -> Dict[str, Any]:
+        feedback = response.prompt_feedback
+        if feedback and feedback.block_reason:
+            return _blocked_payload(str(feedback.block_reason))
+        return _text_payload(response.text)
+
+    async def generate(self, model, prompt, safety_settings=None, generation_config=None, timeout=None):
+        return await self.transport.generate(model, prompt, safety_settings, generation_config, timeout)
+
+    def stream(self, model, prompt, safety_settings=None, generation_config=None, timeout=None):
+        return self.transport.stream(model, prompt, safety_settings, generation_config, timeout)
+
+    def generate_sync(self, model, prompt, safety_settings=None):
+        return self._sdk_payload(self._model(model).generate_content(prompt, safety_settings=safety_settings))
+
+    def stream_sync(self, model, prompt, safety_settings=None):
+        response = self._model(model).generate_content(prompt, safety_settings=safety_settings, stream=True)
+        for chunk in response:
+            if chunk.text:
+                yield _text_payload(chunk.text)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name, **self.transport.stats()}
+
+
+# Words the fake model composes its answers from
+FAKE_VOCABULARY = (
+    "the", "a", "of", "and", "to", "in", "is", "that", "this", "concept", "example", "students",
+    "learning", "energy", "function", "process", "system", "model", "value", "result", "because",
+    "therefore", "however", "consider", "question", "answer", "evidence", "theory", "practice",
+    "step", "method", "data", "change", "rate", "structure", "pattern", "cell", "equation", "force"
+)
+
+
+class FakeLLMProvider(LLMProvider):
+    """Offline stand-in for load tests and benchmarks; no network access.
+
+    Answers are derived from a hash of the prompt, so identical prompts get
+    identical text, and GeminiClient's JSON templates (quiz, debate,
+    validation) get JSON its parsers accept. Timing and failures are drawn
+    from a seeded RNG: time to first token follows the configured latency
+    distribution, the rest of the answer arrives at tokens_per_second in
+    chunks of chunk_tokens, and error_rate, timeout_rate and block_rate
+    inject upstream failures, hung calls and blocked prompts.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_distribution: str = "lognormal",
+        latency_ms: float = 800.0,
+        latency_spread: float = 0.5,
+        tokens_per_second: float = 60.0,
+        chunk_tokens: int = 8,
+        response_tokens: int = 200,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        block_rate: float = 0.0,
+        timeout: float = 60.0,
+        seed: int = 0
+    ):
+        if latency_distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_distribution = latency_distribution
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.response_tokens = max(1, response_tokens)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.block_rate = block_rate
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.blocked = 0
+        self.in_flight = 0
+        self.first_token_times: Dict[str, int] = {}
+        self.latencies: Dict[str, int] = {}
+
+    def _first_token_seconds(self) -> float:
+        """Sample the time to first token from the configured distribution"""
+        mean, spread = self.latency_ms, self.latency_spread
+        if self.latency_distribution == "fixed":
+            value = mean
+        elif self.latency_distribution == "uniform":
+            value = self._rng.uniform(mean * (1 - spread), mean * (1 + spread))
+        elif self.latency_distribution == "normal":
+            value = self._rng.gauss(mean, mean * spread)
+        else:
+            # latency_ms is the median, latency_spread the sigma of log(latency)
+            value = self._rng.lognormvariate(math.log(max(mean, 1e-3)), spread)
+        return max(value, 0.0) / 1000
+
+    def _plan(self, timeout: Optional[float]) -> Tuple[float, str]:
+        """Draw one call's time to first token and outcome (ok, error, timeout or blocked)"""
+        with self._lock:
+            first_token = self._first_token_seconds()
+            roll = self._rng.random()
+        if roll < self.error_rate:
+            return first_token, "error"
+        roll -= self.error_rate
+        if roll < self.timeout_rate:
+            # A hung call: nothing arrives before the caller's deadline
+            return (timeout or self.timeout) + 1.0, "timeout"
+        roll -= self.timeout_rate
+        if roll < self.block_rate:
+            return first_token, "blocked"
+        return first_token, "ok"
+
+    def _answer(self, prompt: str) -> str:
+        """Deterministic answer text for a prompt"""
+        rng = random.Random(hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest())
+        words = lambda n: " ".join(rng.choice(FAKE_VOCABULARY) for _ in range(n))
+
+        quiz = re.search(r"Generate (\d+) quiz questions", prompt)
+        if quiz:
+            return json.dumps([
+                {
+                    "question": f"{words(10).capitalize()}?",
+                    "type": "multiple_choice",
+                    "options": [words(3) for _ in range(4)],
+                    "correct_answer": words(3),
+                    "explanation": words(20),
+                    "difficulty": rng.randint(1, 5)
+                }
+                for _ in range(int(quiz.group(1)))
+            ])
+        if "Generate a debate topic" in prompt:
+            return json.dumps({
+                "topic": words(8).capitalize(),
+                "description": words(25),
+                "for_arguments": [words(12) for _ in range(3)],
+                "against_arguments": [words(12) for _ in range(3)],
+                "difficulty": rng.choice(["beginner", "intermediate", "advanced"])
+            })
+        if "Evaluate this AI response" in prompt:
+            return json.dumps({
+                "is_accurate": True,
+                "is_helpful": True,
+                "confidence_score": round(rng.uniform(0.6, 1.0), 2),
+                "issues": [],
+                "suggestions": [words(10)]
+            })
+        if "You are a Socratic teacher" in prompt:
+            return f"{words(15).capitalize()}?"
+
+        tokens = max(1, int(self.response_tokens * rng.uniform(0.5, 1.5)))
+        return f"{words(tokens).capitalize()}."
+
+    def _chunks(self, text: str) -> List[str]:
+        # Words stand in for tokens; each chunk keeps its leading space like the real stream
+        tokens = re.findall(r"\S+\s*", text)
+        return ["".join(tokens[i:i + self.chunk_tokens]) for i in range(0, len(tokens), self.chunk_tokens)]
+
+    def _chunk_seconds(self, chunk: str) -> float:
+        return len(chunk.split()) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _finished(self, started: float, outcome: str, first_token: Optional[float] = None):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += outcome in ("error", "timeout")
+            self.timeouts += outcome == "timeout"
+            self.blocked += outcome == "blocked"
+            if first_token is not None:
+                observe(self.first_token_times, first_token * 1000, LATENCY_BOUNDS_MS, "ms")
+            observe(self.latencies, (time.perf_counter() - started) * 1000, LATENCY_BOUNDS_MS, "ms")
+
+    def _failure(self, model: str, outcome: str, timeout: Optional[float]) -> GeminiError:
+        if outcome == "timeout":
+            return GeminiError(f"Gemini {model} call timed out after {timeout or self.timeout}s")
+        return GeminiError(f"Gemini {model} returned 503: injected failure", 503)
+
+    async def generate(self, model, prompt, safety_settings=None, generation_config=None, timeout=None):
+        timeout = timeout or self.timeout
+        first_token, outcome = self._plan(timeout)
+        text = self._answer(prompt)
+        delay = first_token + sum(self._chunk_seconds(chunk) for chunk in self._chunks(text))
+        started = time.perf_counter()
+        self._started()
+        try:
+            await asyncio.sleep(min(delay, timeout))
+            if delay > timeout:
+                outcome = "timeout"
+            if outcome in ("error", "timeout"):
+                raise self._failure(model, outcome, timeout)
+            return _blocked_payload("SAFETY") if outcome == "blocked" else _text_payload(text)
+        finally:
+            self._finished(started, outcome)
+
+    async def stream(self, model, prompt, safety_settings=None, generation_config=None, timeout=None):
+        timeout = timeout or self.timeout
+        first_token, outcome = self._plan(timeout)
+        chunks = self._chunks(self._answer(prompt))
+        started = time.perf_counter()
+        self._started()
+        sent = False
+        try:
+            # Like the transport, the timeout only bounds the wait for the first event
+            await asyncio.sleep(min(first_token, timeout))
+            if first_token > timeout:
+                outcome = "timeout"
+                raise self._failure(model, outcome, timeout)
+            if outcome == "blocked":
+                yield _blocked_payload("SAFETY")
+                return
+            # Injected errors strike part-way through the answer
+            fail_at = len(chunks)
+            if outcome == "error":
+                with self._lock:
+                    fail_at = self._rng.randrange(len(chunks))
+            for index, chunk in enumerate(chunks):
+                if index == fail_at:
+                    raise self._failure(model, outcome, timeout)
+                if index:
+                    await asyncio.sleep(self._chunk_seconds(chunk))
+                sent = True
+                yield _text_payload(chunk)
+        finally:
+            self._finished(started, outcome, first_token if sent else None)
+
+    def generate_sync(self, model, prompt, safety_settings=None):
+        first_token, outcome = self._plan(self.timeout)
+        text = self._answer(prompt)
+        delay = first_token + sum(self._chunk_seconds(chunk) for chunk in self._chunks(text))
+        started = time.perf_counter()
+        self._started()
+        try:
+            time.sleep(min(delay, self.timeout))
+            if delay > self.timeout:
+                outcome = "timeout"
+            if outcome in ("error", "timeout"):
+                raise self._failure(model, outcome, self.timeout)
+            return _blocked_payload("SAFETY") if outcome == "blocked" else _text_payload(text)
+        finally:
+            self._finished(started, outcome)
+
+    def stream_sync(self, model, prompt, safety_settings=None):
+        # Workers only need the whole answer; chunk cadence is modelled by the async stream
+        payload = self.generate_sync(model, prompt, safety_settings)
+        if "candidates" not in payload:
+            yield payload
+            return
+        for chunk in self._chunks(payload["candidates"][0]["content"]["parts"][0]["text"]):
+            yield _text_payload(chunk)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": self.name,
+                "latency_distribution": self.latency_distribution,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "blocked": self.blocked,
+                "first_token_histogram": dict(self.first_token_times),
+                "latency_histogram": dict(self.latencies)
+            }
+
+
+def build_llm_provider() -> LLMProvider:
+    """Provider selected by LLM_PROVIDER"""
+    if settings.LLM_PROVIDER == "fake":
+        logger.warning("Using the fake LLM provider; responses are synthetic")
+        return FakeLLMProvider(
+            latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_spread=settings.FAKE_LLM_LATENCY_SPREAD,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            chunk_tokens=settings.FAKE_LLM_CHUNK_TOKENS,
+            response_tokens=settings.FAKE_LLM_RESPONSE_TOKENS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            timeout_rate=settings.FAKE_LLM_TIMEOUT_RATE,
+            block_rate=settings.FAKE_LLM_BLOCK_RATE,
+            timeout=settings.GEMINI_TIMEOUT,
+            seed=settings.FAKE_LLM_SEED
+        )
+    if settings.LLM_PROVIDER != "gemini":
+        raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
+
+    # A missing GEMINI_API_KEY fails each call with GeminiError (answered with a fallback), not startup
+    api_key = settings.GEMINI_API_KEY
+    if not api_key:
+        logger.warning("GEMINI_API_KEY is not set; AI features will answer with fallback messages")
+    return GeminiProvider(api_key, GeminiTransport(
+        api_key,
+        base_url=settings.GEMINI_API_BASE,
+        max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+        max_concurrency_per_model=settings.GEMINI_MAX_CONCURRENCY_PER_MODEL,
+        timeout=settings.GEMINI_TIMEOUT
+    ))
@@ -0,0 +1,45 @@
+import numpy as np
+from typing import Optional, Tuple
+
+# In-memory precisions of the vector index main segment
+INDEX_PRECISIONS = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time while scanning a reduced-precision matrix
+SCAN_BLOCK_ROWS = 16384
+
+
+def quantize(matrix: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Convert a normalised float32 matrix to (data, per-dimension scales) in the given precision"""
+    if precision not in INDEX_PRECISIONS:
+        raise ValueError(f"Unsupported index precision: {precision}")
+    if precision == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if precision == "float16":
+        return np.ascontiguousarray(matrix, dtype=np.float16), None
+
+    # Symmetric scalar quantisation: one scale per dimension so narrow dimensions keep their resolution
+    scales = np.abs(matrix).max(axis=0).astype(np.float32) / 127.0 if len(matrix) else np.ones(matrix.shape[1], dtype=np.float32)
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(data: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Approximate float32 rows from quantised data"""
+    if scales is None:
+        return np.asarray(data, dtype=np.float32)
+    return data.astype(np.float32) * scales
+
+
+def scan_scores(data: np.ndarray, query: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Dot products of every row with a float32 query, in cache-sized blocks for reduced precisions"""
+    if scales is not None:
+        # (codes * scales) @ q == codes @ (scales * q), so the scales fold into the query once
+        query = query * scales
+    if data.dtype == np.float32:
+        return data @ query
+    scores = np.empty(len(data), dtype=np.float32)
+    for start in range(0, len(data), SCAN_BLOCK_ROWS):
+        block = data[start:start + SCAN_BLOCK_ROWS]
+        scores[start:start + SCAN_BLOCK_ROWS] = block.astype(np.float32) @ query
+    return scores
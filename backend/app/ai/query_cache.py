@@ -0,0 +1,68 @@
+import numpy as np
+import base64
+import hashlib
+import logging
+import unicodedata
+from typing import Any, Dict, Optional
+from ..utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query: NFC, case-folded, whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+class QueryEmbeddingCache:
+    """LRU of query embeddings keyed on the normalised query, with optional Redis tier"""
+
+    def __init__(self, model_name: str, max_size: int, ttl: int, redis_service=None):
+        self.model_name = model_name
+        self.ttl = ttl
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.redis = redis_service
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+    def _redis_key(self, normalized: str) -> str:
+        digest = hashlib.blake2b(f"{self.model_name}\0{normalized}".encode("utf-8"), digest_size=16).hexdigest()
+        return f"query_embedding:{digest}"
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached float32 embedding for a query, if any"""
+        key = normalize_query(query)
+        vector = self.local.get(key)
+        if vector is not None or self.redis is None:
+            return vector
+
+        cached = self.redis.get_cache(self._redis_key(key))
+        if cached is None:
+            self.redis_misses += 1
+            return None
+        try:
+            vector = np.frombuffer(base64.b64decode(cached), dtype="<f4")
+        except Exception as e:
+            logger.warning(f"Ignoring corrupt cached query embedding: {e}")
+            self.redis_misses += 1
+            return None
+        self.redis_hits += 1
+        self.local.set(key, vector)
+        return vector
+
+    def set(self, query: str, vector: np.ndarray):
+        """Cache the embedding for a query in every tier"""
+        key = normalize_query(query)
+        vector = np.asarray(vector, dtype="<f4")
+        vector.setflags(write=False)
+        self.local.set(key, vector)
+        if self.redis is not None:
+            self.redis.set_cache(self._redis_key(key), base64.b64encode(vector.tobytes()).decode("ascii"), self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for both tiers"""
+        stats = self.local.stats()
+        if self.redis is not None:
+            stats["redis_hits"] = self.redis_hits
+            stats["redis_misses"] = self.redis_misses
+        return stats
@@ -1,105 +1,532 @@
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
-import json
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple, Union
 import logging
+import threading
+import time
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
-from ..models.content import MaterialEmbedding
+from ..models.content import Material, MaterialEmbedding
 from ..core.config import settings
+from .vector_index import ShardedVectorIndex, load_embedding_rows, served_embeddings
+from .ann_index import IVFIndex, shard_index_path
+from .answer_cache import answer_cache
+from .index_file import MappedIndexFile, read_index_version
+from .embedding_codec import chunk_content_hash, decode_embedding, encode_embedding
+from .query_cache import QueryEmbeddingCache
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .chunker import StreamingChunker, approximate_token_count
+from .context_builder import ContextBuilder, format_context
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_remote import EmbeddingClient, EmbeddingServerError
+from ..utils.executor import BoundedExecutor
+from ..utils.process import bytes_to_mb, current_rss_bytes, format_mb, rss_delta
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 logger = logging.getLogger(__name__)
 
 
 class RAGService:
     def __init__(self):
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        if settings.RAG_INDEX_FILE and settings.RAG_INDEX_PRECISION != "float32":
+            raise ValueError(
+                "RAG_INDEX_FILE is mapped as float32 and shared between workers; "
+                f"set RAG_INDEX_PRECISION=float32 (got {settings.RAG_INDEX_PRECISION}) or unset RAG_INDEX_FILE"
+            )
+        # The model is loaded on first use (or by warm_up) so importing this module stays cheap
+        self._embedding_model: Optional["SentenceTransformer"] = None
+        self._model_lock = threading.Lock()
+        self.model_load_seconds: Optional[float] = None
+        self.model_load_rss_bytes: Optional[int] = None
         self.similarity_threshold = settings.SIMILARITY_THRESHOLD
+        self.vector_index = ShardedVectorIndex(
+            settings.VECTOR_DIMENSION,
+            nprobe=settings.RAG_ANN_NPROBE,
+            ann_min_vectors=settings.RAG_ANN_MIN_VECTORS,
+            precision=settings.RAG_INDEX_PRECISION,
+            rescore_candidates=settings.RAG_RESCORE_CANDIDATES
+        )
+        self.lexical_index = LexicalIndex(k1=settings.RAG_BM25_K1, b=settings.RAG_BM25_B)
+        self.query_cache = self._build_query_cache()
+        self.embedding_client = (
+            EmbeddingClient(
+                settings.EMBEDDING_SERVER_SOCKET,
+                timeout=settings.EMBEDDING_SERVER_TIMEOUT,
+                expected_model=settings.EMBEDDING_MODEL,
+                expected_dimension=settings.VECTOR_DIMENSION
+            )
+            if settings.EMBEDDING_SERVER_SOCKET else None
+        )
+        self._remote_retry_at = 0.0
+        self.embedding_batcher = self._build_embedding_batcher()
+        # Blocking search work of the async API runs here, never on the event loop
+        self.executor = BoundedExecutor("rag-search", settings.RAG_EXECUTOR_WORKERS)
+        self._chunker: Optional[StreamingChunker] = None
+        self._count_tokens: Optional[Callable[[str], int]] = None
+        self._index_file_version: Optional[int] = None
+        self._maintenance_thread: Optional[threading.Thread] = None
+        self._maintenance_stop = threading.Event()
+
+    @property
+    def embedding_model(self) -> "SentenceTransformer":
+        """The SentenceTransformer model, loaded once on first access"""
+        model = self._embedding_model
+        if model is None:
+            with self._model_lock:
+                if self._embedding_model is None:
+                    self._embedding_model = self._load_embedding_model()
+                model = self._embedding_model
+        return model
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._embedding_model is not None
+
+    def _load_embedding_model(self) -> "SentenceTransformer":
+        # Importing sentence_transformers pulls in torch, so it is deferred as well
+        started = time.perf_counter()
+        rss_before = current_rss_bytes()
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        self.model_load_seconds = time.perf_counter() - started
+        self.model_load_rss_bytes = rss_delta(rss_before, current_rss_bytes())
+        logger.info(
+            f"Loaded embedding model {settings.EMBEDDING_MODEL} in {self.model_load_seconds:.2f}s "
+            f"(RSS +{format_mb(bytes_to_mb(self.model_load_rss_bytes))})"
+        )
+        return model
+
+    def warm_up(self) -> Dict[str, Any]:
+        """Load the embedding model and run one encode so the first request is not slow"""
+        started = time.perf_counter()
+        if self.embedding_client is not None:
+            try:
+                self.embedding_client.encode(["warm up"])
+                return {"server": self.embedding_client.info(), "warmup_seconds": time.perf_counter() - started}
+            except EmbeddingServerError as e:
+                logger.warning(f"Embedding server unavailable, warming up the local model: {e}")
+        try:
+            self.embedding_model.encode(["warm up"], show_progress_bar=False)
+        except Exception as e:
+            logger.error(f"Error warming up embedding model: {e}")
+        return {
+            "model": settings.EMBEDDING_MODEL,
+            "loaded": self.model_loaded,
+            "load_seconds": self.model_load_seconds,
+            "warmup_seconds": time.perf_counter() - started,
+            "rss_delta_mb": bytes_to_mb(self.model_load_rss_bytes)
+        }
+
+    def _build_embedding_batcher(self) -> Optional[EmbeddingBatcher]:
+        """Coalesce concurrent query embeddings into batched encode calls if enabled"""
+        if not settings.EMBEDDING_MICROBATCH_ENABLED:
+            return None
+        return EmbeddingBatcher(
+            lambda texts: self.generate_embeddings(texts, batch_size=len(texts)),
+            max_batch_size=settings.EMBEDDING_MICROBATCH_MAX_SIZE,
+            max_wait=settings.EMBEDDING_MICROBATCH_WAIT_MS / 1000.0
+        )
+
+    def _build_query_cache(self) -> QueryEmbeddingCache:
+        """Create the query embedding cache, sharing it through Redis if enabled"""
+        redis = None
+        if settings.QUERY_EMBEDDING_CACHE_REDIS:
+            from ..services.redis_service import redis_service
+            redis = redis_service if redis_service.is_connected() else None
+        return QueryEmbeddingCache(
+            settings.EMBEDDING_MODEL,
+            max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            redis_service=redis
+        )
+
+    def load_vector_index(self, db: Session) -> int:
+        """Load all stored embeddings into the in-memory vector index"""
+        try:
+            count = self.load_index_file() if settings.RAG_INDEX_FILE else 0
+            if self.vector_index.loaded:
+                # Rows written after the snapshot was exported become delta segments
+                count += self.vector_index.refresh_from_db(db)
+            else:
+                count = self.vector_index.load_from_db(db)
+            if settings.RAG_ANN_ENABLED:
+                self.load_ann_indexes()
+            if settings.RAG_LEXICAL_ENABLED:
+                self.lexical_index.load_from_db(db)
+            return count
+        except Exception as e:
+            logger.error(f"Error loading vector index: {e}")
+            return 0
+
+    def load_index_file(self, path: Optional[str] = None) -> int:
+        """Map the vector index snapshot written by app.workers.export_vector_index, if present"""
+        path = path or settings.RAG_INDEX_FILE
+        index_file = MappedIndexFile.open(path, settings.VECTOR_DIMENSION)
+        if index_file is None:
+            return 0
+        count = self.vector_index.load_mapped(index_file)
+        self._index_file_version = index_file.version
+        return count
+
+    def _remap_if_changed(self, db: Session) -> bool:
+        """Switch to a newer snapshot after another process renamed it into place"""
+        version = read_index_version(settings.RAG_INDEX_FILE)
+        if version is None or version == self._index_file_version:
+            return False
+        if not self.load_index_file():
+            return False
+        if settings.RAG_ANN_ENABLED:
+            self.load_ann_indexes()
+        self.vector_index.refresh_from_db(db)
+        logger.info(f"Remapped vector index to snapshot version {version}")
+        return True
+
+    def start_index_maintenance(self, session_factory: Callable[[], Session]):
+        """Start the background thread that applies deltas and compacts the index"""
+        if self._maintenance_thread and self._maintenance_thread.is_alive():
+            return
+        self._maintenance_stop.clear()
+        self._maintenance_thread = threading.Thread(
+            target=self._maintain_index,
+            args=(session_factory,),
+            name="rag-index-maintenance",
+            daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def stop_index_maintenance(self, timeout: float = 5.0):
+        """Stop the background maintenance thread"""
+        self._maintenance_stop.set()
+        if self._maintenance_thread:
+            self._maintenance_thread.join(timeout)
+            self._maintenance_thread = None
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.stop(timeout)
+        self.executor.shutdown(wait=False)
+
+    def _maintain_index(self, session_factory: Callable[[], Session]):
+        last_reconcile = time.monotonic()
+        while not self._maintenance_stop.wait(settings.RAG_INDEX_REFRESH_INTERVAL):
+            reconcile = time.monotonic() - last_reconcile >= settings.RAG_INDEX_RECONCILE_INTERVAL
+            try:
+                self.run_index_maintenance(session_factory, reconcile=reconcile)
+                if reconcile:
+                    last_reconcile = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error maintaining vector index: {e}")
+
+    def run_index_maintenance(self, session_factory: Callable[[], Session], reconcile: bool = False) -> Dict[str, Any]:
+        """Poll for new/removed embeddings, then compact if deltas have grown"""
+        db = session_factory()
+        try:
+            remapped = bool(settings.RAG_INDEX_FILE) and self._remap_if_changed(db)
+            if not self.vector_index.loaded:
+                self.vector_index.load_from_db(db)
+            added = self.vector_index.refresh_from_db(db)
+            stale = self.vector_index.reconcile_with_db(db) if reconcile else []
+            if self.lexical_index.loaded:
+                self.lexical_index.refresh_from_db(db)
+                self.lexical_index.reload_materials(db, stale)
+        finally:
+            db.close()
+
+        if self.lexical_index.dead_ratio > settings.RAG_INDEX_COMPACT_DEAD_RATIO:
+            self.lexical_index.compact()
+
+        # A mapped snapshot is compacted by exporting a new file; merging here would copy it into the heap
+        compacted = 0
+        if not settings.RAG_INDEX_FILE:
+            compacted = self.vector_index.compact_due(
+                settings.RAG_INDEX_COMPACT_DELTA_ROWS,
+                settings.RAG_INDEX_COMPACT_DELTA_SEGMENTS,
+                settings.RAG_INDEX_COMPACT_DEAD_RATIO
+            )
+        return {"added": added, "reconciled": len(stale), "compacted": compacted, "remapped": remapped}
+
+    def load_ann_indexes(self, directory: Optional[str] = None) -> int:
+        """Attach the per-subject IVF indexes saved by app.workers.build_ann_index"""
+        directory = directory or settings.RAG_ANN_INDEX_DIR
+        attached = 0
+        for subject_id in list(self.vector_index.shards):
+            path = shard_index_path(directory, subject_id)
+            try:
+                ann = IVFIndex.load(path, settings.VECTOR_DIMENSION, settings.EMBEDDING_MODEL)
+            except Exception as e:
+                logger.error(f"Error loading ANN index {path}: {e}")
+                continue
+            if ann is None:
+                continue
+            self.vector_index.attach_ann(subject_id, ann)
+            attached += 1
+            logger.info(f"ANN index attached for subject {subject_id}: {ann.info()}")
+        return attached
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed a search query, reusing cached vectors for repeated questions"""
+        vector = self.query_cache.get(query)
+        if vector is not None:
+            return vector
+        if self.embedding_batcher is not None:
+            try:
+                vector = self.embedding_batcher.embed(query)
+            except Exception as e:
+                logger.error(f"Error generating embedding: {e}")
+                return None
+        else:
+            embedding = self.generate_embedding(query)
+            if not embedding:
+                return None
+            vector = np.asarray(embedding, dtype=np.float32)
+        self.query_cache.set(query, vector)
+        return vector
+
+    async def embed_query_async(self, query: str) -> Optional[np.ndarray]:
+        """Async embed_query: awaits the micro-batcher instead of blocking a thread"""
+        vector = await self._query_cache_call(self.query_cache.get, query)
+        if vector is not None:
+            return vector
+        if self.embedding_batcher is None:
+            return await self.executor.run(self.embed_query, query)
+        try:
+            vector = await self.embedding_batcher.embed_async(query)
+        except Exception as e:
+            logger.error(f"Error generating embedding: {e}")
+            return None
+        await self._query_cache_call(self.query_cache.set, query, vector)
+        return vector
+
+    async def _query_cache_call(self, func: Callable[..., Any], *args) -> Any:
+        # The Redis tier is a blocking round trip, so it runs on the executor instead of the event loop
+        if self.query_cache.redis is None:
+            return func(*args)
+        return await self.executor.run(func, *args)
 
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text"""
         try:
-            embedding = self.embedding_model.encode(text)
-            return embedding.tolist()
+            return self.generate_embeddings([text])[0].tolist()
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return []
 
+    def _encode_remote(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Encode on the shared embedding server, or None to fall back to the local model"""
+        if self.embedding_client is None or time.monotonic() < self._remote_retry_at:
+            return None
+        try:
+            return self.embedding_client.encode(texts)
+        except EmbeddingServerError as e:
+            # Back off so a dead server does not add a connect timeout to every request
+            self._remote_retry_at = time.monotonic() + settings.EMBEDDING_SERVER_RETRY_SECONDS
+            logger.warning(f"Falling back to in-process embeddings: {e}")
+            return None
+
+    def generate_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Generate embeddings for many texts using the model's native batching"""
+        if not texts:
+            return np.zeros((0, settings.VECTOR_DIMENSION), dtype=np.float32)
+        remote = self._encode_remote(texts)
+        if remote is not None:
+            return remote
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=batch_size or settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
     def search_similar_content(
         self, 
         query: str, 
         db: Session,
         subject_id: Optional[int] = None,
-        limit: int = 5
+        limit: int = 5,
+        mode: Optional[str] = None,
+        include_embeddings: bool = False
     ) -> List[Dict[str, Any]]:
-        """Search for similar content using vector similarity"""
+        """Search for similar content using vector, lexical (BM25) or hybrid retrieval"""
         try:
-            # Generate query embedding
-            query_embedding = self.generate_embedding(query)
-            if not query_embedding:
-                return []
+            mode = mode or settings.RAG_SEARCH_MODE
+            if mode not in ("vector", "lexical", "hybrid"):
+                raise ValueError(f"Unknown search mode: {mode}")
+            if mode != "vector" and not settings.RAG_LEXICAL_ENABLED:
+                mode = "vector"
+            candidates = limit if mode == "vector" else limit * settings.RAG_HYBRID_CANDIDATES
 
-            # Convert to string for database storage
-            query_embedding_str = json.dumps(query_embedding)
+            vector_hits = []
+            if mode != "lexical":
+                # Generate query embedding
+                query_embedding = self.embed_query(query)
+                if query_embedding is None:
+                    return []
 
-            # Build query
-            db_query = db.query(MaterialEmbedding).filter(
-                MaterialEmbedding.material.has(subject_id=subject_id) if subject_id else True
-            )
+                if not self.vector_index.loaded:
+                    self.load_vector_index(db)
+
+                vector_hits = self.vector_index.search(
+                    query_embedding,
+                    limit=candidates,
+                    subject_id=subject_id,
+                    threshold=self.similarity_threshold,
+                    rescore=lambda ids: self._load_exact_vectors(db, ids)
+                )
+
+            lexical_hits = []
+            if mode != "vector":
+                if not self.lexical_index.loaded:
+                    self.lexical_index.load_from_db(db)
+                lexical_hits = self.lexical_index.search(query, candidates, subject_id)
+
+            if mode == "hybrid":
+                ranked = reciprocal_rank_fusion(
+                    [[embedding_id for embedding_id, _ in vector_hits], [embedding_id for embedding_id, _ in lexical_hits]],
+                    k=settings.RAG_RRF_K
+                )[:limit]
+            else:
+                ranked = (vector_hits or lexical_hits)[:limit]
+            if not ranked:
+                return []
+
+            similarities = dict(vector_hits)
+            bm25_scores = dict(lexical_hits)
+            records = {
+                record.id: record
+                for record in db.query(MaterialEmbedding).filter(
+                    MaterialEmbedding.id.in_([embedding_id for embedding_id, _ in ranked])
+                )
+            }
 
-            # Calculate similarity for each embedding
             results = []
-            for embedding_record in db_query.limit(limit * 2):  # Get more to filter by similarity
-                try:
-                    stored_embedding = json.loads(embedding_record.embedding)
-                    similarity = self._calculate_cosine_similarity(query_embedding, stored_embedding)
-                    
-                    if similarity >= self.similarity_threshold:
-                        results.append({
-                            "id": embedding_record.id,
-                            "material_id": embedding_record.material_id,
-                            "chunk_text": embedding_record.chunk_text,
-                            "similarity": similarity,
-                            "metadata": embedding_record.metadata
-                        })
-                except Exception as e:
-                    logger.warning(f"Error processing embedding {embedding_record.id}: {e}")
+            for embedding_id, score in ranked:
+                record = records.get(embedding_id)
+                if record is None:
                     continue
+                result = {
+                    "id": record.id,
+                    "material_id": record.material_id,
+                    "chunk_text": record.chunk_text,
+                    "similarity": similarities.get(embedding_id),
+                    "bm25": bm25_scores.get(embedding_id),
+                    "score": score,
+                    "metadata": record.metadata_
+                }
+                if include_embeddings:
+                    result["embedding"] = decode_embedding(record.embedding, record.embedding_dtype)
+                results.append(result)
 
-            # Sort by similarity and return top results
-            results.sort(key=lambda x: x["similarity"], reverse=True)
-            return results[:limit]
+            return results
 
         except Exception as e:
             logger.error(f"Error searching similar content: {e}")
             return []
 
+    async def asearch_similar_content(
+        self,
+        query: str,
+        db: Session,
+        subject_id: Optional[int] = None,
+        limit: int = 5,
+        mode: Optional[str] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Async search_similar_content for async endpoints.
+
+        The query is embedded through the micro-batcher without holding a
+        thread; the index scan and database reads then run on the bounded
+        executor, where embed_query is answered from the query cache.
+        """
+        if (mode or settings.RAG_SEARCH_MODE) != "lexical" and await self.embed_query_async(query) is None:
+            return []
+        return await self.executor.run(
+            self.search_similar_content, query, db, subject_id, limit, mode, include_embeddings
+        )
+
+    def _load_exact_vectors(self, db: Session, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Full-precision vectors of candidate ids, used to rescore a quantised index"""
+        matrix, found_ids, _, _ = load_embedding_rows(
+            db, settings.VECTOR_DIMENSION, MaterialEmbedding.id.in_(ids.tolist())
+        )
+        return found_ids, matrix
+
     def get_relevant_context(
         self, 
         query: str, 
         db: Session,
         subject_id: Optional[int] = None,
-        max_context_length: int = 2000
+        max_context_tokens: Optional[int] = None,
+        mode: Optional[str] = None
     ) -> str:
-        """Get relevant context for RAG"""
+        """Get relevant context for RAG.
+
+        Candidates are re-ranked with MMR for diversity, overlapping chunks of
+        the same material are merged, and the result is budgeted in model tokens.
+        """
+        return self.retrieve_context(query, db, subject_id, max_context_tokens, mode)[0]
+
+    def retrieve_context(
+        self,
+        query: str,
+        db: Session,
+        subject_id: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[str, List[int]]:
+        """get_relevant_context that also returns the ids of the chunks the context was built from"""
         try:
-            similar_content = self.search_similar_content(query, db, subject_id, limit=10)
-            
-            context_parts = []
-            current_length = 0
-            
-            for content in similar_content:
-                chunk_text = content["chunk_text"]
-                if current_length + len(chunk_text) <= max_context_length:
-                    context_parts.append(f"[Similarity: {content['similarity']:.2f}] {chunk_text}")
-                    current_length += len(chunk_text)
-                else:
-                    break
-            
-            return "\n\n".join(context_parts)
+            candidates = self.search_similar_content(
+                query,
+                db,
+                subject_id,
+                limit=settings.RAG_CONTEXT_CANDIDATES,
+                mode=mode,
+                include_embeddings=True
+            )
+            if not candidates:
+                return "", []
+
+            builder = ContextBuilder(
+                self.count_tokens,
+                max_context_tokens or settings.RAG_CONTEXT_MAX_TOKENS,
+                settings.RAG_MMR_LAMBDA
+            )
+            passages = builder.build(self.embed_query(query), candidates)
+            return format_context(passages), sorted(chunk_id for passage in passages for chunk_id in passage["ids"])
             
         except Exception as e:
             logger.error(f"Error getting relevant context: {e}")
-            return ""
+            return "", []
+
+    async def aget_relevant_context(
+        self,
+        query: str,
+        db: Session,
+        subject_id: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        mode: Optional[str] = None
+    ) -> str:
+        """Async get_relevant_context: embeds without blocking, builds the context on the executor"""
+        return (await self.aretrieve_context(query, db, subject_id, max_context_tokens, mode))[0]
+
+    async def aretrieve_context(
+        self,
+        query: str,
+        db: Session,
+        subject_id: Optional[int] = None,
+        max_context_tokens: Optional[int] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[str, List[int]]:
+        """Async retrieve_context"""
+        try:
+            await self.embed_query_async(query)
+            return await self.executor.run(
+                self.retrieve_context, query, db, subject_id, max_context_tokens, mode
+            )
+        except Exception as e:
+            logger.error(f"Error getting relevant context: {e}")
+            return "", []
 
     def _calculate_cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -120,80 +547,317 @@ class RAGService:
             logger.error(f"Error calculating cosine similarity: {e}")
             return 0.0
 
+    def _load_tokenizer(self) -> Any:
+        """Tokenizer of the embedding model, without loading its weights when a server does the encoding"""
+        if self.embedding_client is None or self.model_loaded:
+            return getattr(self.embedding_model, "tokenizer", None)
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(settings.EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer for {settings.EMBEDDING_MODEL}, approximating tokens: {e}")
+            return None
+
+    def _max_seq_length(self) -> int:
+        if self.embedding_client is not None and not self.model_loaded:
+            try:
+                return self.embedding_client.info().get("max_seq_length") or 256
+            except EmbeddingServerError:
+                pass
+        return getattr(self.embedding_model, "max_seq_length", None) or 256
+
+    def count_tokens(self, text: str) -> int:
+        """Number of embedding-model tokens in text (approximate without a tokenizer)"""
+        if self._count_tokens is None:
+            tokenizer = self._load_tokenizer()
+            if tokenizer is not None:
+                self._count_tokens = lambda value: len(tokenizer.tokenize(value))
+            else:
+                self._count_tokens = approximate_token_count
+        return self._count_tokens(text)
+
+    def _get_chunker(self) -> StreamingChunker:
+        """Chunker whose token budget matches the embedding model's max sequence length"""
+        if self._chunker is None:
+            max_tokens = settings.RAG_CHUNK_MAX_TOKENS
+            if not max_tokens:
+                # Leave room for the [CLS] and [SEP] tokens the model adds
+                max_tokens = self._max_seq_length() - 2
+            self._chunker = StreamingChunker(max_tokens, settings.RAG_CHUNK_OVERLAP_TOKENS, self.count_tokens)
+        return self._chunker
+
+    def iter_material_chunks(
+        self,
+        material_content: Union[str, Iterable[str]],
+        material_id: int
+    ) -> Iterator[Dict[str, Any]]:
+        """Lazily chunk material content, which may be a string or a stream of text pieces"""
+        return self._get_chunker().chunks(material_content, material_id)
+
     def process_material_for_embedding(
         self, 
-        material_content: str, 
-        material_id: int,
-        chunk_size: int = 500,
-        overlap: int = 50
+        material_content: Union[str, Iterable[str]], 
+        material_id: int
     ) -> List[Dict[str, Any]]:
         """Process material content into chunks for embedding"""
         try:
-            # Simple text chunking (can be improved with more sophisticated methods)
-            chunks = []
-            start = 0
-            
-            while start < len(material_content):
-                end = start + chunk_size
-                chunk = material_content[start:end]
-                
-                # Try to break at sentence boundary
-                if end < len(material_content):
-                    last_period = chunk.rfind('.')
-                    if last_period > chunk_size * 0.7:  # If period is in last 30%
-                        chunk = chunk[:last_period + 1]
-                        end = start + last_period + 1
-                
-                chunks.append({
-                    "chunk_id": f"{material_id}_{len(chunks)}",
-                    "chunk_text": chunk.strip(),
-                    "start_pos": start,
-                    "end_pos": end
-                })
-                
-                start = end - overlap
-                
-            return chunks
-            
+            return list(self.iter_material_chunks(material_content, material_id))
         except Exception as e:
             logger.error(f"Error processing material for embedding: {e}")
             return []
 
     def create_embeddings_for_material(
         self, 
-        material_content: str, 
+        material_content: Union[str, Iterable[str]], 
         material_id: int,
         db: Session
     ) -> bool:
         """Create and store embeddings for material content"""
+        return self.create_embeddings_for_materials([(material_id, material_content)], db) is not None
+
+    def create_embeddings_for_materials(
+        self,
+        materials: Iterable[Tuple[int, Union[str, Iterable[str]]]],
+        db: Session,
+        batch_size: Optional[int] = None
+    ) -> Optional[Dict[int, int]]:
+        """Chunk, embed and bulk-store several materials in shared encode batches.
+
+        Chunks are produced lazily and encoded as soon as a batch fills, so
+        streamed content is embedded while it is still being read. Chunks are
+        keyed by content hash: when a material is reprocessed, unchanged
+        chunks keep their rows, vectors of known text are copied instead of
+        re-encoded, and the material's stale chunks are deleted in one pass.
+        """
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        counts: Dict[int, int] = {}
+        indexed = []
+        pending = []
+        kept_updates = []
+        stale_ids: List[int] = []
+        resynced: List[int] = []
+
         try:
-            # Process material into chunks
-            chunks = self.process_material_for_embedding(material_content, material_id)
-            
-            # Generate embeddings for each chunk
-            for chunk in chunks:
-                embedding = self.generate_embedding(chunk["chunk_text"])
-                if embedding:
-                    embedding_record = MaterialEmbedding(
-                        material_id=material_id,
-                        chunk_id=chunk["chunk_id"],
-                        chunk_text=chunk["chunk_text"],
-                        embedding=json.dumps(embedding),
-                        metadata={
-                            "start_pos": chunk["start_pos"],
-                            "end_pos": chunk["end_pos"]
-                        }
-                    )
-                    db.add(embedding_record)
+            for material_id, material_content in materials:
+                counts.setdefault(material_id, 0)
+                existing = self._existing_chunks_by_hash(db, material_id)
+                if existing:
+                    resynced.append(material_id)
+
+                for chunk in self.iter_material_chunks(material_content, material_id):
+                    if not chunk["chunk_text"]:
+                        continue
+                    chunk["content_hash"] = chunk_content_hash(chunk["chunk_text"], settings.EMBEDDING_MODEL)
+                    counts[material_id] += 1
+
+                    # Unchanged chunk: keep its row, only its id and position may have moved
+                    rows = existing.get(chunk["content_hash"])
+                    if rows:
+                        kept_updates.append({
+                            "id": rows.pop(),
+                            "chunk_id": chunk["chunk_id"],
+                            "content_hash": chunk["content_hash"],
+                            "metadata_": {"start_pos": chunk["start_pos"], "end_pos": chunk["end_pos"]}
+                        })
+                        continue
+
+                    pending.append((material_id, chunk))
+                    if len(pending) >= batch_size:
+                        indexed.append(self._store_chunk_batch(pending, db, batch_size))
+                        pending = []
+                stale_ids.extend(row_id for rows in existing.values() for row_id in rows)
+            if pending:
+                indexed.append(self._store_chunk_batch(pending, db, batch_size))
+
+            if kept_updates:
+                db.execute(update(MaterialEmbedding), kept_updates)
+            for start in range(0, len(stale_ids), 1000):
+                db.execute(delete(MaterialEmbedding).where(MaterialEmbedding.id.in_(stale_ids[start:start + 1000])))
+            db.commit()
+            if indexed or stale_ids:
+                self._invalidate_answers(db, counts)
+
+            encoded = sum(len(batch[0]) for batch in indexed)
+            if resynced:
+                logger.info(
+                    f"Re-indexed materials {resynced}: {len(kept_updates)} chunks unchanged, "
+                    f"{encoded} stored, {len(stale_ids)} stale removed"
+                )
+
+            # Make the new chunks searchable without reloading the whole index
+            if (self.vector_index.loaded or self.lexical_index.loaded) and (indexed or resynced):
+                self._index_stored_chunks(db, counts, indexed, resynced)
+            return counts
             
+        except Exception as e:
+            logger.error(f"Error creating embeddings for materials: {e}")
+            db.rollback()
+            return None
+
+    def _existing_chunks_by_hash(self, db: Session, material_id: int) -> Dict[Optional[str], List[int]]:
+        """Stored chunk ids of a material grouped by content hash.
+
+        Rows stored before hashing are grouped under None, so they never match
+        a new chunk (their vectors may come from another model) and are
+        deleted as stale when the material is reprocessed.
+        """
+        existing: Dict[Optional[str], List[int]] = {}
+        rows = db.query(MaterialEmbedding.id, MaterialEmbedding.content_hash).filter(
+            MaterialEmbedding.material_id == material_id, served_embeddings()
+        ).order_by(MaterialEmbedding.id.desc())
+        for row_id, content_hash in rows:
+            existing.setdefault(content_hash, []).append(row_id)
+        return existing
+
+    def _index_stored_chunks(
+        self,
+        db: Session,
+        counts: Dict[int, int],
+        indexed: List[Tuple[List[int], List[int], np.ndarray, List[str]]],
+        resynced: List[int]
+    ):
+        subjects = dict(
+            db.query(Material.id, Material.subject_id).filter(Material.id.in_(list(counts)))
+        )
+        resynced_set = set(resynced)
+        for ids, material_ids, vectors, texts in indexed:
+            keep = [i for i, material_id in enumerate(material_ids) if material_id not in resynced_set]
+            if not keep:
+                continue
+            ids = [ids[i] for i in keep]
+            material_ids = [material_ids[i] for i in keep]
+            subject_ids = [subjects[material_id] for material_id in material_ids]
+            if self.vector_index.loaded:
+                self.vector_index.add(ids, material_ids, subject_ids, vectors[keep])
+            if self.lexical_index.loaded:
+                self.lexical_index.add_documents(zip(ids, material_ids, subject_ids, [texts[i] for i in keep]))
+
+        # Re-indexed materials mix kept and new rows, so they are swapped in whole
+        if resynced:
+            if self.vector_index.loaded:
+                self.vector_index.remove_materials(resynced)
+                matrix, ids, material_ids, subject_ids = load_embedding_rows(
+                    db, settings.VECTOR_DIMENSION, MaterialEmbedding.material_id.in_(resynced)
+                )
+                self.vector_index.add(ids, material_ids, subject_ids, matrix)
+            if self.lexical_index.loaded:
+                self.lexical_index.remove_materials(resynced)
+                self.lexical_index.add_documents(
+                    db.query(
+                        MaterialEmbedding.id,
+                        MaterialEmbedding.material_id,
+                        Material.subject_id,
+                        MaterialEmbedding.chunk_text
+                    ).join(Material, Material.id == MaterialEmbedding.material_id).filter(
+                        MaterialEmbedding.material_id.in_(resynced), served_embeddings()
+                    ).order_by(MaterialEmbedding.id)
+                )
+
+    def delete_embeddings_for_material(self, material_id: int, db: Session) -> bool:
+        """Delete stored embeddings of a material and tombstone them in the index"""
+        try:
+            db.query(MaterialEmbedding).filter(
+                MaterialEmbedding.material_id == material_id
+            ).delete(synchronize_session=False)
             db.commit()
+            self._invalidate_answers(db, [material_id])
+            self.vector_index.remove_material(material_id)
+            self.lexical_index.remove_materials([material_id])
             return True
-            
         except Exception as e:
-            logger.error(f"Error creating embeddings for material: {e}")
+            logger.error(f"Error deleting embeddings for material {material_id}: {e}")
             db.rollback()
             return False
 
+    @staticmethod
+    def _invalidate_answers(db: Session, material_ids: Iterable[int]):
+        """Drop cached chat answers of the subjects whose material changed.
+
+        Only reaches this process's cache; API workers also miss once their
+        maintenance thread applies the change and bumps the shard generation.
+        """
+        subject_ids = db.scalars(select(Material.subject_id).where(Material.id.in_(list(material_ids)))).all()
+        for subject_id in set(subject_ids):
+            if subject_id is not None:
+                answer_cache.invalidate(subject_id)
+
+    def _store_chunk_batch(
+        self,
+        batch: List[Tuple[int, Dict[str, Any]]],
+        db: Session,
+        batch_size: int
+    ) -> Tuple[List[int], List[int], np.ndarray, List[str]]:
+        """Encode one batch of chunks and write it with a single bulk insert"""
+        vectors, rows = self.embed_chunk_batch(batch, db, batch_size)
+        ids = db.scalars(
+            insert(MaterialEmbedding).returning(MaterialEmbedding.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        return list(ids), [material_id for material_id, _ in batch], vectors, [row["chunk_text"] for row in rows]
+
+    def embed_chunk_batch(
+        self,
+        batch: List[Tuple[int, Dict[str, Any]]],
+        db: Session,
+        batch_size: Optional[int] = None,
+        index_version: Optional[int] = None
+    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """Embed (material_id, chunk) pairs, returning their vectors and MaterialEmbedding rows to insert.
+
+        Chunks whose content hash is already stored in the same index version
+        (for any material) reuse that row's vector instead of being encoded again.
+        """
+        texts = [chunk["chunk_text"] for _, chunk in batch]
+        index_version = index_version or settings.RAG_INDEX_VERSION
+        known = self._stored_vectors_by_hash(db, {chunk["content_hash"] for _, chunk in batch}, index_version)
+        missing = [i for i, (_, chunk) in enumerate(batch) if chunk["content_hash"] not in known]
+
+        vectors = np.zeros((len(batch), settings.VECTOR_DIMENSION), dtype=np.float32)
+        if missing:
+            vectors[missing] = self.generate_embeddings([texts[i] for i in missing], batch_size)
+        dtype = settings.EMBEDDING_STORAGE_DTYPE
+        rows = []
+        for i, (material_id, chunk) in enumerate(batch):
+            stored = known.get(chunk["content_hash"])
+            if stored is not None:
+                embedding, embedding_dtype = stored
+                vectors[i] = decode_embedding(embedding, embedding_dtype)
+            else:
+                embedding, embedding_dtype = encode_embedding(vectors[i], dtype), dtype
+            rows.append({
+                "material_id": material_id,
+                "chunk_id": chunk["chunk_id"],
+                "chunk_text": chunk["chunk_text"],
+                "content_hash": chunk["content_hash"],
+                "index_version": index_version,
+                "embedding": embedding,
+                "embedding_dtype": embedding_dtype,
+                "metadata_": {
+                    "start_pos": chunk["start_pos"],
+                    "end_pos": chunk["end_pos"]
+                }
+            })
+        return vectors, rows
+
+    def _stored_vectors_by_hash(
+        self,
+        db: Session,
+        hashes: Iterable[str],
+        index_version: int
+    ) -> Dict[str, Tuple[bytes, str]]:
+        """Packed vectors already stored in index_version for the given content hashes"""
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        rows = db.query(
+            MaterialEmbedding.content_hash, MaterialEmbedding.embedding, MaterialEmbedding.embedding_dtype
+        ).filter(
+            MaterialEmbedding.content_hash.in_(hashes),
+            MaterialEmbedding.embedding_dtype.isnot(None),
+            served_embeddings(index_version)
+        )
+        return {content_hash: (embedding, dtype) for content_hash, embedding, dtype in rows}
+
 
 # Global instance
 rag_service = RAGService()
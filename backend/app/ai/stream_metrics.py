@@ -0,0 +1,75 @@
+import threading
+from typing import Any, Dict
+from ..utils.histogram import observe
+
+# Upper bounds (milliseconds) of the first-token and total-duration histogram buckets
+LATENCY_BOUNDS_MS = (100, 250, 500, 1000, 2000, 3000, 5000, 10000, 30000, 60000)
+
+
+class StreamMetrics:
+    """Time to first token and outcome counters of streamed chat responses"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.started = 0
+        self.completed = 0
+        self.disconnected = 0
+        self.failed = 0
+        self.active = 0
+        self.chunks = 0
+        self.total_first_token = 0.0
+        self.first_tokens = 0
+        self.max_first_token = 0.0
+        self.first_token_times: Dict[str, int] = {}
+        self.durations: Dict[str, int] = {}
+
+    def stream_started(self):
+        with self._lock:
+            self.started += 1
+            self.active += 1
+
+    def first_token(self, seconds: float):
+        """Record the delay between the request arriving and its first chunk being sent"""
+        with self._lock:
+            self.first_tokens += 1
+            self.total_first_token += seconds
+            self.max_first_token = max(self.max_first_token, seconds)
+            observe(self.first_token_times, seconds * 1000, LATENCY_BOUNDS_MS, "ms")
+
+    def stream_finished(self, seconds: float, chunks: int, outcome: str):
+        """Record a stream that completed, failed or lost its client"""
+        with self._lock:
+            self.active -= 1
+            self.chunks += chunks
+            if outcome == "completed":
+                self.completed += 1
+            elif outcome == "disconnected":
+                self.disconnected += 1
+            else:
+                self.failed += 1
+            observe(self.durations, seconds * 1000, LATENCY_BOUNDS_MS, "ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """First-token latency and outcome counters for the metrics endpoint"""
+        with self._lock:
+            return {
+                "started": self.started,
+                "active": self.active,
+                "completed": self.completed,
+                "disconnected": self.disconnected,
+                "failed": self.failed,
+                "chunks": self.chunks,
+                "avg_first_token_ms": (
+                    self.total_first_token / self.first_tokens * 1000 if self.first_tokens else 0.0
+                ),
+                "max_first_token_ms": self.max_first_token * 1000,
+                "first_token_histogram": dict(self.first_token_times),
+                "duration_histogram": dict(self.durations)
+            }
+
+
+# Global instance
+stream_metrics = StreamMetrics()
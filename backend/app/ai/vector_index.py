@@ -0,0 +1,769 @@
+import numpy as np
+import itertools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.content import Material, MaterialEmbedding
+from .embedding_codec import decode_embedding, decode_embedding_matrix, embedding_nbytes
+from .ann_index import IVFIndex
+from .index_file import MappedIndexFile
+from .quantization import dequantize, quantize, scan_scores
+
+logger = logging.getLogger(__name__)
+
+# Loads float32 vectors for candidate ids from storage: returns (found ids, matrix)
+Rescorer = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+# Process-wide, so a replaced shard never repeats a generation of the one it replaced
+_generations = itertools.count(1)
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise rows of a float32 matrix (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        norm = np.linalg.norm(vectors)
+        return vectors / norm if norm > 0 else vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best `limit` (id, score) pairs, sorted by descending score"""
+    if len(scores) > limit:
+        keep = np.argpartition(-scores, limit - 1)[:limit]
+        ids, scores = ids[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+def served_embeddings(index_version: Optional[int] = None):
+    """Filter selecting embedding rows of the index version being served"""
+    return MaterialEmbedding.index_version == (index_version or settings.RAG_INDEX_VERSION)
+
+
+def load_embedding_rows(
+    db: Session,
+    dimension: int,
+    *filters,
+    batch_size: int = 1000,
+    index_version: Optional[int] = None
+) -> Tuple[np.ndarray, ...]:
+    """Read (matrix, ids, material_ids, subject_ids) for embeddings of one index version matching filters"""
+    # Binary rows are grouped by dtype and unpacked with one frombuffer call;
+    # rows still holding legacy JSON are parsed one by one.
+    blobs = {}
+    legacy = []
+
+    rows = db.query(
+        MaterialEmbedding.id,
+        MaterialEmbedding.material_id,
+        Material.subject_id,
+        MaterialEmbedding.embedding,
+        MaterialEmbedding.embedding_dtype
+    ).join(Material, Material.id == MaterialEmbedding.material_id).filter(
+        served_embeddings(index_version), *filters
+    ).yield_per(batch_size)
+
+    for row_id, material_id, subject_id, embedding, dtype in rows:
+        if dtype is None:
+            legacy.append((row_id, material_id, subject_id, embedding))
+            continue
+        try:
+            expected = embedding_nbytes(dimension, dtype)
+        except ValueError as e:
+            logger.warning(f"Skipping embedding {row_id}: {e}")
+            continue
+        if len(embedding) != expected:
+            logger.warning(f"Skipping embedding {row_id} with {len(embedding)} bytes")
+            continue
+        blobs.setdefault(dtype, []).append((row_id, material_id, subject_id, embedding))
+
+    vectors = []
+    ids = []
+    material_ids = []
+    subject_ids = []
+
+    for dtype, group in blobs.items():
+        vectors.append(decode_embedding_matrix([row[3] for row in group], dtype, dimension))
+        ids.extend(row[0] for row in group)
+        material_ids.extend(row[1] for row in group)
+        subject_ids.extend(row[2] for row in group)
+
+    if legacy:
+        logger.warning(f"{len(legacy)} embeddings still stored as JSON; run app.workers.embedding_backfill")
+    for row_id, material_id, subject_id, embedding in legacy:
+        try:
+            vector = decode_embedding(embedding, None)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable embedding {row_id}: {e}")
+            continue
+        if vector.shape != (dimension,):
+            logger.warning(f"Skipping embedding {row_id} with shape {vector.shape}")
+            continue
+        vectors.append(vector.reshape(1, -1))
+        ids.append(row_id)
+        material_ids.append(material_id)
+        subject_ids.append(subject_id)
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, dimension), dtype=np.float32)
+    return (
+        normalize_vectors(matrix),
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(material_ids, dtype=np.int64),
+        np.asarray(subject_ids, dtype=np.int64)
+    )
+
+
+class IndexSegment:
+    """Immutable block of normalised vectors with parallel id arrays and a live-row mask.
+
+    With an IVF index the rows are grouped by inverted list, so each probed
+    list is a contiguous slice. Deletions never touch the arrays: they produce
+    a copy of the segment with a new `alive` mask (tombstones).
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        ids: np.ndarray,
+        material_ids: np.ndarray,
+        subject_ids: np.ndarray,
+        ann: Optional[IVFIndex] = None,
+        alive: Optional[np.ndarray] = None,
+        precision: str = "float32",
+        scales: Optional[np.ndarray] = None
+    ):
+        self.ann = ann
+        self.list_offsets = None
+        if ann is not None and len(ids):
+            assignments = ann.lookup(ids)
+            missing = np.flatnonzero(assignments < 0)
+            if len(missing):
+                assignments[missing] = ann.assign(dequantize(matrix[missing], scales))
+            # Rows exported in list order (e.g. a memory-mapped snapshot) are used as-is, without a copy
+            if np.any(assignments[1:] < assignments[:-1]):
+                order = np.argsort(assignments, kind="stable")
+                matrix, ids, material_ids, subject_ids = matrix[order], ids[order], material_ids[order], subject_ids[order]
+                if alive is not None:
+                    alive = alive[order]
+                assignments = assignments[order]
+            self.list_offsets = np.searchsorted(assignments, np.arange(ann.n_lists + 1))
+
+        # Already-quantised data (with its scales) is kept as-is, e.g. when attaching an ANN index
+        if scales is None:
+            matrix, scales = quantize(matrix, precision)
+        self.precision = precision
+        self.matrix = matrix
+        self.scales = scales
+        self.ids = ids
+        self.material_ids = material_ids
+        self.subject_ids = subject_ids
+        self.alive = alive if alive is not None else np.ones(len(ids), dtype=bool)
+        self.dead_count = int(len(ids) - self.alive.sum())
+
+    @property
+    def quantized(self) -> bool:
+        return self.precision != "float32"
+
+    def dense(self, rows=None) -> np.ndarray:
+        """Float32 rows (approximate when quantised)"""
+        data = self.matrix if rows is None else self.matrix[rows]
+        return dequantize(data, self.scales)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls, dimension: int, precision: str = "float32") -> "IndexSegment":
+        return cls(
+            np.zeros((0, dimension), dtype=np.float32),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            precision=precision
+        )
+
+    @classmethod
+    def merge(
+        cls,
+        segments: Sequence["IndexSegment"],
+        ann: Optional[IVFIndex] = None,
+        precision: str = "float32"
+    ) -> "IndexSegment":
+        """Fold segments into one, dropping tombstoned rows"""
+        live = [segment for segment in segments if len(segment)]
+        if not live:
+            return cls.empty(segments[0].matrix.shape[1], precision)
+        return cls(
+            np.vstack([segment.dense(segment.alive) for segment in live]),
+            np.concatenate([segment.ids[segment.alive] for segment in live]),
+            np.concatenate([segment.material_ids[segment.alive] for segment in live]),
+            np.concatenate([segment.subject_ids[segment.alive] for segment in live]),
+            ann,
+            precision=precision
+        )
+
+    def without_materials(self, material_ids: Sequence[int]) -> "IndexSegment":
+        """Copy of this segment with the given materials' rows tombstoned"""
+        hit = np.isin(self.material_ids, np.asarray(material_ids, dtype=np.int64)) & self.alive
+        if not hit.any():
+            return self
+        segment = object.__new__(IndexSegment)
+        segment.__dict__.update(self.__dict__)
+        segment.alive = self.alive & ~hit
+        segment.dead_count = int(len(self.ids) - segment.alive.sum())
+        return segment
+
+    def search(
+        self,
+        query: np.ndarray,
+        limit: int,
+        subject_id: Optional[int] = None,
+        threshold: Optional[float] = None,
+        nprobe: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top `limit` (ids, scores) for a normalised query within this segment"""
+        if not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self.list_offsets is not None and nprobe > 0:
+            lists = self.ann.probe(query, nprobe)
+            candidates = np.concatenate([np.arange(self.list_offsets[l], self.list_offsets[l + 1]) for l in lists])
+            if subject_id is not None:
+                candidates = candidates[self.subject_ids[candidates] == subject_id]
+            if self.dead_count:
+                candidates = candidates[self.alive[candidates]]
+            scores = scan_scores(self.matrix[candidates], query, self.scales)
+        else:
+            scores = scan_scores(self.matrix, query, self.scales)
+            if subject_id is not None or self.dead_count:
+                mask = self.alive if subject_id is None else self.alive & (self.subject_ids == subject_id)
+                candidates = np.flatnonzero(mask)
+                scores = scores[candidates]
+            else:
+                candidates = np.arange(len(self.ids))
+
+        if threshold is not None:
+            above = scores >= threshold
+            candidates = candidates[above]
+            scores = scores[above]
+        return top_k(self.ids[candidates], scores, limit)
+
+
+class _SyncedIndex:
+    """Database synchronisation shared by the single and sharded indexes.
+
+    Subclasses provide `dimension`, `high_water_id`, `segments`, `add` and
+    `remove_materials`.
+    """
+
+    def refresh_from_db(self, db: Session) -> int:
+        """Pick up embeddings inserted by other processes since the last load"""
+        matrix, ids, material_ids, subject_ids = load_embedding_rows(
+            db, self.dimension, MaterialEmbedding.id > self.high_water_id
+        )
+        if len(ids):
+            self.add(ids, material_ids, subject_ids, matrix)
+        return len(ids)
+
+    def reconcile_with_db(self, db: Session) -> List[int]:
+        """Reload materials whose stored embeddings no longer match the index; returns their ids"""
+        stored: Dict[int, int] = dict(
+            db.query(MaterialEmbedding.material_id, func.count(MaterialEmbedding.id))
+            .filter(served_embeddings(), MaterialEmbedding.id <= self.high_water_id)
+            .group_by(MaterialEmbedding.material_id)
+            .all()
+        )
+        indexed: Dict[int, int] = {}
+        for segment in self.segments:
+            materials, counts = np.unique(segment.material_ids[segment.alive], return_counts=True)
+            for material_id, count in zip(materials.tolist(), counts.tolist()):
+                indexed[material_id] = indexed.get(material_id, 0) + count
+
+        stale = [
+            material_id for material_id in set(stored) | set(indexed)
+            if stored.get(material_id) != indexed.get(material_id)
+        ]
+        if not stale:
+            return []
+
+        self.remove_materials(stale)
+        matrix, ids, material_ids, subject_ids = load_embedding_rows(
+            db,
+            self.dimension,
+            MaterialEmbedding.material_id.in_(stale),
+            MaterialEmbedding.id <= self.high_water_id
+        )
+        if len(ids):
+            self.add(ids, material_ids, subject_ids, matrix)
+        logger.info(f"Reconciled {len(stale)} materials with the database")
+        return stale
+
+
+class VectorIndex(_SyncedIndex):
+    """Segmented in-memory vector index: one large main segment plus small deltas.
+
+    New embeddings are appended as delta segments and deletions become
+    tombstones, so neither copies the main matrix. Queries merge results from
+    all segments; compact() periodically folds deltas and tombstones back into
+    a fresh main segment while queries keep running on the old snapshot.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        nprobe: int = 8,
+        ann_min_vectors: int = 0,
+        precision: str = "float32",
+        rescore_candidates: int = 200
+    ):
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.ann_min_vectors = ann_min_vectors
+        self.precision = precision
+        self.rescore_candidates = rescore_candidates
+        self.ann: Optional[IVFIndex] = None
+        self.loaded = False
+        self.high_water_id = 0
+        # Changes whenever rows are loaded, added or removed (not on compaction)
+        self.generation = next(_generations)
+        self._lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._compacting = False
+        self._removed_during_compaction: List[int] = []
+        # Readers take the (main, deltas) tuple in one go, so a swap is never seen half-done
+        self._state: Tuple[IndexSegment, Tuple[IndexSegment, ...]] = (IndexSegment.empty(dimension), ())
+
+    def __len__(self) -> int:
+        return sum(len(segment) - segment.dead_count for segment in self.segments)
+
+    @property
+    def segments(self) -> List[IndexSegment]:
+        main, deltas = self._state
+        return [main, *deltas]
+
+    def load_from_db(self, db: Session, batch_size: int = 1000) -> int:
+        """Load every stored embedding into a fresh main segment"""
+        count = self.load_arrays(*load_embedding_rows(db, self.dimension, batch_size=batch_size))
+        logger.info(f"Vector index loaded with {count} embeddings")
+        return count
+
+    def load_arrays(
+        self,
+        matrix: np.ndarray,
+        ids: np.ndarray,
+        material_ids: np.ndarray,
+        subject_ids: np.ndarray
+    ) -> int:
+        """Replace the whole index with a main segment built from normalised arrays"""
+        with self._compaction_lock:
+            main = IndexSegment(matrix, ids, material_ids, subject_ids, self.ann, precision=self.precision)
+            with self._lock:
+                self._state = (main, ())
+                self.high_water_id = int(ids.max()) if len(ids) else 0
+                self.loaded = True
+                self.generation = next(_generations)
+        return len(ids)
+
+    def attach_ann(self, ann: Optional[IVFIndex]):
+        """Use an IVF index for the main segment (None returns to exact search)"""
+        with self._compaction_lock:
+            main, _ = self._state
+            organized = IndexSegment(
+                main.matrix, main.ids, main.material_ids, main.subject_ids, ann, main.alive, main.precision, main.scales
+            )
+            with self._lock:
+                self.ann = ann
+                self._state = (organized, self._state[1])
+
+    def add(
+        self,
+        ids: List[int],
+        material_ids: List[int],
+        subject_ids: List[int],
+        vectors: np.ndarray
+    ):
+        """Append embeddings as a new delta segment"""
+        if not len(ids):
+            return
+        delta = IndexSegment(
+            normalize_vectors(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)),
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(material_ids, dtype=np.int64),
+            np.asarray(subject_ids, dtype=np.int64)
+        )
+        with self._lock:
+            main, deltas = self._state
+            self._state = (main, deltas + (delta,))
+            self.high_water_id = max(self.high_water_id, int(delta.ids.max()))
+            self.generation = next(_generations)
+
+    def remove_material(self, material_id: int):
+        """Tombstone all currently indexed embeddings of a material"""
+        self.remove_materials([material_id])
+
+    def remove_materials(self, material_ids: Sequence[int]):
+        """Tombstone all currently indexed embeddings of several materials"""
+        if not len(material_ids):
+            return
+        with self._lock:
+            main, deltas = self._state
+            self._state = (
+                main.without_materials(material_ids),
+                tuple(delta.without_materials(material_ids) for delta in deltas)
+            )
+            if any(new is not old for new, old in zip(self.segments, (main, *deltas))):
+                self.generation = next(_generations)
+            if self._compacting:
+                self._removed_during_compaction.extend(material_ids)
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 5,
+        subject_id: Optional[int] = None,
+        threshold: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        rescore: Optional[Rescorer] = None
+    ) -> List[Tuple[int, float]]:
+        """Return (embedding id, cosine similarity) pairs, best first.
+
+        With an IVF index attached and at least ann_min_vectors rows, only the
+        nprobe most similar lists of the main segment are scanned; nprobe=0
+        forces an exact scan. Delta segments are always scanned exactly.
+        A quantised main segment returns rescore_candidates approximate hits,
+        which `rescore` re-ranks with float32 vectors loaded from storage.
+        """
+        main, deltas = self._state
+        if limit <= 0:
+            return []
+
+        query = normalize_vectors(np.asarray(query_vector, dtype=np.float32))
+        nprobe = self.nprobe if nprobe is None else nprobe
+        if len(main) < self.ann_min_vectors:
+            nprobe = 0
+
+        if main.quantized and rescore is not None:
+            parts = [self._rescored_search(main, query, limit, subject_id, threshold, nprobe, rescore)]
+        else:
+            parts = [main.search(query, limit, subject_id, threshold, nprobe)]
+        parts.extend(delta.search(query, limit, subject_id, threshold) for delta in deltas)
+        ids, scores = top_k(
+            np.concatenate([part[0] for part in parts]),
+            np.concatenate([part[1] for part in parts]),
+            limit
+        )
+        return [(int(embedding_id), float(score)) for embedding_id, score in zip(ids, scores)]
+
+    def _rescored_search(
+        self,
+        main: IndexSegment,
+        query: np.ndarray,
+        limit: int,
+        subject_id: Optional[int],
+        threshold: Optional[float],
+        nprobe: int,
+        rescore: Rescorer
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Approximate scores can sit slightly either side of the threshold, so it is applied after rescoring
+        candidates, _ = main.search(query, max(limit, self.rescore_candidates), subject_id, None, nprobe)
+        if not len(candidates):
+            return candidates, np.zeros(0, dtype=np.float32)
+        ids, vectors = rescore(candidates)
+        scores = normalize_vectors(vectors) @ query if len(ids) else np.zeros(0, dtype=np.float32)
+        if threshold is not None:
+            above = scores >= threshold
+            ids, scores = ids[above], scores[above]
+        return top_k(np.asarray(ids, dtype=np.int64), scores, limit)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by segment matrices (quantised data plus scales)"""
+        return sum(
+            segment.matrix.nbytes + (segment.scales.nbytes if segment.scales is not None else 0)
+            for segment in self.segments
+        )
+
+    def delta_stats(self) -> Dict[str, int]:
+        """Segment sizes, used to decide when compaction is due"""
+        main, deltas = self._state
+        return {
+            "main_rows": len(main),
+            "delta_segments": len(deltas),
+            "delta_rows": sum(len(delta) for delta in deltas),
+            "tombstones": main.dead_count + sum(delta.dead_count for delta in deltas)
+        }
+
+    def needs_compaction(self, max_delta_rows: int, max_delta_segments: int, max_dead_ratio: float) -> bool:
+        """Whether deltas or tombstones have grown enough to be worth folding in"""
+        stats = self.delta_stats()
+        total = stats["main_rows"] + stats["delta_rows"]
+        return (
+            stats["delta_rows"] > max_delta_rows
+            or stats["delta_segments"] > max_delta_segments
+            or (total > 0 and stats["tombstones"] / total > max_dead_ratio)
+        )
+
+    def compact_due(self, max_delta_rows: int, max_delta_segments: int, max_dead_ratio: float) -> int:
+        """Compact if thresholds are crossed; returns the number of compactions run"""
+        if self.needs_compaction(max_delta_rows, max_delta_segments, max_dead_ratio):
+            return int(self.compact())
+        return 0
+
+    def compact(self) -> bool:
+        """Fold delta segments and tombstones into a new main segment"""
+        with self._compaction_lock:
+            with self._lock:
+                main, deltas = self._state
+                if not deltas and not main.dead_count:
+                    return False
+                self._compacting = True
+                self._removed_during_compaction = []
+
+            try:
+                # The expensive part runs without the state lock; queries keep using the old snapshot
+                merged = IndexSegment.merge([main, *deltas], self.ann, self.precision)
+            except Exception:
+                with self._lock:
+                    self._compacting = False
+                raise
+
+            with self._lock:
+                _, current_deltas = self._state
+                if self._removed_during_compaction:
+                    merged = merged.without_materials(self._removed_during_compaction)
+                # Deltas appended while merging stay as deltas; removals already hit them
+                self._state = (merged, current_deltas[len(deltas):])
+                self._compacting = False
+                self._removed_during_compaction = []
+
+        logger.info(f"Vector index compacted: {len(merged)} rows in main segment")
+        return True
+
+
+class ShardedVectorIndex(_SyncedIndex):
+    """Vector index partitioned by subject, one VectorIndex (and IVF) per shard.
+
+    Subject-scoped queries only touch their own shard; unscoped queries fan
+    out over all shards and merge the per-shard top-k.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        nprobe: int = 8,
+        ann_min_vectors: int = 0,
+        precision: str = "float32",
+        rescore_candidates: int = 200
+    ):
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.ann_min_vectors = ann_min_vectors
+        self.precision = precision
+        self.rescore_candidates = rescore_candidates
+        self.loaded = False
+        self.high_water_id = 0
+        self._lock = threading.Lock()
+        # Replaced, never mutated, so readers can iterate without locking
+        self._shards: Dict[int, VectorIndex] = {}
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards.values())
+
+    @property
+    def shards(self) -> Dict[int, VectorIndex]:
+        return self._shards
+
+    @property
+    def segments(self) -> List[IndexSegment]:
+        return [segment for shard in self._shards.values() for segment in shard.segments]
+
+    def _new_shard(self) -> VectorIndex:
+        return VectorIndex(self.dimension, self.nprobe, self.ann_min_vectors, self.precision, self.rescore_candidates)
+
+    def shard(self, subject_id: int) -> VectorIndex:
+        """Shard for a subject, created empty on first use"""
+        shard = self._shards.get(subject_id)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(subject_id)
+                if shard is None:
+                    shard = self._new_shard()
+                    shard.loaded = True
+                    self._shards = {**self._shards, subject_id: shard}
+        return shard
+
+    @staticmethod
+    def _split_by_subject(arrays: Tuple[np.ndarray, ...]):
+        matrix, ids, material_ids, subject_ids = arrays
+        order = np.argsort(subject_ids, kind="stable")
+        subjects, starts = np.unique(subject_ids[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        for subject_id, start, end in zip(subjects.tolist(), starts, bounds):
+            rows = order[start:end]
+            yield subject_id, (matrix[rows], ids[rows], material_ids[rows], subject_ids[rows])
+
+    def load_from_db(self, db: Session, batch_size: int = 1000) -> int:
+        """Load every stored embedding, split into per-subject shards"""
+        arrays = load_embedding_rows(db, self.dimension, batch_size=batch_size)
+        shards = {}
+        for subject_id, shard_arrays in self._split_by_subject(arrays):
+            existing = self._shards.get(subject_id)
+            shard = self._new_shard()
+            if existing is not None:
+                shard.ann = existing.ann
+            shard.load_arrays(*shard_arrays)
+            shards[subject_id] = shard
+
+        ids = arrays[1]
+        with self._lock:
+            self._shards = shards
+            self.high_water_id = int(ids.max()) if len(ids) else 0
+            self.loaded = True
+
+        logger.info(f"Vector index loaded with {len(ids)} embeddings in {len(shards)} subject shards")
+        return len(ids)
+
+    def load_mapped(self, index_file: MappedIndexFile) -> int:
+        """Replace all shards with zero-copy slices of a memory-mapped snapshot"""
+        if self.precision != "float32":
+            # Quantising would copy the shared float32 pages into every worker's heap
+            raise ValueError(f"A memory-mapped index file is served as float32, not {self.precision}")
+        subject_ids = index_file.subject_ids
+        subjects, starts = np.unique(subject_ids, return_index=True)
+        if np.any(subject_ids[1:] < subject_ids[:-1]):
+            raise ValueError(f"{index_file.path} is not sorted by subject")
+
+        shards = {}
+        bounds = list(starts[1:]) + [len(subject_ids)]
+        for subject_id, start, end in zip(subjects.tolist(), starts, bounds):
+            existing = self._shards.get(subject_id)
+            shard = self._new_shard()
+            if existing is not None:
+                shard.ann = existing.ann
+            shard.load_arrays(
+                index_file.matrix[start:end],
+                index_file.ids[start:end],
+                index_file.material_ids[start:end],
+                subject_ids[start:end]
+            )
+            shards[subject_id] = shard
+
+        with self._lock:
+            self._shards = shards
+            self.high_water_id = index_file.high_water_id
+            self.loaded = True
+
+        logger.info(
+            f"Vector index mapped from {index_file.path} (version {index_file.version}): "
+            f"{index_file.rows} embeddings in {len(shards)} subject shards"
+        )
+        return index_file.rows
+
+    def snapshot_arrays(self) -> Tuple[np.ndarray, ...]:
+        """Live rows of every shard as (matrix, ids, material_ids, subject_ids), sorted for export"""
+        parts = [
+            IndexSegment.merge(shard.segments, shard.ann)
+            for _, shard in sorted(self._shards.items())
+        ]
+        if not parts:
+            empty = IndexSegment.empty(self.dimension)
+            return empty.matrix, empty.ids, empty.material_ids, empty.subject_ids
+        return (
+            np.vstack([part.dense() for part in parts]),
+            np.concatenate([part.ids for part in parts]),
+            np.concatenate([part.material_ids for part in parts]),
+            np.concatenate([part.subject_ids for part in parts])
+        )
+
+    def rebuild_shard(self, db: Session, subject_id: int) -> int:
+        """Reload a single subject's shard from the database"""
+        arrays = load_embedding_rows(
+            db, self.dimension, Material.subject_id == subject_id, MaterialEmbedding.id <= self.high_water_id
+        )
+        return self.shard(subject_id).load_arrays(*arrays)
+
+    def attach_ann(self, subject_id: int, ann: Optional[IVFIndex]):
+        """Use an IVF index for one subject's shard"""
+        self.shard(subject_id).attach_ann(ann)
+
+    def add(
+        self,
+        ids: List[int],
+        material_ids: List[int],
+        subject_ids: List[int],
+        vectors: np.ndarray
+    ):
+        """Append embeddings to the delta segments of their subjects' shards"""
+        if not len(ids):
+            return
+        arrays = (
+            np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension),
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(material_ids, dtype=np.int64),
+            np.asarray(subject_ids, dtype=np.int64)
+        )
+        for subject_id, (matrix, shard_ids, shard_materials, shard_subjects) in self._split_by_subject(arrays):
+            self.shard(subject_id).add(shard_ids, shard_materials, shard_subjects, matrix)
+        with self._lock:
+            self.high_water_id = max(self.high_water_id, int(arrays[1].max()))
+
+    def remove_material(self, material_id: int):
+        """Tombstone all currently indexed embeddings of a material"""
+        self.remove_materials([material_id])
+
+    def generation(self, subject_id: Optional[int]) -> int:
+        """Changes whenever the subject's indexed chunks change, so derived results can be invalidated"""
+        shard = self._shards.get(subject_id) if subject_id is not None else None
+        return shard.generation if shard is not None else 0
+
+    def remove_materials(self, material_ids: Sequence[int]):
+        """Tombstone all currently indexed embeddings of several materials"""
+        for shard in self._shards.values():
+            shard.remove_materials(material_ids)
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        limit: int = 5,
+        subject_id: Optional[int] = None,
+        threshold: Optional[float] = None,
+        nprobe: Optional[int] = None,
+        rescore: Optional[Rescorer] = None
+    ) -> List[Tuple[int, float]]:
+        """Return (embedding id, cosine similarity) pairs, best first"""
+        if subject_id is not None:
+            shard = self._shards.get(subject_id)
+            return shard.search(query_vector, limit, threshold=threshold, nprobe=nprobe, rescore=rescore) if shard else []
+
+        query = normalize_vectors(np.asarray(query_vector, dtype=np.float32))
+        hits = [
+            hit
+            for shard in self._shards.values()
+            for hit in shard.search(query, limit, threshold=threshold, nprobe=nprobe, rescore=rescore)
+        ]
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:limit]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the matrices of every shard"""
+        return sum(shard.memory_bytes() for shard in self._shards.values())
+
+    def delta_stats(self) -> Dict[str, int]:
+        """Segment sizes summed over all shards"""
+        totals = {"shards": len(self._shards), "main_rows": 0, "delta_segments": 0, "delta_rows": 0, "tombstones": 0}
+        for shard in self._shards.values():
+            for key, value in shard.delta_stats().items():
+                totals[key] += value
+        return totals
+
+    def compact_due(self, max_delta_rows: int, max_delta_segments: int, max_dead_ratio: float) -> int:
+        """Compact only the shards whose deltas or tombstones crossed the thresholds"""
+        return sum(
+            shard.compact_due(max_delta_rows, max_delta_segments, max_dead_ratio)
+            for shard in self._shards.values()
+        )
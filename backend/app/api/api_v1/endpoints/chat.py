@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, Dict, List, Optional
+import asyncio
 import json
 import logging
+import time
 from ....core.database import get_db
 from ....models.chat import ChatSession, ChatMessage, ChatType, MessageRole
 from ....models.user import User
-from ....ai.gemini_client import gemini_client
+from ....core.config import settings
+from ....ai.gemini_client import CHAT_ERROR_RESPONSE, gemini_client, is_model_answer
 from ....ai.rag_service import rag_service
+from ....ai.answer_cache import answer_cache, context_key
+from ....ai.stream_metrics import stream_metrics
 from ....services.redis_service import redis_service
+from ....utils.streaming import ClientDisconnected, aclose_shielded, iterate_until_disconnected
 from ....middleware.auth import get_current_user
 from ....schemas.chat import (
     ChatSessionCreate,
@@ -23,6 +30,30 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _load_chat_session(db: Session, session_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    """Fields of a user's chat session, read eagerly so async endpoints never lazy-load on the event loop"""
+    session = db.query(ChatSession).options(joinedload(ChatSession.subject)).filter(
+        ChatSession.id == session_id,
+        ChatSession.user_id == user_id
+    ).first()
+    if not session:
+        return None
+    return {
+        "chat_type": session.chat_type,
+        "subject_id": session.subject_id,
+        "subject": session.subject.name if session.subject else None
+    }
+
+
+def _save_message(db: Session, session_id: int, role: MessageRole, content: str) -> ChatMessage:
+    """Insert a chat message and reload it, so its fields can be read without another query"""
+    message = ChatMessage(session_id=session_id, role=role, content=content)
+    db.add(message)
+    db.commit()
+    db.refresh(message)
+    return message
+
+
 @router.post("/sessions", response_model=ChatSessionResponse)
 def create_chat_session(
     session_data: ChatSessionCreate,
@@ -109,7 +140,7 @@ def get_chat_session(
 
 
 @router.post("/sessions/{session_id}/messages", response_model=ChatMessageResponse)
-def send_message(
+async def send_message(
     session_id: int,
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_user),
@@ -117,11 +148,8 @@ def send_message(
 ):
     """Send a message in chat session"""
     try:
-        # Get chat session
-        session = db.query(ChatSession).filter(
-            ChatSession.id == session_id,
-            ChatSession.user_id == current_user.id
-        ).first()
+        # Database work runs in the threadpool; only the RAG and LLM calls are awaited on the loop
+        session = await run_in_threadpool(_load_chat_session, db, session_id, current_user.id)
         
         if not session:
             raise HTTPException(
@@ -130,41 +158,42 @@ def send_message(
             )
         
         # Save user message
-        user_message = ChatMessage(
-            session_id=session_id,
-            role=MessageRole.USER,
-            content=message_data.content
-        )
-        db.add(user_message)
-        db.commit()
+        await run_in_threadpool(_save_message, db, session_id, MessageRole.USER, message_data.content)
         
         # Get relevant context for RAG
         context = ""
-        if session.chat_type == ChatType.Q_AND_A and session.subject_id:
-            context = rag_service.get_relevant_context(
+        context_ids = []
+        if session["chat_type"] == ChatType.Q_AND_A and session["subject_id"]:
+            context, context_ids = await rag_service.aretrieve_context(
                 message_data.content, 
                 db, 
-                session.subject_id
+                session["subject_id"]
             )
         
+        # Reuse the answer to an equivalent question grounded on the same chunks;
+        # only subject Q&A is shared, answers of other chats depend on the user's own conversation
+        ai_response = None
+        question_vector = None
+        if settings.ANSWER_CACHE_ENABLED and session["chat_type"] == ChatType.Q_AND_A and session["subject_id"]:
+            question_vector = await rag_service.embed_query_async(message_data.content)
+        if question_vector is not None:
+            cache_scope = (session["subject_id"], session["chat_type"])
+            cache_context = context_key(context_ids)
+            generation = rag_service.vector_index.generation(session["subject_id"])
+            ai_response = answer_cache.lookup(cache_scope, question_vector, cache_context, generation)
+        
         # Generate AI response
-        ai_response = gemini_client.generate_chat_response(
-            message_data.content,
-            context=context,
-            subject=session.subject.name if session.subject else None
-        )
+        if ai_response is None:
+            ai_response = await gemini_client.agenerate_chat_response(
+                message_data.content,
+                context=context,
+                subject=session["subject"]
+            )
+            if question_vector is not None and is_model_answer(ai_response):
+                answer_cache.store(cache_scope, question_vector, cache_context, generation, ai_response)
         
         # Save AI response
-        ai_message = ChatMessage(
-            session_id=session_id,
-            role=MessageRole.ASSISTANT,
-            content=ai_response
-        )
-        db.add(ai_message)
-        db.commit()
-        db.refresh(ai_message)
-        
-        return ai_message
+        return await run_in_threadpool(_save_message, db, session_id, MessageRole.ASSISTANT, ai_response)
         
     except HTTPException:
         raise
@@ -177,19 +206,18 @@ def send_message(
 
 
 @router.post("/sessions/{session_id}/stream")
-def stream_chat_response(
+async def stream_chat_response(
     session_id: int,
     message_data: ChatMessageCreate,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Stream AI response for real-time chat"""
+    """Stream AI response for real-time chat as server-sent events"""
+    started = time.perf_counter()
     try:
-        # Get chat session
-        session = db.query(ChatSession).filter(
-            ChatSession.id == session_id,
-            ChatSession.user_id == current_user.id
-        ).first()
+        # Database work runs in the threadpool, here and when the answer is saved
+        session = await run_in_threadpool(_load_chat_session, db, session_id, current_user.id)
         
         if not session:
             raise HTTPException(
@@ -198,54 +226,69 @@ def stream_chat_response(
             )
         
         # Save user message
-        user_message = ChatMessage(
-            session_id=session_id,
-            role=MessageRole.USER,
-            content=message_data.content
-        )
-        db.add(user_message)
-        db.commit()
+        await run_in_threadpool(_save_message, db, session_id, MessageRole.USER, message_data.content)
         
         # Get relevant context for RAG
         context = ""
-        if session.chat_type == ChatType.Q_AND_A and session.subject_id:
-            context = rag_service.get_relevant_context(
+        if session["chat_type"] == ChatType.Q_AND_A and session["subject_id"]:
+            context = await rag_service.aget_relevant_context(
                 message_data.content, 
                 db, 
-                session.subject_id
+                session["subject_id"]
             )
         
-        def generate_response():
+        async def generate_response():
+            chunks = []
+            outcome = "failed"
+            stream_metrics.stream_started()
+            stream = gemini_client.agenerate_streaming_response(
+                message_data.content,
+                context=context,
+                subject=session["subject"]
+            )
+            # Every wait for the model also watches the client, so leaving before the first token cancels the call
+            events = iterate_until_disconnected(stream, request.is_disconnected)
             try:
                 # Stream AI response
-                for chunk in gemini_client.generate_streaming_response(
-                    message_data.content,
-                    context=context,
-                    subject=session.subject.name if session.subject else None
-                ):
+                async for chunk in events:
+                    if not chunks:
+                        stream_metrics.first_token(time.perf_counter() - started)
+                    chunks.append(chunk)
                     yield f"data: {json.dumps({'content': chunk, 'type': 'chunk'})}\n\n"
                 
-                # Save complete AI response
-                ai_message = ChatMessage(
-                    session_id=session_id,
-                    role=MessageRole.ASSISTANT,
-                    content=ai_response
+                # Save complete AI response in a single write
+                ai_response = "".join(chunks)
+                ai_message = await run_in_threadpool(
+                    _save_message, db, session_id, MessageRole.ASSISTANT, ai_response
                 )
-                db.add(ai_message)
-                db.commit()
+                outcome = "failed" if ai_response == CHAT_ERROR_RESPONSE else "completed"
                 
-                yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+                yield f"data: {json.dumps({'type': 'complete', 'message_id': ai_message.id})}\n\n"
                 
+            except ClientDisconnected:
+                outcome = "disconnected"
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away mid-stream; closing the stream below cancels the upstream call
+                outcome = "disconnected"
+                raise
             except Exception as e:
-                logger.error(f"Error in streaming response: {e}")
-                yield f"data: {json.dumps({'error': str(e), 'type': 'error'})}\n\n"
+                # Details stay in the log; the client only learns that the answer failed
+                logger.error(f"Error in streaming response for chat session {session_id}: {e}", exc_info=True)
+                yield f"data: {json.dumps({'error': CHAT_ERROR_RESPONSE, 'type': 'error'})}\n\n"
+            finally:
+                # Shielded: when the task is being cancelled, an unshielded await would end the cleanup at once
+                await aclose_shielded(events, stream)
+                if outcome == "disconnected":
+                    logger.info(f"Client disconnected from chat session {session_id} stream after {len(chunks)} chunks")
+                stream_metrics.stream_finished(time.perf_counter() - started, len(chunks), outcome)
         
         return StreamingResponse(
             generate_response(),
-            media_type="text/plain",
+            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
+                "X-Accel-Buffering": "no",  # Keep reverse proxies from buffering the events
             }
         )
         
@@ -41,6 +41,12 @@ class Settings(BaseSettings):
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL_CHAT: str = "gemini-2.0-flash-exp"
     GEMINI_MODEL_COMPLEX: str = "gemini-2.0-flash-thinking-exp"
+    GEMINI_API_BASE: str = "https://generativelanguage.googleapis.com/v1beta"
+    GEMINI_MAX_CONCURRENCY: int = 32  # In-flight Gemini calls per process (also the HTTP pool size)
+    GEMINI_MAX_CONCURRENCY_PER_MODEL: int = 16
+    GEMINI_TIMEOUT: float = 60.0  # Seconds, including the wait for a free slot
+    GEMINI_COMPLEX_TIMEOUT: float = 120.0  # Quiz and debate generation on the complex model
+    LLM_PROVIDER: str = "gemini"  # "gemini", or "fake" for offline load tests and benchmarks
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4o-mini"
     
@@ -48,6 +54,76 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     VECTOR_DIMENSION: int = 384
     SIMILARITY_THRESHOLD: float = 0.7
+    EMBEDDING_STORAGE_DTYPE: str = "float32"  # float32 or float16
+    EMBEDDING_MODEL_WARMUP: bool = True  # Load the model during API startup instead of on first query
+    EMBEDDING_BATCH_SIZE: int = 64  # Chunks per encode call and bulk insert
+    RAG_CHUNK_MAX_TOKENS: int = 0  # 0 = embedding model's max sequence length
+    RAG_CHUNK_OVERLAP_TOKENS: int = 32  # Whole sentences carried into the next chunk
+    EMBEDDING_SERVER_SOCKET: str = ""  # Unix socket of app.workers.embedding_server; empty = encode in-process
+    EMBEDDING_SERVER_TIMEOUT: float = 30.0
+    EMBEDDING_SERVER_RETRY_SECONDS: float = 30.0  # Use the local model this long after a server failure
+    EMBEDDING_MICROBATCH_ENABLED: bool = True  # Batch concurrent query embeddings into one encode
+    EMBEDDING_MICROBATCH_MAX_SIZE: int = 32
+    EMBEDDING_MICROBATCH_WAIT_MS: float = 5.0  # How long the first query waits for others to join
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096
+    QUERY_EMBEDDING_CACHE_TTL: int = 24 * 3600  # 1 day
+    QUERY_EMBEDDING_CACHE_REDIS: bool = False  # Share cached query vectors across workers
+    
+    # Approximate nearest-neighbour (IVF) index
+    RAG_ANN_ENABLED: bool = True  # Used only when the index file exists
+    RAG_ANN_INDEX_DIR: str = "./data/rag_ivf"  # One subject_<id>.npz per subject shard
+    RAG_ANN_LISTS: int = 1024  # Build-time number of inverted lists
+    RAG_ANN_NPROBE: int = 16  # Lists scanned per query; higher = better recall, slower
+    RAG_ANN_MIN_VECTORS: int = 50000  # Per shard; below this, exact search is fast enough
+    
+    # Incremental index maintenance (delta segments + compaction)
+    RAG_INDEX_VERSION: int = 1  # Embedding rows served; app.workers.reembed_corpus writes new versions
+    RAG_INDEX_PRECISION: str = "float32"  # float32, float16 or int8 for the in-memory scan; must be float32 with RAG_INDEX_FILE
+    RAG_RESCORE_CANDIDATES: int = 200  # float16/int8: candidates rescored with stored float32 vectors
+    RAG_INDEX_FILE: str = ""  # Memory-mapped float32 snapshot shared by all workers; empty = load from the database
+    RAG_INDEX_REFRESH_INTERVAL: float = 5.0  # Seconds between polls for new embeddings
+    RAG_INDEX_RECONCILE_INTERVAL: float = 60.0  # Seconds between checks for deleted/replaced materials
+    RAG_INDEX_COMPACT_DELTA_ROWS: int = 20000
+    RAG_INDEX_COMPACT_DELTA_SEGMENTS: int = 64
+    RAG_INDEX_COMPACT_DEAD_RATIO: float = 0.1
+    
+    # Hybrid retrieval (BM25 + vector)
+    RAG_SEARCH_MODE: str = "vector"  # vector, lexical or hybrid
+    RAG_LEXICAL_ENABLED: bool = True
+    RAG_BM25_K1: float = 1.5
+    RAG_BM25_B: float = 0.75
+    RAG_RRF_K: int = 60
+    RAG_HYBRID_CANDIDATES: int = 4  # Each retriever returns limit * this before fusion
+    RAG_CONTEXT_MAX_TOKENS: int = 512  # Token budget of the context sent to the LLM
+    RAG_CONTEXT_CANDIDATES: int = 20  # Chunks retrieved before MMR re-ranking
+    RAG_MMR_LAMBDA: float = 0.7  # 1.0 = pure relevance, lower favours diversity
+    RAG_EXECUTOR_WORKERS: int = 4  # Threads running blocking search work for async endpoints
+
+    # Semantic answer cache (chat answers reused for near-identical questions)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Minimum cosine similarity between question embeddings
+    ANSWER_CACHE_TTL: int = 6 * 3600  # 6 hours
+    ANSWER_CACHE_MAX_ENTRIES: int = 512  # Per subject and chat type
+
+    # Deterministic LLM response cache (quiz, debate and Socratic generation)
+    LLM_RESPONSE_CACHE_ENABLED: bool = True
+    LLM_RESPONSE_CACHE_SIZE: int = 256  # In-process entries
+    LLM_RESPONSE_CACHE_REDIS: bool = True  # Share results between API and worker processes
+    LLM_CACHE_TTL_QUIZ: int = 7 * 24 * 3600  # 1 week; a content change misses anyway
+    LLM_CACHE_TTL_DEBATE: int = 24 * 3600  # 1 day
+    LLM_CACHE_TTL_SOCRATIC: int = 3600  # 1 hour
+    
+    # Fake LLM provider (LLM_PROVIDER=fake): synthetic answers with realistic timing
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "lognormal"  # fixed, uniform, normal or lognormal
+    FAKE_LLM_LATENCY_MS: float = 800.0  # Median time to first token
+    FAKE_LLM_LATENCY_SPREAD: float = 0.5  # Sigma of log(latency); relative spread for uniform/normal
+    FAKE_LLM_TOKENS_PER_SECOND: float = 60.0
+    FAKE_LLM_CHUNK_TOKENS: int = 8  # Tokens per streamed chunk
+    FAKE_LLM_RESPONSE_TOKENS: int = 200  # Typical chat answer length
+    FAKE_LLM_ERROR_RATE: float = 0.0  # Fraction of calls failing with a 503
+    FAKE_LLM_TIMEOUT_RATE: float = 0.0  # Fraction of calls that hang past their timeout
+    FAKE_LLM_BLOCK_RATE: float = 0.0  # Fraction of prompts reported as blocked
+    FAKE_LLM_SEED: int = 0
     
     # File Storage
     UPLOAD_MAX_SIZE: int = 50 * 1024 * 1024  # 50MB
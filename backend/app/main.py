@@ -5,11 +5,21 @@ import logging
 import time
 from contextlib import asynccontextmanager
 
+from .utils.process import bytes_to_mb, current_rss_bytes, format_mb, rss_delta
+
+# Measured for the startup report logged once the lifespan has run
+_import_started = time.perf_counter()
+_import_rss = current_rss_bytes()
+
 from .core.config import settings
-from .core.database import engine, Base, init_database
+from .core.database import engine, Base, init_database, SessionLocal
 from .api.api_v1.api import api_router
 from .middleware.rate_limiter import rate_limiter, chat_rate_limiter, ai_rate_limiter
 from .services.redis_service import redis_service
+from .ai.rag_service import rag_service
+from .ai.answer_cache import answer_cache
+from .ai.gemini_client import gemini_client
+from .ai.stream_metrics import stream_metrics
 
 # Setup logging
 logging.basicConfig(
@@ -18,12 +28,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+startup_report = {}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("Starting E-Learning Platform API...")
+    startup_started = time.perf_counter()
     
     # Initialize database
     init_database()
@@ -37,10 +51,38 @@ async def lifespan(app: FastAPI):
     else:
         logger.warning("Redis connection failed - caching disabled")
     
+    # Load RAG vector index into memory
+    db = SessionLocal()
+    try:
+        rag_service.load_vector_index(db)
+    finally:
+        db.close()
+    rag_service.start_index_maintenance(SessionLocal)
+
+    # Load the embedding model now so the first chat request does not pay for it
+    if settings.EMBEDDING_MODEL_WARMUP:
+        startup_report["embedding_model"] = rag_service.warm_up()
+
+    rss = current_rss_bytes()
+    startup_report.update({
+        "import_seconds": IMPORT_SECONDS,
+        "startup_seconds": time.perf_counter() - startup_started,
+        "rss_mb": bytes_to_mb(rss),
+        "rss_delta_mb": bytes_to_mb(rss_delta(_import_rss, rss))
+    })
+    logger.info(
+        f"Startup report: imports {startup_report['import_seconds']:.2f}s, "
+        f"lifespan {startup_report['startup_seconds']:.2f}s, "
+        f"model load {rag_service.model_load_seconds or 0.0:.2f}s, "
+        f"RSS {format_mb(startup_report['rss_mb'])} (+{format_mb(startup_report['rss_delta_mb'])} since import)"
+    )
+    
     yield
     
     # Shutdown
     logger.info("Shutting down E-Learning Platform API...")
+    rag_service.stop_index_maintenance()
+    await gemini_client.aclose()
 
 
 # Create FastAPI app
@@ -127,6 +169,18 @@ def get_metrics():
     
     return {
         "cache": redis_stats,
+        "query_embedding_cache": rag_service.query_cache.stats(),
+        "embedding_batcher": rag_service.embedding_batcher.stats() if rag_service.embedding_batcher else None,
+        "rag_executor": rag_service.executor.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_provider": gemini_client.provider.stats(),
+        "gemini_coalescing": gemini_client.flights.stats(),
+        "llm_response_cache": gemini_client.response_cache.stats(),
+        "chat_streams": stream_metrics.stats(),
+        "rag_index": rag_service.vector_index.delta_stats(),
+        "rag_index_bytes": rag_service.vector_index.memory_bytes(),
+        "lexical_index": rag_service.lexical_index.stats(),
+        "startup": startup_report,
         "environment": settings.ENVIRONMENT,
         "uptime": time.time()  # This would be actual uptime in production
     }
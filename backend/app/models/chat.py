@@ -44,7 +44,7 @@ class ChatMessage(Base):
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     role = Column(Enum(MessageRole), nullable=False)
     content = Column(Text, nullable=False)
-    metadata = Column(JSON, nullable=True)  # For storing additional message data
+    metadata_ = Column("metadata", JSON, nullable=True)  # For storing additional message data
     tokens_used = Column(Integer, nullable=True)
     response_time_ms = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
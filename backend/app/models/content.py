@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, JSON, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from ..core.database import Base
@@ -16,7 +16,7 @@ class Material(Base):
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
     uploaded_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_published = Column(Boolean, default=False)
-    metadata = Column(JSON, nullable=True)  # For storing file metadata
+    metadata_ = Column("metadata", JSON, nullable=True)  # For storing file metadata ("metadata" is reserved by declarative)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -33,8 +33,11 @@ class MaterialEmbedding(Base):
     material_id = Column(Integer, ForeignKey("materials.id"), nullable=False)
     chunk_id = Column(String, nullable=False)  # Unique identifier for text chunk
     chunk_text = Column(Text, nullable=False)
-    embedding = Column(String, nullable=False)  # JSON string of vector
-    metadata = Column(JSON, nullable=True)  # Page number, section, etc.
+    content_hash = Column(String(32), nullable=True, index=True)  # blake2b of model + normalised text
+    index_version = Column(Integer, nullable=False, default=1, server_default="1", index=True)  # See RAG_INDEX_VERSION
+    embedding = Column(LargeBinary, nullable=False)  # Packed vector, see ai/embedding_codec.py
+    embedding_dtype = Column(String(16), nullable=True)  # float32/float16; NULL means legacy JSON text
+    metadata_ = Column("metadata", JSON, nullable=True)  # Page number, section, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
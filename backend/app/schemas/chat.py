@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from .user import User
@@ -54,7 +54,7 @@ class ChatMessageInDBBase(ChatMessageBase):
     id: int
     session_id: int
     role: str
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias=AliasChoices("metadata_", "metadata"))
     tokens_used: Optional[int] = None
     response_time_ms: Optional[int] = None
     created_at: datetime
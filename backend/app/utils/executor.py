@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from .histogram import observe
+
+# Upper bounds (milliseconds) of the queue-wait and run-time histogram buckets
+LATENCY_BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class BoundedExecutor:
+    """Fixed-size thread pool for blocking work called from async endpoints.
+
+    Calls beyond max_workers queue inside the pool instead of spawning more
+    threads, so a burst of slow searches cannot starve the event loop or the
+    default executor. Queue wait (submit to start) and run time are recorded
+    per call for the metrics endpoint.
+    """
+
+    def __init__(self, name: str, max_workers: int = 4):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.queued = 0
+        self.active = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.wait_times: Dict[str, int] = {}
+        self.run_times: Dict[str, int] = {}
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+        return self._pool
+
+    def _timed(self, func: Callable[..., Any], submitted_at: float) -> Any:
+        started = time.perf_counter()
+        wait = started - submitted_at
+        with self._stats_lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            observe(self.wait_times, wait * 1000, LATENCY_BOUNDS_MS, "ms")
+
+        failed = False
+        try:
+            return func()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self.active -= 1
+                self.completed += 1
+                self.failed += failed
+                observe(self.run_times, elapsed * 1000, LATENCY_BOUNDS_MS, "ms")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool and await its result"""
+        with self._stats_lock:
+            self.submitted += 1
+            self.queued += 1
+        call = functools.partial(func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._get_pool(), self._timed, call, time.perf_counter()
+        )
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads; the pool is recreated on the next run()"""
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, in-flight counts and queue-wait histogram for the metrics endpoint"""
+        with self._stats_lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": self.total_wait / started * 1000 if started else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+                "wait_histogram": dict(self.wait_times),
+                "run_histogram": dict(self.run_times)
+            }
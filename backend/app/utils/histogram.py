@@ -0,0 +1,15 @@
+from typing import Dict, Sequence
+
+
+def bucket(value: float, bounds: Sequence[float], unit: str = "") -> str:
+    """Label of the first upper bound holding value (le_250ms for unit "ms"), or inf past the last one"""
+    for bound in bounds:
+        if value <= bound:
+            return f"le_{bound}{unit}"
+    return "inf"
+
+
+def observe(histogram: Dict[str, int], value: float, bounds: Sequence[float], unit: str = "") -> None:
+    """Count value in its bucket of a label -> count histogram; callers hold their own lock"""
+    label = bucket(value, bounds, unit)
+    histogram[label] = histogram.get(label, 0) + 1
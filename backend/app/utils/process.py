@@ -0,0 +1,53 @@
+import os
+import sys
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Highest resident set size this process has reached, or None where it cannot be read"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return None
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (peak RSS where neither /proc nor psutil is available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return peak_rss_bytes()
+
+
+def rss_delta(before: Optional[int], after: Optional[int]) -> Optional[int]:
+    """after - before, or None when RSS is not measurable on this platform"""
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+def bytes_to_mb(value: Optional[int]) -> Optional[float]:
+    """Convert a byte count to mebibytes for logs"""
+    return value / (1024 * 1024) if value is not None else None
+
+
+def format_mb(value: Optional[float]) -> str:
+    return f"{value:.0f} MB" if value is not None else "n/a"
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def flight_key(*parts: str) -> str:
+    """Collision-resistant key of the inputs that make two calls identical"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Future"):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional["asyncio.Future"] = None
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """Concurrent async calls with the same key share one execution.
+
+    The first caller for a key starts the work; callers arriving while it
+    is in flight await the same result (or, for streams, replay the chunks
+    produced so far and then follow the live ones). Nothing is kept once
+    the work finishes, so this only collapses bursts and never serves a
+    stale result. The shared work is cancelled when every caller waiting
+    on it has gone away.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Stream] = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.calls = 0
+        self.coalesced_calls = 0
+        self.streams = 0
+        self.coalesced_streams = 0
+        self.cancelled = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Await func(), or the in-flight call already started for key"""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(func()))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self.calls += 1
+        else:
+            self.coalesced_calls += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+                self.cancelled += 1
+
+    async def stream(self, key: Hashable, func: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Iterate func(), or follow the in-flight stream already started for key"""
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Stream()
+            flight.task = asyncio.ensure_future(self._produce(key, flight, func))
+            self.streams += 1
+        else:
+            self.coalesced_streams += 1
+
+        flight.subscribers += 1
+        try:
+            index = 0
+            while True:
+                if index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+                self.cancelled += 1
+
+    async def _produce(self, key: Hashable, flight: _Stream, func: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in func():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            self._forget(self._streams, key, flight)
+
+    @staticmethod
+    def _forget(flights: Dict[Hashable, Any], key: Hashable, flight: Any):
+        # A finished or cancelled flight must not swallow a newer one under the same key
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Upstream executions and coalesced callers for the metrics endpoint"""
+        requests = self.calls + self.coalesced_calls + self.streams + self.coalesced_streams
+        return {
+            "name": self.name,
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "calls": self.calls,
+            "coalesced_calls": self.coalesced_calls,
+            "streams": self.streams,
+            "coalesced_streams": self.coalesced_streams,
+            "coalesced_ratio": (self.coalesced_calls + self.coalesced_streams) / requests if requests else 0.0,
+            "cancelled": self.cancelled
+        }
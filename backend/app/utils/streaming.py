@@ -0,0 +1,67 @@
+import anyio
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# How often a waiting stream asks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.25
+
+_END = object()
+
+
+class ClientDisconnected(Exception):
+    """Raised by iterate_until_disconnected when the client leaves while an item is awaited"""
+
+
+async def _next_item(stream: AsyncIterator[T]):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+async def iterate_until_disconnected(
+    stream: AsyncIterator[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = DISCONNECT_POLL_SECONDS
+) -> AsyncIterator[T]:
+    """Yield the items of stream, racing each wait against a disconnect poller.
+
+    A client that leaves before the first item (or between items) is noticed
+    within poll_interval: the pending read is cancelled, which closes the
+    upstream call, and ClientDisconnected is raised. Errors of the stream
+    propagate unchanged.
+
+    Each read runs in its own asyncio task, which is cancelled once; an
+    anyio cancel scope would also cancel every await of the stream's cleanup.
+    """
+    while True:
+        read = asyncio.ensure_future(_next_item(stream))
+        try:
+            while True:
+                done, _ = await asyncio.wait({read}, timeout=poll_interval)
+                if done:
+                    break
+                if await is_disconnected():
+                    read.cancel()
+                    await asyncio.gather(read, return_exceptions=True)
+                    raise ClientDisconnected()
+        except asyncio.CancelledError:
+            # Our own task is being cancelled: let the read finish its cleanup first
+            read.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(read, return_exceptions=True)
+            raise
+
+        item = read.result()
+        if item is _END:
+            return
+        yield item
+
+
+async def aclose_shielded(*streams: AsyncIterator) -> None:
+    """Close async generators even from a cancelled task, so their cleanup is not cut short"""
+    with anyio.CancelScope(shield=True):
+        for stream in streams:
+            await stream.aclose()
@@ -0,0 +1,178 @@
+"""
+Build the per-subject IVF approximate nearest-neighbour indexes over MaterialEmbedding rows.
+
+Usage (from the backend directory):
+    python -m app.workers.build_ann_index [--lists 1024] [--nprobe 16] [--subject ID] [--output-dir DIR]
+
+One index per subject shard is written atomically to RAG_ANN_INDEX_DIR and
+picked up by rag_service on the next startup. A recall check against exact
+search runs after every build.
+"""
+import argparse
+import logging
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..ai.ann_index import IVFIndex, shard_index_path
+from ..ai.vector_index import ShardedVectorIndex, VectorIndex, normalize_vectors
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sample_queries(index: VectorIndex, n_queries: int, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Perturbed copies of stored vectors, standing in for real user queries"""
+    rng = np.random.default_rng(seed)
+    main = index.segments[0]
+    rows = rng.choice(len(main), min(n_queries, len(main)), replace=False)
+    queries = main.matrix[rows] + rng.normal(scale=noise, size=(len(rows), index.dimension)).astype(np.float32)
+    return normalize_vectors(queries)
+
+
+def measure_recall(
+    index: VectorIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobe: Optional[int] = None
+) -> Dict[str, Any]:
+    """Recall@k and latency of ANN search compared with exact search"""
+    recalls = []
+    exact_times = []
+    ann_times = []
+
+    for query in queries:
+        started = time.perf_counter()
+        exact = {embedding_id for embedding_id, _ in index.search(query, k, nprobe=0)}
+        exact_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        approx = {embedding_id for embedding_id, _ in index.search(query, k, nprobe=nprobe)}
+        ann_times.append(time.perf_counter() - started)
+
+        if exact:
+            recalls.append(len(exact & approx) / len(exact))
+
+    return {
+        "k": k,
+        "nprobe": nprobe if nprobe is not None else index.nprobe,
+        "queries": len(queries),
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "exact_p50_ms": float(np.percentile(exact_times, 50) * 1000) if exact_times else 0.0,
+        "ann_p50_ms": float(np.percentile(ann_times, 50) * 1000) if ann_times else 0.0
+    }
+
+
+def build_shard_index(
+    shard: VectorIndex,
+    subject_id: int,
+    n_lists: int,
+    output_dir: str,
+    n_iter: int = 20,
+    sample_size: Optional[int] = None,
+    nprobe_values: Optional[List[int]] = None,
+    n_queries: int = 200,
+    k: int = 10
+) -> Dict[str, Any]:
+    """Train one shard's IVF index, save it and report recall"""
+    main = shard.segments[0]
+    count = len(main)
+
+    # Keep lists around a few hundred vectors each on small shards
+    n_lists = max(1, min(n_lists, count // 32 or 1))
+    sample_size = sample_size or max(n_lists * 256, 100000)
+
+    started = time.time()
+    ann = IVFIndex.train(
+        main.matrix,
+        main.ids,
+        n_lists,
+        n_iter=n_iter,
+        sample_size=sample_size,
+        model_name=settings.EMBEDDING_MODEL
+    )
+    build_seconds = time.time() - started
+    path = shard_index_path(output_dir, subject_id)
+    ann.save(path)
+    logger.info(f"Saved ANN index for subject {subject_id} to {path} in {build_seconds:.1f}s: {ann.info()}")
+
+    # Recall check: the index must not trade answer quality for latency unnoticed
+    shard.attach_ann(ann)
+    shard.ann_min_vectors = 0
+    queries = sample_queries(shard, n_queries)
+    reports = [measure_recall(shard, queries, k, nprobe) for nprobe in (nprobe_values or [settings.RAG_ANN_NPROBE])]
+    for report in reports:
+        logger.info(
+            f"subject {subject_id} nprobe={report['nprobe']}: recall@{k}={report['recall']:.3f}, "
+            f"exact p50 {report['exact_p50_ms']:.2f} ms, ann p50 {report['ann_p50_ms']:.2f} ms"
+        )
+
+    return {
+        "vectors": count,
+        "build_seconds": build_seconds,
+        "index": ann.info(),
+        "recall": reports
+    }
+
+
+def build_ann_index(
+    n_lists: int,
+    output_dir: str,
+    subject_id: Optional[int] = None,
+    min_vectors: int = 1000,
+    **options
+) -> Dict[str, Any]:
+    """Build IVF indexes for every shard (or one subject) from the database"""
+    db = SessionLocal()
+    try:
+        index = ShardedVectorIndex(settings.VECTOR_DIMENSION)
+        count = index.load_from_db(db)
+    finally:
+        db.close()
+
+    if count == 0:
+        return {"status": "error", "message": "No embeddings to index"}
+
+    subjects = [subject_id] if subject_id is not None else sorted(index.shards)
+    shards = {}
+    for subject in subjects:
+        shard = index.shards.get(subject)
+        if shard is None or len(shard) < min_vectors:
+            logger.info(f"Skipping subject {subject}: fewer than {min_vectors} embeddings, exact search is used")
+            continue
+        shards[subject] = build_shard_index(shard, subject, n_lists, output_dir, **options)
+
+    return {"status": "success", "vectors": count, "shards": shards}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the per-subject IVF indexes for RAG search")
+    parser.add_argument("--lists", type=int, default=settings.RAG_ANN_LISTS)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sample-size", type=int, default=None)
+    parser.add_argument("--subject", type=int, default=None, help="Only rebuild this subject's shard")
+    parser.add_argument("--min-vectors", type=int, default=1000)
+    parser.add_argument("--output-dir", default=settings.RAG_ANN_INDEX_DIR)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    result = build_ann_index(
+        args.lists,
+        args.output_dir,
+        subject_id=args.subject,
+        min_vectors=args.min_vectors,
+        n_iter=args.iterations,
+        sample_size=args.sample_size,
+        nprobe_values=args.nprobe,
+        n_queries=args.queries,
+        k=args.k
+    )
+    logger.info(result)
+
+
+if __name__ == "__main__":
+    main()
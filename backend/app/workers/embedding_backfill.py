@@ -0,0 +1,198 @@
+"""
+Convert MaterialEmbedding rows from legacy JSON text to packed binary vectors
+and fill in the content hashes used to reuse embeddings of unchanged chunks.
+
+Usage (from the backend directory):
+    python -m app.workers.embedding_backfill [--batch-size 500] [--dtype float32]
+    python -m app.workers.embedding_backfill --hashes-only --hash-model MODEL [--index-version N]
+
+A content hash names the model that produced the vector, and nothing records
+which model embedded rows stored before hashing. They are only hashed when
+--hash-model says which model that was; unhashed rows are never reused and
+are replaced when their material is reprocessed or re-embedded.
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Any, Optional
+from sqlalchemy import inspect, select, text, update
+from ..core.config import settings
+from ..core.database import engine, SessionLocal
+from ..models.content import MaterialEmbedding
+from ..ai.embedding_codec import chunk_content_hash, decode_embedding, encode_embedding
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def ensure_binary_schema() -> None:
+    """Add embedding_dtype, content_hash and index_version and switch the embedding column to a binary type"""
+    inspector = inspect(engine)
+    columns = {column["name"]: column for column in inspector.get_columns("material_embeddings")}
+
+    with engine.begin() as conn:
+        if "embedding_dtype" not in columns:
+            conn.execute(text("ALTER TABLE material_embeddings ADD COLUMN embedding_dtype VARCHAR(16)"))
+            logger.info("Added material_embeddings.embedding_dtype")
+
+        # SQLite stores blobs in any column, PostgreSQL needs an explicit bytea column.
+        # Existing JSON text is kept as UTF-8 bytes until the backfill rewrites it.
+        if engine.dialect.name == "postgresql" and "BYTEA" not in str(columns["embedding"]["type"]).upper():
+            conn.execute(text(
+                "ALTER TABLE material_embeddings "
+                "ALTER COLUMN embedding TYPE BYTEA USING convert_to(embedding, 'UTF8')"
+            ))
+            logger.info("Converted material_embeddings.embedding to BYTEA")
+
+        if "content_hash" not in columns:
+            conn.execute(text("ALTER TABLE material_embeddings ADD COLUMN content_hash VARCHAR(32)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_material_embeddings_content_hash "
+                "ON material_embeddings (content_hash)"
+            ))
+            logger.info("Added material_embeddings.content_hash")
+
+        if "index_version" not in columns:
+            conn.execute(text("ALTER TABLE material_embeddings ADD COLUMN index_version INTEGER NOT NULL DEFAULT 1"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_material_embeddings_index_version "
+                "ON material_embeddings (index_version)"
+            ))
+            logger.info("Added material_embeddings.index_version")
+
+
+def backfill_content_hashes(model: str, index_version: int, batch_size: int = 500) -> int:
+    """Hash unhashed rows of index_version as embedded by model, one batch per transaction"""
+    db = SessionLocal()
+    hashed = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.execute(
+                select(MaterialEmbedding.id, MaterialEmbedding.chunk_text)
+                .where(
+                    MaterialEmbedding.content_hash.is_(None),
+                    MaterialEmbedding.index_version == index_version,
+                    MaterialEmbedding.id > last_id
+                )
+                .order_by(MaterialEmbedding.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return hashed
+
+            db.execute(update(MaterialEmbedding), [
+                {"id": row_id, "content_hash": chunk_content_hash(chunk_text, model)}
+                for row_id, chunk_text in rows
+            ])
+            db.commit()
+            hashed += len(rows)
+            last_id = rows[-1][0]
+            logger.info(f"Hashed {hashed} chunks (last id {last_id})")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill_embeddings(
+    batch_size: int = 500,
+    dtype: str = "float32",
+    hash_model: Optional[str] = None,
+    index_version: Optional[int] = None
+) -> Dict[str, Any]:
+    """Rewrite legacy JSON embeddings as binary vectors, one batch per transaction.
+
+    With hash_model, unhashed rows of index_version (the served version by
+    default) are then hashed as embeddings of that model.
+    """
+    ensure_binary_schema()
+
+    db = SessionLocal()
+    converted = 0
+    failed = 0
+    bytes_before = 0
+    bytes_after = 0
+    last_id = 0
+    started = time.time()
+
+    try:
+        while True:
+            rows = db.execute(
+                select(MaterialEmbedding.id, MaterialEmbedding.embedding)
+                .where(MaterialEmbedding.embedding_dtype.is_(None), MaterialEmbedding.id > last_id)
+                .order_by(MaterialEmbedding.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            updates = []
+            for row_id, embedding in rows:
+                try:
+                    vector = decode_embedding(embedding, None)
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable embedding {row_id}: {e}")
+                    failed += 1
+                    continue
+                packed = encode_embedding(vector, dtype)
+                bytes_before += len(embedding)
+                bytes_after += len(packed)
+                updates.append({"id": row_id, "embedding": packed, "embedding_dtype": dtype})
+
+            if updates:
+                db.execute(update(MaterialEmbedding), updates)
+            db.commit()
+
+            converted += len(updates)
+            last_id = rows[-1][0]
+            logger.info(f"Converted {converted} embeddings (last id {last_id})")
+
+        hashed = 0
+        if hash_model:
+            hashed = backfill_content_hashes(hash_model, index_version or settings.RAG_INDEX_VERSION, batch_size)
+        ratio = bytes_before / bytes_after if bytes_after else 0.0
+        logger.info(
+            f"Backfill finished in {time.time() - started:.1f}s: {converted} converted, "
+            f"{failed} failed, {bytes_before} -> {bytes_after} bytes ({ratio:.1f}x smaller), {hashed} hashed"
+        )
+        return {
+            "status": "success",
+            "converted": converted,
+            "failed": failed,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "hashed": hashed
+        }
+
+    except Exception as e:
+        logger.error(f"Error backfilling embeddings: {e}")
+        db.rollback()
+        return {"status": "error", "message": str(e), "converted": converted}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert JSON embeddings to binary storage")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=settings.EMBEDDING_STORAGE_DTYPE)
+    parser.add_argument("--hashes-only", action="store_true", help="Only fill in missing content hashes")
+    parser.add_argument("--hash-model", help="Model that embedded the unhashed rows; they are left unhashed without it")
+    parser.add_argument("--index-version", type=int, default=settings.RAG_INDEX_VERSION)
+    args = parser.parse_args()
+    if args.hashes_only and not args.hash_model:
+        parser.error("--hashes-only needs --hash-model")
+
+    if args.hashes_only:
+        ensure_binary_schema()
+        result = {"status": "success", "hashed": backfill_content_hashes(args.hash_model, args.index_version, args.batch_size)}
+    else:
+        result = backfill_embeddings(args.batch_size, args.dtype, args.hash_model, args.index_version)
+    logger.info(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Shared embedding-model server for multi-worker deployments.
+
+Usage (from the backend directory):
+    python -m app.workers.embedding_server [--socket /run/elearning/embeddings.sock]
+
+One process owns the SentenceTransformer model and serves encode requests
+from every uvicorn and RQ worker on the node over a Unix domain socket
+(see app.ai.embedding_remote for the wire format). Requests from all
+connections are coalesced into shared model batches. Workers use it when
+EMBEDDING_SERVER_SOCKET is set and fall back to in-process encoding.
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import numpy as np
+from typing import Any, Dict
+from ..core.config import settings
+from ..ai.embedding_batcher import EmbeddingBatcher
+from ..ai.embedding_remote import (
+    OP_ENCODE,
+    OP_INFO,
+    STATUS_ERROR,
+    STATUS_OK,
+    encode_matrix,
+    encode_response,
+    read_request
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Serve requests on one client connection until it closes"""
+
+    def handle(self):
+        server: "EmbeddingServer" = self.server
+        while True:
+            try:
+                op, texts = read_request(self.request)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.warning(f"Dropping client after bad request: {e}")
+                self.request.sendall(encode_response(STATUS_ERROR, str(e).encode("utf-8")))
+                return
+
+            try:
+                if op == OP_ENCODE:
+                    payload = encode_matrix(server.encode(texts))
+                elif op == OP_INFO:
+                    payload = json.dumps(server.info()).encode("utf-8")
+                else:
+                    raise ValueError(f"Unknown op {op}")
+                response = encode_response(STATUS_OK, payload)
+            except Exception as e:
+                logger.error(f"Error serving embedding request: {e}")
+                response = encode_response(STATUS_ERROR, str(e).encode("utf-8"))
+            self.request.sendall(response)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that owns the embedding model"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, socket_path: str, max_batch_size: int = 64, max_wait: float = 0.005):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        self.batcher = EmbeddingBatcher(self._encode_batch, max_batch_size=max_batch_size, max_wait=max_wait)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        super().__init__(socket_path, EmbeddingRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def _encode_batch(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    def encode(self, texts) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, settings.VECTOR_DIMENSION), dtype=np.float32)
+        futures = [self.batcher.submit(text) for text in texts]
+        return np.vstack([future.result() for future in futures])
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "model": settings.EMBEDDING_MODEL,
+            "dimension": self.model.get_sentence_embedding_dimension() or settings.VECTOR_DIMENSION,
+            "max_seq_length": getattr(self.model, "max_seq_length", None),
+            "batcher": self.batcher.stats()
+        }
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.stop()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the embedding model over a Unix domain socket")
+    parser.add_argument("--socket", default=settings.EMBEDDING_SERVER_SOCKET or "./data/embeddings.sock")
+    parser.add_argument("--max-batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_MICROBATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    server = EmbeddingServer(args.socket, args.max_batch_size, args.max_wait_ms / 1000.0)
+    logger.info(f"Embedding server for {settings.EMBEDDING_MODEL} listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
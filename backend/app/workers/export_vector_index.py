@@ -0,0 +1,68 @@
+"""
+Export the RAG vector index as a flat snapshot file that workers memory-map.
+
+Usage (from the backend directory):
+    python -m app.workers.export_vector_index [--output PATH]
+
+The snapshot is written next to RAG_INDEX_FILE and renamed into place, so
+running workers switch to it on their next maintenance poll without ever
+seeing a partial file. Rows are ordered by subject and, where an IVF index
+exists, by inverted list, so each shard maps without being copied. Run it
+after large indexing jobs and periodically to fold in deltas and deletions.
+"""
+import argparse
+import logging
+import time
+from typing import Any, Dict, Optional
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..ai.ann_index import IVFIndex, shard_index_path
+from ..ai.index_file import write_index_file
+from ..ai.vector_index import ShardedVectorIndex
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def export_vector_index(output: str, ann_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Load embeddings from the database and write them as a snapshot file"""
+    started = time.time()
+    db = SessionLocal()
+    try:
+        index = ShardedVectorIndex(settings.VECTOR_DIMENSION)
+        count = index.load_from_db(db)
+    finally:
+        db.close()
+
+    ann_dir = ann_dir or settings.RAG_ANN_INDEX_DIR
+    if settings.RAG_ANN_ENABLED:
+        for subject_id in list(index.shards):
+            ann = IVFIndex.load(shard_index_path(ann_dir, subject_id), settings.VECTOR_DIMENSION, settings.EMBEDDING_MODEL)
+            if ann is not None:
+                index.attach_ann(subject_id, ann)
+
+    matrix, ids, material_ids, subject_ids = index.snapshot_arrays()
+    version = write_index_file(output, matrix, ids, material_ids, subject_ids, index.high_water_id)
+    elapsed = time.time() - started
+    logger.info(f"Exported {len(ids)} embeddings to {output} (version {version}) in {elapsed:.1f}s")
+    return {
+        "status": "success",
+        "path": output,
+        "version": version,
+        "embeddings": count,
+        "shards": len(index.shards),
+        "seconds": elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the RAG vector index as a memory-mappable snapshot")
+    parser.add_argument("--output", default=settings.RAG_INDEX_FILE or "./data/rag_index.bin")
+    parser.add_argument("--ann-dir", default=settings.RAG_ANN_INDEX_DIR)
+    args = parser.parse_args()
+    logger.info(export_vector_index(args.output, args.ann_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 import os
 import sys
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List
 from rq import Worker, Queue, Connection
 from redis import Redis
 from sqlalchemy.orm import sessionmaker
@@ -63,6 +63,63 @@ def process_material_upload(material_id: int) -> Dict[str, Any]:
         return {"status": "error", "message": str(e)}
 
 
+def process_materials_batch(material_ids: List[int]) -> Dict[str, Any]:
+    """Embed a queue of text materials together, sharing encode batches across them"""
+    try:
+        db = SessionLocal()
+        materials = db.query(Material).filter(
+            Material.id.in_(material_ids),
+            Material.file_type.in_(["docx", "txt", "md"])
+        ).order_by(Material.id).all()
+        
+        if not materials:
+            db.close()
+            return {"status": "error", "message": "No text materials found"}
+        
+        logger.info(f"Batch processing {len(materials)} materials")
+        
+        # Content is streamed into the batched indexer material by material
+        counts = rag_service.create_embeddings_for_materials(
+            ((material.id, extract_text_content(material)) for material in materials),
+            db
+        )
+        if counts is None:
+            db.close()
+            return {"status": "error", "message": "Failed to create embeddings"}
+        
+        for material in materials:
+            if counts.get(material.id):
+                material.is_published = True
+        db.commit()
+        db.close()
+        
+        return {
+            "status": "success",
+            "chunks": counts,
+            "message": f"Processed {len(materials)} materials"
+        }
+        
+    except Exception as e:
+        logger.error(f"Error batch processing materials {material_ids}: {e}")
+        return {"status": "error", "message": str(e)}
+
+
+def remove_material_embeddings(material_id: int) -> Dict[str, Any]:
+    """Delete a material's embeddings; API workers tombstone them on their next refresh"""
+    try:
+        db = SessionLocal()
+        success = rag_service.delete_embeddings_for_material(material_id, db)
+        db.close()
+        
+        if success:
+            return {"status": "success", "message": "Material embeddings removed"}
+        return {"status": "error", "message": "Failed to remove embeddings"}
+        
+    except Exception as e:
+        logger.error(f"Error removing embeddings for material {material_id}: {e}")
+        return {"status": "error", "message": str(e)}
+
+
 def extract_pdf_text(material_id: int) -> Dict[str, Any]:
     """Extract text from PDF file"""
     try:
@@ -109,7 +166,7 @@ def extract_text_content(material: Material) -> str:
         return ""
 
 
-def generate_quiz_questions(material_id: int, num_questions: int = 5) -> Dict[str, Any]:
+def generate_quiz_questions(material_id: int, num_questions: int = 5, regenerate: bool = False) -> Dict[str, Any]:
     """Generate quiz questions from material"""
     try:
         from ..ai.gemini_client import gemini_client
@@ -124,7 +181,8 @@ def generate_quiz_questions(material_id: int, num_questions: int = 5) -> Dict[st
         content = material.content or f"Content for {material.title}"
         
         # Generate questions using AI
-        questions = gemini_client.generate_quiz_questions(content, num_questions)
+        # Cached per material content unless a fresh set is asked for
+        questions = gemini_client.generate_quiz_questions(content, num_questions, bypass_cache=regenerate)
         
         db.close()
         return {
@@ -0,0 +1,308 @@
+"""
+Re-embed every material into a new index version, in parallel and resumably.
+
+Usage (from the backend directory):
+    python -m app.workers.reembed_corpus --version 2 [--workers 4] [--page-size 50] [--batch-size 64]
+    python -m app.workers.reembed_corpus --version 2 --restart
+    python -m app.workers.reembed_corpus --delete-version 1
+
+Materials are read in id order, a page at a time, and chunked and encoded
+by a pool of worker processes (each with its own copy of the model, or all
+sharing EMBEDDING_SERVER_SOCKET). Rows are written with index_version set
+to the target version, so the API keeps serving RAG_INDEX_VERSION until it
+is switched over. Progress is checkpointed after every committed page; a
+rerun resumes after the last one. Materials updated during the run are
+re-embedded in a final catch-up pass, as are materials added since it started.
+
+Chunks whose text is unchanged reuse their stored vectors, so a chunking
+change only encodes new text; a new EMBEDDING_MODEL re-encodes everything.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.content import Material, MaterialEmbedding
+from ..ai.embedding_codec import chunk_content_hash
+from ..ai.rag_service import rag_service
+from .embedding_backfill import ensure_binary_schema
+from .indexing_worker import extract_text_content
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def embed_materials(
+    materials: List[Tuple[int, str]],
+    index_version: int,
+    batch_size: int
+) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Chunk and embed one page of materials in a pool process; returns (material ids, rows to insert)"""
+    db = SessionLocal()
+    try:
+        rows = []
+        batch = []
+        for material_id, text in materials:
+            for chunk in rag_service.iter_material_chunks(text, material_id):
+                if not chunk["chunk_text"]:
+                    continue
+                chunk["content_hash"] = chunk_content_hash(chunk["chunk_text"], settings.EMBEDDING_MODEL)
+                batch.append((material_id, chunk))
+                if len(batch) >= batch_size:
+                    rows.extend(rag_service.embed_chunk_batch(batch, db, batch_size, index_version)[1])
+                    batch = []
+        if batch:
+            rows.extend(rag_service.embed_chunk_batch(batch, db, batch_size, index_version)[1])
+        return [material_id for material_id, _ in materials], rows
+    finally:
+        db.close()
+
+
+def write_page(material_ids: List[int], rows: List[Dict[str, Any]], index_version: int):
+    """Replace the target version's rows of a page in one transaction, so a retried page never duplicates"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(MaterialEmbedding).where(
+            MaterialEmbedding.material_id.in_(material_ids),
+            MaterialEmbedding.index_version == index_version
+        ))
+        if rows:
+            db.execute(insert(MaterialEmbedding), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]):
+    """Write the checkpoint atomically so a crash never leaves it half-written"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_pages(after_id: int, page_size: int, updated_since: Optional[datetime] = None):
+    """Yield (last material id, [(material_id, text)]) pages in id order"""
+    last_id = after_id
+    while True:
+        db = SessionLocal()
+        try:
+            query = db.query(Material).filter(Material.id > last_id)
+            if updated_since is not None:
+                # updated_at stays NULL until a row is first updated, so new materials count by created_at
+                query = query.filter(func.coalesce(Material.updated_at, Material.created_at) >= updated_since)
+            materials = query.order_by(Material.id).limit(page_size).all()
+            page = [(material.id, extract_text_content(material)) for material in materials]
+        finally:
+            db.close()
+        if not page:
+            return
+        last_id = page[-1][0]
+        yield last_id, [(material_id, text) for material_id, text in page if text]
+
+
+def count_materials(after_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Material).filter(Material.id > after_id).count()
+    finally:
+        db.close()
+
+
+class Progress:
+    """Throughput (chunks/s) and ETA of a run, logged once per page"""
+
+    def __init__(self, total_materials: int):
+        self.total_materials = total_materials
+        self.materials = 0
+        self.chunks = 0
+        self.started = time.monotonic()
+
+    def update(self, materials: int, chunks: int, last_id: int):
+        self.materials += materials
+        self.chunks += chunks
+        elapsed = time.monotonic() - self.started
+        rate = self.materials / elapsed if elapsed else 0.0
+        remaining = max(self.total_materials - self.materials, 0)
+        eta = remaining / rate if rate else float("inf")
+        logger.info(
+            f"{self.materials}/{self.total_materials} materials (last id {last_id}), {self.chunks} chunks, "
+            f"{self.chunks / elapsed if elapsed else 0.0:.1f} chunks/s, ETA {eta / 60:.1f} min"
+        )
+
+
+def run_pages(
+    pool: ProcessPoolExecutor,
+    pages,
+    index_version: int,
+    batch_size: int,
+    in_flight: int,
+    on_page=None
+) -> Tuple[int, int]:
+    """Embed pages on the pool, writing results strictly in page order; returns (materials, chunks)"""
+    pending: Deque[Tuple[int, Future]] = deque()
+    materials = 0
+    chunks = 0
+
+    def finish_oldest():
+        nonlocal materials, chunks
+        last_id, future = pending.popleft()
+        material_ids, rows = future.result()
+        write_page(material_ids, rows, index_version)
+        materials += len(material_ids)
+        chunks += len(rows)
+        if on_page:
+            on_page(last_id, len(material_ids), len(rows))
+
+    for last_id, page in pages:
+        pending.append((last_id, pool.submit(embed_materials, page, index_version, batch_size)))
+        if len(pending) >= in_flight:
+            finish_oldest()
+    while pending:
+        finish_oldest()
+    return materials, chunks
+
+
+def reembed_corpus(
+    index_version: int,
+    workers: int = 4,
+    page_size: int = 50,
+    batch_size: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    restart: bool = False
+) -> Dict[str, Any]:
+    """Write every material's chunks as index_version, resuming from the checkpoint"""
+    if index_version == settings.RAG_INDEX_VERSION:
+        raise ValueError(f"Version {index_version} is being served; re-embed into a new version")
+    ensure_binary_schema()
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    checkpoint_path = checkpoint_path or f"./data/reembed_v{index_version}.json"
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint and (checkpoint["index_version"] != index_version or checkpoint["model"] != settings.EMBEDDING_MODEL):
+        raise ValueError(f"{checkpoint_path} belongs to another run; pass --restart to start over")
+    if checkpoint and checkpoint.get("finished"):
+        logger.info(f"Version {index_version} already finished at {checkpoint['finished']}")
+        return {"status": "success", **checkpoint}
+    checkpoint = checkpoint or {
+        "index_version": index_version,
+        "model": settings.EMBEDDING_MODEL,
+        "started": datetime.now(timezone.utc).isoformat(),
+        "last_material_id": 0,
+        "materials": 0,
+        "chunks": 0
+    }
+    if checkpoint["last_material_id"]:
+        logger.info(f"Resuming version {index_version} after material {checkpoint['last_material_id']}")
+
+    progress = Progress(count_materials(checkpoint["last_material_id"]))
+
+    def on_page(last_id: int, materials: int, chunks: int):
+        checkpoint["last_material_id"] = last_id
+        checkpoint["materials"] += materials
+        checkpoint["chunks"] += chunks
+        save_checkpoint(checkpoint_path, checkpoint)
+        progress.update(materials, chunks, last_id)
+
+    # Spawned workers load their own model instead of inheriting the parent's threads and connections
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        run_pages(
+            pool,
+            read_pages(checkpoint["last_material_id"], page_size),
+            index_version,
+            batch_size,
+            workers * 2,
+            on_page
+        )
+
+        # Materials added or re-uploaded behind the cursor while the run was going
+        started = datetime.fromisoformat(checkpoint["started"])
+        updated, updated_chunks = run_pages(
+            pool, read_pages(0, page_size, updated_since=started), index_version, batch_size, workers * 2
+        )
+
+    checkpoint["finished"] = datetime.now(timezone.utc).isoformat()
+    save_checkpoint(checkpoint_path, checkpoint)
+    elapsed = time.monotonic() - progress.started
+    logger.info(
+        f"Version {index_version} finished: {checkpoint['materials']} materials, {checkpoint['chunks']} chunks "
+        f"in {elapsed:.0f}s ({progress.chunks / elapsed if elapsed else 0.0:.1f} chunks/s), "
+        f"{updated} updated materials re-embedded; set RAG_INDEX_VERSION={index_version} to serve it"
+    )
+    return {"status": "success", "updated_materials": updated, "updated_chunks": updated_chunks, **checkpoint}
+
+
+def delete_index_version(index_version: int, batch_size: int = 5000) -> int:
+    """Delete the rows of a retired index version in batches"""
+    if index_version == settings.RAG_INDEX_VERSION:
+        raise ValueError(f"Version {index_version} is being served")
+    db = SessionLocal()
+    deleted = 0
+    try:
+        while True:
+            ids = db.scalars(
+                select(MaterialEmbedding.id)
+                .where(MaterialEmbedding.index_version == index_version)
+                .limit(batch_size)
+            ).all()
+            if not ids:
+                return deleted
+            db.execute(delete(MaterialEmbedding).where(MaterialEmbedding.id.in_(ids)))
+            db.commit()
+            deleted += len(ids)
+            logger.info(f"Deleted {deleted} rows of version {index_version}")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed all materials into a new index version")
+    parser.add_argument("--version", type=int, help="Target index version (default: RAG_INDEX_VERSION + 1)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--page-size", type=int, default=50, help="Materials per unit of work")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: ./data/reembed_v<version>.json)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--delete-version", type=int, help="Delete the rows of a retired version and exit")
+    args = parser.parse_args()
+
+    if args.delete_version is not None:
+        logger.info(f"Deleted {delete_index_version(args.delete_version)} rows of version {args.delete_version}")
+        return
+
+    result = reembed_corpus(
+        args.version or settings.RAG_INDEX_VERSION + 1,
+        workers=args.workers,
+        page_size=args.page_size,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart
+    )
+    logger.info(result)
+
+
+if __name__ == "__main__":
+    main()
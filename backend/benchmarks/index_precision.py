@@ -0,0 +1,121 @@
+"""
+Recall and latency of the vector index at float32, float16 and int8 precision.
+
+Usage (from the backend directory):
+    python -m benchmarks.index_precision [--vectors 200000] [--k 10] [--rescore 200]
+    python -m benchmarks.index_precision --from-db
+
+Exact float32 search is the ground truth. Every reduced precision is
+measured both on its own (first-pass scores only) and with float32
+rescoring of the top candidates, which is how RAGService searches when
+RAG_INDEX_PRECISION is float16 or int8.
+"""
+import argparse
+import logging
+import time
+import numpy as np
+from typing import Any, Dict, List, Tuple
+from app.ai.quantization import INDEX_PRECISIONS
+from app.ai.vector_index import VectorIndex, normalize_vectors
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_corpus(
+    n_vectors: int,
+    dimension: int,
+    n_topics: int = 200,
+    spread: float = 0.06,
+    seed: int = 0
+) -> np.ndarray:
+    """Clustered unit vectors, closer to sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    topics = normalize_vectors(rng.normal(size=(n_topics, dimension)).astype(np.float32))
+    labels = rng.integers(0, n_topics, n_vectors)
+    noise = rng.normal(scale=spread, size=(n_vectors, dimension)).astype(np.float32)
+    return normalize_vectors(topics[labels] + noise)
+
+
+def load_corpus_from_db(dimension: int) -> np.ndarray:
+    from app.core.database import SessionLocal
+    from app.ai.vector_index import load_embedding_rows
+
+    db = SessionLocal()
+    try:
+        matrix, _, _, _ = load_embedding_rows(db, dimension)
+    finally:
+        db.close()
+    return matrix
+
+
+def run_precision(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    precision: str,
+    k: int,
+    rescore_candidates: int
+) -> List[Dict[str, Any]]:
+    ids = np.arange(1, len(matrix) + 1, dtype=np.int64)
+    index = VectorIndex(matrix.shape[1], precision=precision, rescore_candidates=rescore_candidates)
+    index.load_arrays(matrix, ids, np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=np.int64))
+
+    def rescore(candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Stands in for loading stored float32 vectors from the database
+        return candidates, matrix[candidates - 1]
+
+    modes = [("first pass", None)]
+    if precision != "float32":
+        modes.append((f"rescored top {rescore_candidates}", rescore))
+
+    reports = []
+    for label, rescorer in modes:
+        recalls = []
+        latencies = []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            hits = index.search(query, k, nprobe=0, rescore=rescorer)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected & {embedding_id for embedding_id, _ in hits}) / len(expected))
+        reports.append({
+            "precision": precision,
+            "mode": label,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "index_mb": index.memory_bytes() / (1024 * 1024)
+        })
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index precisions")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=200, help="Candidates rescored in float32")
+    parser.add_argument("--from-db", action="store_true", help="Use stored embeddings instead of a synthetic corpus")
+    args = parser.parse_args()
+
+    matrix = load_corpus_from_db(args.dimension) if args.from_db else synthetic_corpus(args.vectors, args.dimension)
+    rng = np.random.default_rng(1)
+    rows = rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)
+    queries = normalize_vectors(matrix[rows] + rng.normal(scale=0.05, size=(len(rows), matrix.shape[1])).astype(np.float32))
+
+    exact = VectorIndex(matrix.shape[1])
+    exact.load_arrays(matrix, np.arange(1, len(matrix) + 1), np.zeros(len(matrix), dtype=np.int64), np.zeros(len(matrix), dtype=np.int64))
+    truth = [{embedding_id for embedding_id, _ in exact.search(query, args.k)} for query in queries]
+
+    logger.info(f"{len(matrix)} vectors x {matrix.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    for precision in INDEX_PRECISIONS:
+        for report in run_precision(matrix, queries, truth, precision, args.k, args.rescore):
+            logger.info(
+                f"{report['precision']:>7} {report['mode']:<18} recall@{args.k}={report['recall']:.4f} "
+                f"p50 {report['p50_ms']:.2f} ms, index {report['index_mb']:.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
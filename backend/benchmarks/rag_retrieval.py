@@ -0,0 +1,394 @@
+"""
+Latency, throughput, memory and recall of the RAG retrieval paths on a synthetic corpus.
+
+Usage (from the backend directory):
+    python -m benchmarks.rag_retrieval [--chunks 100000] [--queries 300] [--k 5] [--output run.json]
+    python -m benchmarks.rag_retrieval --chunks 2000000 --precision int8 --ann-lists 1024 --concurrency 8
+
+Runs offline: material text is drawn from seeded topic vocabularies and a
+hashing encoder stands in for the sentence-transformer, so two runs with
+the same arguments index the same chunks and ask the same questions, and
+differences come from the code under test. Materials are ingested through
+RAGService.create_embeddings_for_materials into a scratch SQLite database
+(or --database-url), then process_material_for_embedding,
+search_similar_content and get_relevant_context are timed. Recall@k is
+measured against brute-force search over every stored vector of the
+query's subject. Results are written as JSON for comparison across commits.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.core.database import Base
+from app.models import assessment, chat, content, course, organization, user  # noqa: F401 (registers tables)
+from app.models.content import Material
+from app.ai.ann_index import IVFIndex
+from app.ai.chunker import StreamingChunker, approximate_token_count
+from app.ai.rag_service import RAGService
+from app.ai.vector_index import ShardedVectorIndex, load_embedding_rows, normalize_vectors
+from app.utils.process import bytes_to_mb, current_rss_bytes, format_mb, peak_rss_bytes, rss_delta
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zi", "pa", "do", "fe", "gu", "ha", "ji", "ba")
+
+
+class HashingEncoder:
+    """Deterministic stand-in for the embedding model: sum of seeded per-token random vectors.
+
+    Texts sharing vocabulary get similar vectors, which is all retrieval
+    benchmarks need, and nothing is downloaded.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._token_ids: Dict[str, int] = {}
+        self._table = np.zeros((1024, dimension), dtype=np.float32)
+
+    def _token_id(self, token: str) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = len(self._token_ids)
+            if token_id == len(self._table):
+                self._table = np.vstack([self._table, np.zeros_like(self._table)])
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            self._table[token_id] = np.random.default_rng(seed).standard_normal(self.dimension)
+            self._token_ids[token] = token_id
+        return token_id
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        token_ids = []
+        starts = []
+        rows = []
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            if tokens:
+                rows.append(row)
+                starts.append(len(token_ids))
+                token_ids.extend(self._token_id(token) for token in tokens)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if token_ids:
+            # Tokens are grouped by text, so one reduceat sums every text's token vectors
+            vectors[rows] = np.add.reduceat(self._table[token_ids], starts, axis=0)
+        return normalize_vectors(vectors)
+
+
+class OfflineRAGService(RAGService):
+    """RAGService with the stand-in encoder and a word-count tokenizer"""
+
+    def __init__(self, encoder: HashingEncoder, chunk_tokens: int, overlap_tokens: int):
+        super().__init__()
+        self.encoder = encoder
+        self.embedding_client = None
+        self._count_tokens = approximate_token_count
+        self._chunker = StreamingChunker(chunk_tokens, overlap_tokens, approximate_token_count)
+
+    def generate_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        return self.encoder.encode(texts)
+
+
+def make_vocabulary(rng: np.random.Generator, size: int) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+    return sorted(words)
+
+
+def synthetic_materials(
+    n_chunks: int,
+    n_subjects: int,
+    chunks_per_material: int,
+    chunk_tokens: int,
+    seed: int = 0
+) -> Iterator[Tuple[int, int, str]]:
+    """Yield (material_id, subject_id, text); each material is written mostly from one topic's vocabulary"""
+    rng = np.random.default_rng(seed)
+    common = np.array(make_vocabulary(rng, 300))
+    topics = [np.array(make_vocabulary(rng, 60)) for _ in range(n_subjects * 8)]
+    n_words = chunks_per_material * chunk_tokens
+
+    for material_id in range(1, max(1, n_chunks // chunks_per_material) + 1):
+        subject_id = int(rng.integers(1, n_subjects + 1))
+        # Eight topics per subject, so a question competes with related material
+        topic = topics[(subject_id - 1) * 8 + int(rng.integers(8))]
+        words = np.where(
+            rng.random(n_words) < 0.6,
+            topic[rng.integers(len(topic), size=n_words)],
+            common[rng.integers(len(common), size=n_words)]
+        ).tolist()
+        bounds = np.cumsum(rng.integers(8, 20, size=n_words // 8 + 1)).tolist()
+        sentences = [
+            " ".join(words[start:end]).capitalize() + "."
+            for start, end in zip([0] + bounds, bounds) if start < n_words
+        ]
+        yield material_id, subject_id, " ".join(sentences)
+
+
+def percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean())
+    }
+
+
+def time_calls(call: Callable[[Any], Any], inputs: Sequence[Any], concurrency: int) -> Tuple[List[Any], Dict[str, float]]:
+    """Run call on every input (from `concurrency` threads); returns results and latency/throughput stats"""
+    latencies = [0.0] * len(inputs)
+
+    def timed(i: int):
+        started = time.perf_counter()
+        result = call(inputs[i])
+        latencies[i] = time.perf_counter() - started
+        return result
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(timed, range(len(inputs))))
+    else:
+        results = [timed(i) for i in range(len(inputs))]
+    elapsed = time.perf_counter() - started
+    return results, {**percentiles(latencies), "throughput_qps": len(inputs) / elapsed, "seconds": elapsed}
+
+
+def ingest(
+    service: RAGService,
+    db: Session,
+    materials: Iterator[Tuple[int, int, str]],
+    group_size: int = 200
+) -> Tuple[Dict[str, Any], List[Tuple[int, str]]]:
+    """Insert materials and embed them in groups, as the batch indexing worker does"""
+    stored_chunks = 0
+    n_materials = 0
+    sample = []
+    started = time.perf_counter()
+    group = []
+
+    def flush():
+        nonlocal stored_chunks
+        db.execute(insert(Material), [
+            {"id": material_id, "title": f"Material {material_id}", "subject_id": subject_id, "uploaded_by": 1, "file_type": "txt"}
+            for material_id, subject_id, _ in group
+        ])
+        db.commit()
+        counts = service.create_embeddings_for_materials([(material_id, text) for material_id, _, text in group], db)
+        if counts is None:
+            raise RuntimeError("Ingest failed, see the log above")
+        stored_chunks += sum(counts.values())
+
+    for material_id, subject_id, text in materials:
+        group.append((material_id, subject_id, text))
+        n_materials += 1
+        if len(sample) < 50:
+            sample.append((material_id, text))
+        if len(group) >= group_size:
+            flush()
+            group = []
+    if group:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "materials": n_materials,
+        "chunks": stored_chunks,
+        "seconds": elapsed,
+        "chunks_per_second": stored_chunks / elapsed if elapsed else 0.0
+    }, sample
+
+
+def make_queries(
+    db: Session,
+    dimension: int,
+    encoder: HashingEncoder,
+    n_queries: int,
+    words: int = 8,
+    seed: int = 1
+) -> Tuple[List[Tuple[str, int]], Dict[int, Tuple[np.ndarray, np.ndarray]]]:
+    """Questions built from random words of stored chunks, plus each subject's vectors for brute force"""
+    matrix, ids, _, subject_ids = load_embedding_rows(db, dimension)
+    subjects = {
+        subject_id: (ids[subject_ids == subject_id], matrix[subject_ids == subject_id])
+        for subject_id in np.unique(subject_ids).tolist()
+    }
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(ids), min(n_queries, len(ids)), replace=False)
+    texts = dict(db.query(content.MaterialEmbedding.id, content.MaterialEmbedding.chunk_text).filter(
+        content.MaterialEmbedding.id.in_(ids[rows].tolist())
+    ))
+
+    queries = []
+    for row in rows.tolist():
+        tokens = TOKEN_PATTERN.findall(texts[int(ids[row])])
+        picked = rng.choice(tokens, min(words, len(tokens)), replace=False)
+        queries.append((" ".join(picked), int(subject_ids[row])))
+    return queries, subjects
+
+
+def exact_top_k(encoder: HashingEncoder, subjects, queries: List[Tuple[str, int]], k: int) -> List[set]:
+    truth = []
+    for query, subject_id in queries:
+        ids, matrix = subjects[subject_id]
+        scores = matrix @ encoder.encode([query])[0]
+        truth.append(set(ids[np.argsort(-scores)[:k]].tolist()))
+    return truth
+
+
+def attach_ann_indexes(service: RAGService, n_lists: int) -> float:
+    started = time.perf_counter()
+    for subject_id, shard in service.vector_index.shards.items():
+        main = shard.segments[0]
+        lists = max(1, min(n_lists, len(main) // 32 or 1))
+        ann = IVFIndex.train(main.dense(), main.ids, lists, model_name=settings.EMBEDDING_MODEL)
+        shard.ann_min_vectors = 0
+        service.vector_index.attach_ann(subject_id, ann)
+    return time.perf_counter() - started
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    scratch = None
+    database_url = args.database_url
+    if not database_url:
+        scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    dimension = settings.VECTOR_DIMENSION
+    encoder = HashingEncoder(dimension)
+    service = OfflineRAGService(encoder, args.chunk_tokens, args.overlap_tokens)
+    # The stand-in encoder's similarities are lower than a real model's; rank everything
+    service.similarity_threshold = -1.0
+    service.vector_index = ShardedVectorIndex(
+        dimension,
+        nprobe=args.nprobe,
+        ann_min_vectors=0 if args.ann_lists else settings.RAG_ANN_MIN_VECTORS,
+        precision=args.precision,
+        rescore_candidates=settings.RAG_RESCORE_CANDIDATES
+    )
+    report: Dict[str, Any] = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"}
+    }
+
+    try:
+        logger.info(f"Ingesting about {args.chunks} chunks into {database_url}")
+        report["ingest"], sample = ingest(
+            service,
+            db,
+            synthetic_materials(args.chunks, args.subjects, args.chunks_per_material, args.chunk_tokens, args.seed)
+        )
+        logger.info(f"Ingest: {report['ingest']}")
+
+        chunked, stats = time_calls(lambda item: service.process_material_for_embedding(item[1], item[0]), sample, 1)
+        report["process_material_for_embedding"] = {
+            **stats, "chunks_per_second": sum(len(chunks) for chunks in chunked) / stats["seconds"]
+        }
+
+        rss_before = current_rss_bytes()
+        started = time.perf_counter()
+        service.load_vector_index(db)
+        report["index"] = {
+            "load_seconds": time.perf_counter() - started,
+            "ann_build_seconds": attach_ann_indexes(service, args.ann_lists) if args.ann_lists else None,
+            "index_mb": bytes_to_mb(service.vector_index.memory_bytes()),
+            "rss_delta_mb": bytes_to_mb(rss_delta(rss_before, current_rss_bytes()))
+        }
+        if settings.RAG_LEXICAL_ENABLED:
+            service.lexical_index.load_from_db(db)
+
+        queries, subjects = make_queries(db, dimension, encoder, args.queries)
+        truth = exact_top_k(encoder, subjects, queries, args.k)
+        del subjects
+
+        modes = ["vector"] + (["hybrid"] if settings.RAG_LEXICAL_ENABLED else [])
+        report["paths"] = {}
+        for mode in modes:
+            service.query_cache.local.clear()
+            hits, stats = time_calls(
+                lambda item: service.search_similar_content(item[0], db, item[1], limit=args.k, mode=mode),
+                queries,
+                args.concurrency
+            )
+            recall = np.mean([
+                len(expected & {hit["id"] for hit in found}) / len(expected) for expected, found in zip(truth, hits)
+            ])
+            report["paths"][f"search_similar_content[{mode}]"] = {**stats, f"recall_at_{args.k}": float(recall)}
+
+        service.query_cache.local.clear()
+        _, stats = time_calls(
+            lambda item: service.get_relevant_context(item[0], db, item[1]), queries, args.concurrency
+        )
+        report["paths"]["get_relevant_context"] = stats
+        report["peak_rss_mb"] = bytes_to_mb(peak_rss_bytes())
+    finally:
+        service.stop_index_maintenance()
+        db.close()
+        engine.dispose()
+        if scratch is not None:
+            os.unlink(scratch.name)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval on a synthetic corpus")
+    parser.add_argument("--chunks", type=int, default=100000, help="Approximate corpus size (10k-2M)")
+    parser.add_argument("--subjects", type=int, default=8)
+    parser.add_argument("--chunks-per-material", type=int, default=40)
+    parser.add_argument("--chunk-tokens", type=int, default=64)
+    parser.add_argument("--overlap-tokens", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads issuing queries")
+    parser.add_argument("--precision", choices=["float32", "float16", "int8"], default=settings.RAG_INDEX_PRECISION)
+    parser.add_argument("--ann-lists", type=int, default=0, help="Train IVF indexes with this many lists (0 = exact)")
+    parser.add_argument("--nprobe", type=int, default=settings.RAG_ANN_NPROBE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Empty database to use instead of a scratch SQLite file")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    for name, stats in report["paths"].items():
+        recall = {key: value for key, value in stats.items() if key.startswith("recall")}
+        logger.info(
+            f"{name:<34} p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, "
+            f"{stats['throughput_qps']:.0f} q/s {recall}"
+        )
+    logger.info(f"Peak RSS {format_mb(report['peak_rss_mb'])}, index {report['index']['index_mb']:.1f} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+
+# Settings are read at import time; keep tests offline and off the developer's services
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("EMBEDDING_MODEL_WARMUP", "false")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture
+def db():
+    """Session on a private in-memory SQLite database with every table created"""
+    from app.core.database import Base
+    from app.models import assessment, chat, content, course, organization, user  # noqa: F401 (registers tables)
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def rag():
+    """RAGService with the benchmark's offline hashing encoder instead of the sentence-transformer"""
+    from app.core.config import settings
+    from benchmarks.rag_retrieval import HashingEncoder, OfflineRAGService
+
+    service = OfflineRAGService(HashingEncoder(settings.VECTOR_DIMENSION), chunk_tokens=40, overlap_tokens=0)
+    service.similarity_threshold = -1.0
+    yield service
+    service.stop_index_maintenance()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from app.ai.ann_index import IVFIndex, shard_index_path
+from app.ai.vector_index import VectorIndex, normalize_vectors
+
+
+@pytest.fixture(scope="module")
+def clustered():
+    """2000 vectors around 20 well separated centres, with ids 1..2000"""
+    rng = np.random.default_rng(7)
+    centres = rng.normal(size=(20, 32))
+    vectors = centres[rng.integers(20, size=2000)] + 0.3 * rng.normal(size=(2000, 32))
+    return normalize_vectors(vectors.astype(np.float32)), np.arange(1, 2001, dtype=np.int64)
+
+
+def ann_index(vectors, ids, n_lists=20):
+    index = VectorIndex(vectors.shape[1], nprobe=4, ann_min_vectors=0)
+    zeros = np.zeros(len(ids), dtype=np.int64)
+    index.load_arrays(vectors, ids, zeros, zeros)
+    index.attach_ann(IVFIndex.train(vectors, ids, n_lists, model_name="model"))
+    return index
+
+
+def test_recall_against_exact_search(clustered):
+    vectors, ids = clustered
+    index = ann_index(vectors, ids)
+    queries = normalize_vectors(vectors[::100] + 0.05)
+
+    found = 0
+    for query in queries:
+        exact = {hit for hit, _ in index.search(query, limit=10, nprobe=0)}
+        approximate = {hit for hit, _ in index.search(query, limit=10)}
+        found += len(exact & approximate)
+    assert found / (10 * len(queries)) >= 0.9
+
+
+def test_probing_every_list_is_exact(clustered):
+    vectors, ids = clustered
+    index = ann_index(vectors, ids)
+    query = vectors[3]
+    assert index.search(query, limit=5, nprobe=20) == index.search(query, limit=5, nprobe=0)
+
+
+def test_rows_added_after_training_are_still_found(clustered):
+    vectors, ids = clustered
+    index = ann_index(vectors[:1500], ids[:1500])
+    index.add(ids[1500:].tolist(), [0] * 500, [0] * 500, vectors[1500:])
+    assert index.search(vectors[1700], limit=1)[0][0] == ids[1700]
+
+    # Compaction folds the new rows into the main segment, assigned to their nearest list
+    index.compact()
+    assert index.search(vectors[1700], limit=1)[0][0] == ids[1700]
+
+
+def test_lookup_marks_unknown_ids():
+    ann = IVFIndex(np.eye(2, dtype=np.float32), np.array([5, 3]), np.array([1, 0]))
+    assert ann.lookup(np.array([3, 4, 5])).tolist() == [0, -1, 1]
+
+
+def test_saved_index_loads_only_for_the_same_model(tmp_path, clustered):
+    vectors, ids = clustered
+    path = shard_index_path(str(tmp_path), 4)
+    IVFIndex.train(vectors, ids, 8, n_iter=5, model_name="model").save(path)
+
+    loaded = IVFIndex.load(path, 32, "model")
+    assert loaded.info()["vectors"] == 2000
+    assert loaded.n_lists == 8
+    assert IVFIndex.load(path, 32, "other-model") is None
+    assert IVFIndex.load(path, 16, "model") is None
+    assert IVFIndex.load(str(tmp_path / "missing.npz"), 32, "model") is None
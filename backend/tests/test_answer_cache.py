@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from app.ai.answer_cache import SemanticAnswerCache, context_key
+from app.ai.gemini_client import BLOCKED_RESPONSE, CHAT_ERROR_RESPONSE, SOCRATIC_FALLBACK, is_model_answer
+
+SCOPE = (1, "q_and_a")
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_question_with_same_context_hits():
+    cache = SemanticAnswerCache(3, threshold=0.95)
+    cache.store(SCOPE, vector(1, 0, 0), context_key([3, 1]), 7, "answer")
+    assert cache.lookup(SCOPE, vector(1, 0.1, 0), context_key([1, 3]), 7) == "answer"
+    assert cache.lookup(SCOPE, vector(0, 1, 0), context_key([1, 3]), 7) is None
+    assert cache.lookup((2, "q_and_a"), vector(1, 0, 0), context_key([1, 3]), 7) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_context_misses():
+    cache = SemanticAnswerCache(3)
+    cache.store(SCOPE, vector(1, 0, 0), context_key([1]), 7, "answer")
+    assert cache.lookup(SCOPE, vector(1, 0, 0), context_key([2]), 7) is None
+    assert cache.stats()["context_mismatches"] == 1
+
+
+def test_index_generation_change_drops_the_entry():
+    cache = SemanticAnswerCache(3)
+    cache.store(SCOPE, vector(1, 0, 0), "ctx", 7, "answer")
+    assert cache.lookup(SCOPE, vector(1, 0, 0), "ctx", 8) is None
+    assert cache.lookup(SCOPE, vector(1, 0, 0), "ctx", 7) is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_full_scope_evicts_the_oldest_entry():
+    cache = SemanticAnswerCache(3, max_entries=2)
+    for index, answer in enumerate(("a", "b", "c")):
+        cache.store(SCOPE, np.eye(3, dtype=np.float32)[index], "ctx", 1, answer)
+    assert cache.lookup(SCOPE, vector(1, 0, 0), "ctx", 1) is None
+    assert cache.lookup(SCOPE, vector(0, 0, 1), "ctx", 1) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_subject():
+    cache = SemanticAnswerCache(3)
+    cache.store(SCOPE, vector(1, 0, 0), "ctx", 1, "answer")
+    cache.store((2, "q_and_a"), vector(1, 0, 0), "ctx", 1, "other")
+    cache.invalidate(1)
+    assert cache.lookup(SCOPE, vector(1, 0, 0), "ctx", 1) is None
+    assert cache.lookup((2, "q_and_a"), vector(1, 0, 0), "ctx", 1) == "other"
+
+
+@pytest.mark.parametrize("text", [CHAT_ERROR_RESPONSE, BLOCKED_RESPONSE, SOCRATIC_FALLBACK, "", "  ", None])
+def test_fallbacks_are_not_model_answers(text):
+    assert not is_model_answer(text)
+
+
+def test_model_text_is_an_answer():
+    assert is_model_answer("Photosynthesis turns light into chemical energy.")
+
+
+@pytest.fixture
+def cached_answers(monkeypatch, db, rag):
+    """A fresh cache holding one answer for subjects 1 and 2, as seen by the RAG service"""
+    from app.ai import rag_service
+    from app.models.content import Material
+
+    cache = SemanticAnswerCache(rag.vector_index.dimension)
+    monkeypatch.setattr(rag_service, "answer_cache", cache)
+    for material_id, subject_id in ((1, 1), (2, 2)):
+        db.add(Material(id=material_id, title="m", subject_id=subject_id, uploaded_by=1))
+    db.commit()
+    question = np.ones(rag.vector_index.dimension, dtype=np.float32)
+    for subject_id in (1, 2):
+        cache.store((subject_id, "q_and_a"), question, context_key([]), 0, f"answer {subject_id}")
+
+    def cached(subject_id):
+        return cache.lookup((subject_id, "q_and_a"), question, context_key([]), 0)
+
+    return cached
+
+
+def test_changed_material_drops_its_subjects_answers(db, rag, cached_answers):
+    assert rag.create_embeddings_for_material("Osmosis moves water across membranes.", 1, db)
+    assert cached_answers(1) is None
+    assert cached_answers(2) == "answer 2"
+
+
+def test_unchanged_reprocessing_keeps_answers(db, rag, cached_answers, monkeypatch):
+    from app.ai import rag_service
+
+    assert rag.create_embeddings_for_material("Osmosis moves water across membranes.", 2, db)
+    monkeypatch.setattr(rag_service.answer_cache, "invalidate", lambda subject_id=None: pytest.fail("invalidated"))
+    assert rag.create_embeddings_for_material("Osmosis moves water across membranes.", 2, db)
+
+
+def test_deleted_material_drops_its_subjects_answers(db, rag, cached_answers):
+    assert rag.delete_embeddings_for_material(2, db)
+    assert cached_answers(2) is None
+    assert cached_answers(1) == "answer 1"
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.ai.embedding_codec import chunk_content_hash, encode_embedding
+from app.core.config import settings
+from app.models.content import Material, MaterialEmbedding
+from app.workers import embedding_backfill
+
+TEXT = " ".join(f"Sentence {i} explains topic {i} in detail." for i in range(12))
+
+
+@pytest.fixture
+def encoded(rag):
+    """Texts sent to the encoder, in order"""
+    texts = []
+    encode = rag.generate_embeddings
+    rag.generate_embeddings = lambda batch, batch_size=None: texts.extend(batch) or encode(batch)
+    return texts
+
+
+def add_materials(db, *material_ids):
+    for material_id in material_ids:
+        db.add(Material(id=material_id, title="m", subject_id=1, uploaded_by=1))
+    db.commit()
+
+
+def rows_of(db, material_id):
+    return db.query(MaterialEmbedding).filter(MaterialEmbedding.material_id == material_id).order_by(
+        MaterialEmbedding.id
+    ).all()
+
+
+def test_reprocessing_unchanged_content_encodes_nothing(db, rag, encoded):
+    add_materials(db, 1)
+    rag.create_embeddings_for_material(TEXT, 1, db)
+    before = [(row.id, row.content_hash) for row in rows_of(db, 1)]
+    encoded.clear()
+
+    assert rag.create_embeddings_for_material(TEXT, 1, db)
+    assert encoded == []
+    assert [(row.id, row.content_hash) for row in rows_of(db, 1)] == before
+
+
+def test_edited_content_encodes_only_new_chunks_and_drops_stale_ones(db, rag, encoded):
+    add_materials(db, 1)
+    rag.create_embeddings_for_material(TEXT, 1, db)
+    old_texts = {row.chunk_text for row in rows_of(db, 1)}
+    encoded.clear()
+
+    edited = TEXT.replace("Sentence 11 explains topic 11", "A new closing sentence about osmosis")
+    assert rag.create_embeddings_for_material(edited, 1, db)
+    texts = [row.chunk_text for row in rows_of(db, 1)]
+    assert encoded and set(encoded) == set(texts) - old_texts
+    assert "osmosis" in " ".join(encoded)
+    assert not any("Sentence 11" in text for text in texts)
+
+
+def test_identical_chunks_of_another_material_copy_the_stored_vector(db, rag, encoded):
+    add_materials(db, 1, 2)
+    rag.create_embeddings_for_material(TEXT, 1, db)
+    encoded.clear()
+
+    assert rag.create_embeddings_for_material(TEXT, 2, db)
+    assert encoded == []
+    first, second = rows_of(db, 1), rows_of(db, 2)
+    assert [row.embedding for row in second] == [row.embedding for row in first]
+
+
+def store_legacy(db, material_id, text, content_hash=None, index_version=None):
+    db.add(MaterialEmbedding(
+        material_id=material_id, chunk_id="legacy", chunk_text=text, content_hash=content_hash,
+        index_version=index_version or settings.RAG_INDEX_VERSION,
+        embedding=encode_embedding([1.0] + [0.0] * (settings.VECTOR_DIMENSION - 1)), embedding_dtype="float32"
+    ))
+    db.commit()
+
+
+def test_unhashed_rows_are_never_reused(db, rag, encoded):
+    add_materials(db, 1)
+    store_legacy(db, 1, "Sentence 0 explains topic 0 in detail.")
+
+    assert rag.create_embeddings_for_material("Sentence 0 explains topic 0 in detail.", 1, db)
+    assert encoded == ["Sentence 0 explains topic 0 in detail."]
+    rows = rows_of(db, 1)
+    assert len(rows) == 1 and rows[0].content_hash is not None
+
+
+def test_vectors_of_other_index_versions_are_not_reused(db, rag, encoded):
+    add_materials(db, 1, 2)
+    text = "Sentence 0 explains topic 0 in detail."
+    store_legacy(db, 1, text, chunk_content_hash(text, settings.EMBEDDING_MODEL), settings.RAG_INDEX_VERSION + 1)
+
+    assert rag.create_embeddings_for_material(text, 2, db)
+    assert encoded == [text]
+
+
+def test_hash_backfill_needs_the_model_and_keeps_to_one_version(db, monkeypatch):
+    monkeypatch.setattr(embedding_backfill, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    add_materials(db, 1)
+    store_legacy(db, 1, "served")
+    store_legacy(db, 1, "older", index_version=settings.RAG_INDEX_VERSION + 1)
+
+    assert embedding_backfill.backfill_content_hashes("old-model", settings.RAG_INDEX_VERSION, batch_size=1) == 1
+    db.expire_all()
+    hashes = {row.chunk_text: row.content_hash for row in rows_of(db, 1)}
+    assert hashes == {"served": chunk_content_hash("served", "old-model"), "older": None}
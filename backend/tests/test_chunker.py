@@ -0,0 +1,78 @@
+import time
+from app.ai.chunker import StreamingChunker, approximate_token_count, iter_sentences
+
+TEXT = (
+    "Photosynthesis converts light into chemical energy. Chlorophyll absorbs red and blue light! "
+    "Does it reflect green? Yes.\n\nThe Calvin cycle fixes carbon (in the stroma.) It needs ATP.\n"
+    "“Quoted sentence.” Next one follows."
+)
+
+
+def pieces_of(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_sentences_cover_the_text_with_correct_offsets():
+    sentences = list(iter_sentences(TEXT))
+    assert "".join(sentence for _, sentence in sentences) == TEXT
+    for start, sentence in sentences:
+        assert TEXT[start:start + len(sentence)] == sentence
+    assert sentences[0][1] == "Photosynthesis converts light into chemical energy. "
+
+
+def test_piece_boundaries_do_not_change_sentences():
+    expected = list(iter_sentences(TEXT))
+    for size in (1, 2, 3, 7, 50):
+        assert list(iter_sentences(pieces_of(TEXT, size))) == expected
+
+
+def test_text_without_boundaries_is_cut_at_word_boundaries():
+    text = " ".join(f"word{i}" for i in range(5000))
+    sentences = list(iter_sentences(pieces_of(text, 100), max_chars=1000))
+    assert "".join(sentence for _, sentence in sentences) == text
+    assert max(len(sentence) for _, sentence in sentences) <= 1000
+    assert all(sentence.endswith(" ") for _, sentence in sentences[:-1])
+
+
+def test_unbroken_text_is_hard_cut():
+    sentences = list(iter_sentences("x" * 2500, max_chars=1000))
+    assert [len(sentence) for _, sentence in sentences] == [1000, 1000, 500]
+
+
+def test_many_small_pieces_stay_linear():
+    text = "lorem ipsum dolor " * 20000  # 360k chars, no sentence breaks
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_sentences(pieces_of(text, 16)))
+    assert count > 0
+    assert time.perf_counter() - started < 5.0
+
+
+def test_chunks_respect_the_token_budget_and_overlap():
+    chunker = StreamingChunker(max_tokens=20, overlap_tokens=8)
+    chunks = list(chunker.chunks(TEXT * 3, material_id=7))
+    assert [chunk["chunk_id"] for chunk in chunks] == [f"7_{i}" for i in range(len(chunks))]
+    for chunk in chunks:
+        assert approximate_token_count(chunk["chunk_text"]) <= 20
+        assert (TEXT * 3)[chunk["start_pos"]:chunk["end_pos"]].strip() == chunk["chunk_text"]
+    # Consecutive chunks overlap by whole sentences
+    assert any(later["start_pos"] < earlier["end_pos"] for earlier, later in zip(chunks, chunks[1:]))
+
+
+def test_streamed_and_whole_text_chunk_identically():
+    chunker = StreamingChunker(max_tokens=25, overlap_tokens=5)
+    assert list(chunker.chunks(pieces_of(TEXT, 5), 1)) == list(chunker.chunks(TEXT, 1))
+
+
+def test_long_sentence_is_split_at_words():
+    chunker = StreamingChunker(max_tokens=10)
+    chunks = list(chunker.chunks(" ".join(["alpha"] * 35), 1))
+    assert len(chunks) == 4
+    assert all(approximate_token_count(chunk["chunk_text"]) <= 10 for chunk in chunks)
+
+
+def test_last_chunk_ends_the_text_and_is_never_only_overlap():
+    chunker = StreamingChunker(max_tokens=20, overlap_tokens=8)
+    chunks = list(chunker.chunks(TEXT, 1))
+    assert chunks[-1]["end_pos"] == len(TEXT.rstrip())
+    assert chunks[-1]["end_pos"] > chunks[-2]["end_pos"]
+    assert list(chunker.chunks(["", "  \n"], 1)) == []
@@ -0,0 +1,60 @@
+import numpy as np
+from app.ai.chunker import approximate_token_count
+from app.ai.context_builder import ContextBuilder, format_context, join_overlapping, merge_chunks, mmr_order
+
+
+def chunk(id, material_id, text, start=None, end=None, rank=0, embedding=(1.0, 0.0)):
+    metadata = {"start_pos": start, "end_pos": end} if start is not None else None
+    return {
+        "id": id, "material_id": material_id, "chunk_text": text, "metadata": metadata,
+        "rank": rank, "similarity": None, "embedding": list(embedding)
+    }
+
+
+def test_mmr_skips_near_duplicates():
+    relevance = np.array([0.9, 0.89, 0.5], dtype=np.float32)
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+    assert mmr_order(relevance, vectors @ vectors.T, lambda_=0.5) == [0, 2, 1]
+    # lambda 1 is plain relevance order
+    assert mmr_order(relevance, vectors @ vectors.T, lambda_=1.0) == [0, 1, 2]
+    assert mmr_order(relevance, vectors @ vectors.T, limit=1) == [0]
+
+
+def test_join_overlapping_drops_shared_text():
+    assert join_overlapping("one two three", "three four", 5) == "one two three four"
+    assert join_overlapping("alpha", "beta", 0) == "alpha beta"
+
+
+def test_merge_chunks_joins_overlapping_ranges_of_one_material():
+    passages = merge_chunks([
+        chunk(1, 10, "one two three", 0, 13, rank=1),
+        chunk(2, 10, "three four", 8, 18, rank=0),
+        chunk(3, 10, "far away", 100, 108, rank=2),
+        chunk(4, 20, "other material", 0, 14, rank=3),
+    ])
+    assert [passage["ids"] for passage in passages] == [[1, 2], [3], [4]]
+    assert passages[0]["text"] == "one two three four"
+    assert passages[0]["rank"] == 0
+
+
+def test_merge_chunks_keeps_chunks_without_positions():
+    passages = merge_chunks([chunk(1, 10, "no span", rank=0), chunk(2, 10, "also none", rank=1)])
+    assert [passage["ids"] for passage in passages] == [[1], [2]]
+
+
+def test_builder_respects_token_budget_and_deduplicates():
+    candidates = [
+        chunk(1, 10, "photosynthesis makes sugar", 0, 27, embedding=(1.0, 0.0)),
+        chunk(2, 10, "photosynthesis makes sugar", 0, 27, embedding=(1.0, 0.0)),
+        chunk(3, 20, "mitochondria make atp", 0, 21, embedding=(0.6, 0.8)),
+        chunk(4, 30, " ".join(["filler"] * 50), 0, 350, embedding=(0.9, 0.1)),
+    ]
+    builder = ContextBuilder(approximate_token_count, max_tokens=10, mmr_lambda=0.5)
+    passages = builder.build(np.array([1.0, 0.0]), candidates)
+    ids = [i for passage in passages for i in passage["ids"]]
+    assert 4 not in ids  # Alone over budget
+    assert 3 in ids
+    assert format_context(passages).count("photosynthesis") == 1
+    assert sum(approximate_token_count(passage["text"]) for passage in passages) <= 10
+    assert passages[0]["similarity"] == 1.0
+    assert format_context(passages).startswith("[Similarity: 1.00] photosynthesis makes sugar")
@@ -0,0 +1,82 @@
+import threading
+import numpy as np
+import pytest
+from app.ai.embedding_batcher import EmbeddingBatcher
+
+
+class RecordingEncoder:
+    def __init__(self, gate=None):
+        self.calls = []
+        self.gate = gate
+        self.entered = threading.Event()
+
+    def __call__(self, texts):
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls.append(list(texts))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_one_encode_call():
+    gate = threading.Event()
+    encoder = RecordingEncoder(gate)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait=0.0)
+    # The first text occupies the worker until the rest are queued behind it
+    first = batcher.submit("a")
+    assert encoder.entered.wait(5)
+    futures = [batcher.submit(text) for text in ("bb", "ccc", "bb")]
+    gate.set()
+    try:
+        assert first.result(5)[0] == 1
+        assert [future.result(5)[0] for future in futures] == [2, 3, 2]
+        # Duplicate texts in one batch are encoded once
+        assert encoder.calls == [["a"], ["bb", "ccc"]]
+        stats = batcher.stats()
+        assert stats["items"] == 4 and stats["batches"] == 2
+    finally:
+        batcher.stop()
+
+
+def test_batches_are_capped_at_max_batch_size():
+    gate = threading.Event()
+    encoder = RecordingEncoder(gate)
+    batcher = EmbeddingBatcher(encoder, max_batch_size=2, max_wait=0.05)
+    futures = [batcher.submit(str(i)) for i in range(5)]
+    gate.set()
+    try:
+        for future in futures:
+            future.result(5)
+        assert all(len(call) <= 2 for call in encoder.calls)
+        assert sum(len(call) for call in encoder.calls) == 5
+    finally:
+        batcher.stop()
+
+
+def test_encode_errors_reach_every_caller():
+    def failing(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher(failing, max_wait=0.0)
+    try:
+        with pytest.raises(RuntimeError, match="model unavailable"):
+            batcher.embed("question", timeout=5)
+    finally:
+        batcher.stop()
+
+
+async def test_embed_async_resolves_on_the_event_loop():
+    batcher = EmbeddingBatcher(RecordingEncoder(), max_wait=0.0)
+    try:
+        vector = await batcher.embed_async("four")
+        assert vector.dtype == np.float32
+        assert vector.tolist() == [4.0, 1.0]
+    finally:
+        batcher.stop()
+
+
+def test_stop_finishes_queued_work():
+    batcher = EmbeddingBatcher(RecordingEncoder(), max_wait=0.0)
+    future = batcher.submit("done")
+    batcher.stop()
+    assert future.result(5)[0] == 4
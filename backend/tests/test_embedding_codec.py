@@ -0,0 +1,85 @@
+import json
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.ai.embedding_codec import (
+    decode_embedding,
+    decode_embedding_matrix,
+    embedding_nbytes,
+    encode_embedding,
+    get_storage_dtype
+)
+from app.ai.vector_index import load_embedding_rows
+from app.models.content import Material, MaterialEmbedding
+from app.workers import embedding_backfill
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 0.0), ("float16", 1e-3)])
+def test_binary_round_trip(dtype, tolerance):
+    vector = np.array([0.25, -1.5, 3.0e-4], dtype=np.float32)
+    packed = encode_embedding(vector, dtype)
+    assert len(packed) == embedding_nbytes(3, dtype)
+    decoded = decode_embedding(packed, dtype)
+    assert decoded.dtype == np.float32
+    assert np.allclose(decoded, vector, atol=tolerance)
+
+
+def test_legacy_json_rows_decode_from_text_and_bytes():
+    assert decode_embedding("[1.0, 2.0]", None).tolist() == [1.0, 2.0]
+    assert decode_embedding(memoryview(b"[3, 4]"), None).tolist() == [3.0, 4.0]
+
+
+def test_matrix_decoding_matches_row_decoding():
+    rows = [encode_embedding([i, i + 0.5], "float16") for i in range(3)]
+    matrix = decode_embedding_matrix(rows, "float16", 2)
+    assert matrix.shape == (3, 2)
+    assert np.array_equal(matrix, np.vstack([decode_embedding(row, "float16") for row in rows]))
+
+
+def test_unknown_storage_dtype_is_rejected():
+    with pytest.raises(ValueError, match="bfloat16"):
+        get_storage_dtype("bfloat16")
+
+
+def store(db, row_id, vector, dtype="float32", material_id=1):
+    embedding = json.dumps(list(vector)).encode("utf-8") if dtype is None else encode_embedding(vector, dtype)
+    db.add(MaterialEmbedding(
+        id=row_id, material_id=material_id, chunk_id=f"{material_id}_{row_id}", chunk_text=f"chunk {row_id}",
+        embedding=embedding, embedding_dtype=dtype
+    ))
+
+
+def test_load_rows_mixes_binary_and_legacy_and_skips_bad_sizes(db):
+    db.add(Material(id=1, title="m", subject_id=4, uploaded_by=1))
+    store(db, 1, [1.0, 0.0, 0.0])
+    store(db, 2, [0.0, 2.0, 0.0], "float16")
+    store(db, 3, [0.0, 0.0, 3.0], None)
+    store(db, 4, [1.0, 1.0], "float32")
+    db.commit()
+
+    matrix, ids, material_ids, subject_ids = load_embedding_rows(db, 3)
+    assert sorted(ids.tolist()) == [1, 2, 3]
+    assert subject_ids.tolist() == [4, 4, 4]
+    by_id = dict(zip(ids.tolist(), matrix))
+    assert by_id[3].tolist() == [0.0, 0.0, 1.0]
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+
+
+def test_backfill_rewrites_legacy_rows_as_binary(db, monkeypatch):
+    engine = db.get_bind()
+    monkeypatch.setattr(embedding_backfill, "engine", engine)
+    monkeypatch.setattr(embedding_backfill, "SessionLocal", sessionmaker(bind=engine))
+    db.add(Material(id=1, title="m", subject_id=1, uploaded_by=1))
+    store(db, 1, [0.5, 0.25], None)
+    store(db, 2, [1.0, 0.0], "float32")
+    db.commit()
+
+    result = embedding_backfill.backfill_embeddings(batch_size=1, dtype="float16")
+    assert result["status"] == "success"
+    assert result["converted"] == 1
+    assert result["bytes_after"] == embedding_nbytes(2, "float16")
+
+    db.expire_all()
+    row = db.get(MaterialEmbedding, 1)
+    assert row.embedding_dtype == "float16"
+    assert decode_embedding(row.embedding, row.embedding_dtype).tolist() == [0.5, 0.25]
@@ -0,0 +1,130 @@
+import socket
+import socketserver
+import threading
+import numpy as np
+import pytest
+from app.ai.embedding_remote import (
+    OP_ENCODE,
+    OP_INFO,
+    STATUS_ERROR,
+    SHAPE,
+    STATUS_OK,
+    EmbeddingClient,
+    EmbeddingModelMismatch,
+    EmbeddingServerError,
+    encode_matrix,
+    encode_request,
+    encode_response,
+    read_request,
+    read_response
+)
+from app.workers.embedding_server import EmbeddingRequestHandler
+
+
+class FakeEmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        super().__init__(socket_path, EmbeddingRequestHandler)
+
+    def encode(self, texts):
+        if "fail" in texts:
+            raise RuntimeError("encoder crashed")
+        return np.array([[len(text), 0.5] for text in texts], dtype=np.float32)
+
+    def info(self):
+        return {"model": "fake", "dimension": 2}
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = FakeEmbeddingServer(str(tmp_path / "embed.sock"))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_round_trip():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_request(OP_ENCODE, ["héllo", "", "wörld"]))
+        assert read_request(right) == (OP_ENCODE, ["héllo", "", "wörld"])
+
+
+def test_response_round_trip_carries_the_matrix():
+    matrix = np.arange(6, dtype=np.float64).reshape(2, 3)
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_response(STATUS_OK, encode_matrix(matrix)))
+        status, payload = read_response(right)
+    assert status == STATUS_OK
+    assert SHAPE.unpack_from(payload) == (2, 3)
+    assert payload[SHAPE.size:] == matrix.astype("<f4").tobytes()
+
+
+def test_bad_magic_is_rejected():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(b"XXXX" + encode_request(OP_INFO)[4:])
+        with pytest.raises(ValueError, match="magic"):
+            read_request(right)
+
+
+def test_client_encodes_over_a_pooled_connection(server):
+    client = EmbeddingClient(server.server_address, timeout=5, pool_size=2)
+    try:
+        vectors = client.encode(["a", "abc"])
+        assert vectors.dtype == np.float32
+        assert vectors.tolist() == [[1.0, 0.5], [3.0, 0.5]]
+        # The connection goes back to the pool and is reused
+        assert client._pool.qsize() == 1
+        assert client.info() == {"model": "fake", "dimension": 2}
+        assert client._pool.qsize() == 1
+    finally:
+        client.close()
+
+
+def test_client_surfaces_server_errors(server):
+    client = EmbeddingClient(server.server_address, timeout=5)
+    try:
+        with pytest.raises(EmbeddingServerError, match="encoder crashed"):
+            client.encode(["fail"])
+        # An error status keeps the connection usable
+        assert client.encode(["ok"]).shape == (1, 2)
+    finally:
+        client.close()
+
+
+def test_client_reports_an_unreachable_server(tmp_path):
+    client = EmbeddingClient(str(tmp_path / "missing.sock"), timeout=1)
+    with pytest.raises(EmbeddingServerError):
+        client.encode(["text"])
+
+
+def test_error_status_payload_is_the_message():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_response(STATUS_ERROR, b"boom"))
+        assert read_response(right) == (STATUS_ERROR, b"boom")
+
+
+def test_client_accepts_the_expected_model(server):
+    client = EmbeddingClient(server.server_address, timeout=5, expected_model="fake", expected_dimension=2)
+    try:
+        assert client.encode(["abc"]).tolist() == [[3.0, 0.5]]
+        assert client._verified
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize("model, dimension", [("other-model", 2), ("fake", 384)])
+def test_client_refuses_a_server_with_another_model(server, model, dimension):
+    client = EmbeddingClient(server.server_address, timeout=5, expected_model=model, expected_dimension=dimension)
+    with pytest.raises(EmbeddingModelMismatch, match="serves fake \\(2 dims\\)"):
+        client.encode(["abc"])
+    # Still refused on the next call; nothing from the wrong model is ever returned
+    with pytest.raises(EmbeddingModelMismatch):
+        client.encode(["abc"])
+    assert client._pool.qsize() == 0
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import pytest
+from app.utils.executor import BoundedExecutor
+from app.utils.histogram import bucket, observe
+
+
+@pytest.mark.parametrize("value, label", [(0.2, "le_1ms"), (1, "le_1ms"), (7, "le_10ms"), (10.5, "inf")])
+def test_bucket_labels_by_first_upper_bound(value, label):
+    assert bucket(value, (1, 5, 10), "ms") == label
+
+
+def test_observe_counts_per_bucket():
+    histogram = {}
+    for value in (1, 3, 4, 200):
+        observe(histogram, value, (2, 4, 8))
+    assert histogram == {"le_2": 1, "le_4": 2, "inf": 1}
+
+
+async def test_calls_beyond_max_workers_queue_instead_of_spawning_threads():
+    executor = BoundedExecutor("test-pool", max_workers=2)
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+    peak = 0
+
+    def work(i):
+        nonlocal peak
+        with lock:
+            running.append(i)
+            peak = max(peak, len(running))
+        release.wait(5)
+        with lock:
+            running.remove(i)
+        return threading.current_thread().name
+
+    tasks = [asyncio.create_task(executor.run(work, i)) for i in range(5)]
+    while executor.stats()["active"] < 2:
+        await asyncio.sleep(0.01)
+    assert executor.stats()["queued"] == 3
+    release.set()
+    names = await asyncio.gather(*tasks)
+
+    assert peak == 2
+    assert len(set(names)) <= 2 and all(name.startswith("test-pool") for name in names)
+    stats = executor.stats()
+    assert (stats["submitted"], stats["completed"], stats["queued"], stats["active"]) == (5, 5, 0, 0)
+    assert sum(stats["wait_histogram"].values()) == sum(stats["run_histogram"].values()) == 5
+    executor.shutdown()
+
+
+async def test_exceptions_reach_the_caller_and_count_as_failures():
+    executor = BoundedExecutor("failing", max_workers=1)
+
+    def boom():
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        await executor.run(boom)
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    stats = executor.stats()
+    assert (stats["completed"], stats["failed"]) == (2, 1)
+    executor.shutdown()
+
+
+async def test_pool_is_recreated_after_shutdown():
+    executor = BoundedExecutor("restart", max_workers=1)
+    assert await executor.run(lambda value: value * 2, value=21) == 42
+    executor.shutdown()
+    assert executor._pool is None
+    assert await executor.run(len, "abc") == 3
+    executor.shutdown()
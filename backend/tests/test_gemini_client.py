@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import pytest
+from app.ai import gemini_client as gemini_client_module
+from app.ai.gemini_client import CHAT_ERROR_RESPONSE, GeminiClient
+from app.ai.llm_providers import FakeLLMProvider, GeminiProvider
+from app.core.config import settings
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def unconfigured_gemini(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "gemini")
+    monkeypatch.setattr(settings, "GEMINI_API_KEY", "")
+    return GeminiClient()
+
+
+def test_provider_is_built_on_first_use(monkeypatch):
+    built = []
+    build = gemini_client_module.build_llm_provider
+    monkeypatch.setattr(gemini_client_module, "build_llm_provider", lambda: built.append(1) or build())
+    client = GeminiClient()
+    assert built == []
+    assert isinstance(client.provider, FakeLLMProvider)
+    assert client.provider is client.provider
+    assert built == [1]
+
+
+async def test_unbuilt_provider_is_not_created_to_be_closed(monkeypatch):
+    client = GeminiClient()
+    monkeypatch.setattr(gemini_client_module, "build_llm_provider", lambda: pytest.fail("built at shutdown"))
+    await client.aclose()
+
+
+async def test_missing_key_answers_with_the_error_response(unconfigured_gemini):
+    assert isinstance(unconfigured_gemini.provider, GeminiProvider)
+    assert await unconfigured_gemini.agenerate_chat_response("What is osmosis?") == CHAT_ERROR_RESPONSE
+    assert unconfigured_gemini.generate_chat_response("What is osmosis?") == CHAT_ERROR_RESPONSE
+    chunks = [chunk async for chunk in unconfigured_gemini.agenerate_streaming_response("What is osmosis?")]
+    assert chunks == [CHAT_ERROR_RESPONSE]
+    await unconfigured_gemini.aclose()
+
+
+@pytest.mark.parametrize("module", [
+    "app.ai.gemini_client",
+    pytest.param("app.api.api_v1.endpoints.chat", marks=pytest.mark.skipif(
+        importlib.util.find_spec("email_validator") is None, reason="the chat schemas need email-validator"
+    )),
+])
+def test_modules_import_with_gemini_selected_and_no_key(module):
+    # A fresh interpreter, since the module-level client of this one was built with the test settings
+    env = {**os.environ, "LLM_PROVIDER": "gemini", "GEMINI_API_KEY": ""}
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {module}"], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
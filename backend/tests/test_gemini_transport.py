@@ -0,0 +1,185 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.ai.gemini_transport import GeminiError, GeminiTransport, is_blocked, response_text
+
+MODEL = "gemini-test"
+
+
+def answer(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+def make_transport(handler, api_key="test-key", **kwargs):
+    transport = GeminiTransport(api_key, base_url="https://gemini.test/v1beta", **kwargs)
+    transport._client = httpx.AsyncClient(
+        base_url=transport.base_url,
+        headers={"x-goog-api-key": api_key},
+        transport=httpx.MockTransport(handler)
+    )
+    return transport
+
+
+def sse(*events, delay=0.0):
+    async def body():
+        for event in events:
+            await asyncio.sleep(delay)
+            yield f"data: {json.dumps(event)}\n\n".encode()
+    return body()
+
+
+async def test_missing_key_fails_calls_not_construction():
+    transport = GeminiTransport("")
+    with pytest.raises(GeminiError, match="GEMINI_API_KEY"):
+        await transport.generate(MODEL, "hi")
+    with pytest.raises(GeminiError, match="GEMINI_API_KEY"):
+        await transport.stream(MODEL, "hi").__anext__()
+    assert transport.stats()["requests"] == 0
+
+
+async def test_generate_posts_the_prompt_with_the_key():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=answer("Photosynthesis."))
+
+    transport = make_transport(handler)
+    payload = await transport.generate(MODEL, "What is photosynthesis?", generation_config={"temperature": 0})
+
+    assert response_text(payload) == "Photosynthesis."
+    request = seen[0]
+    assert request.url.path == f"/v1beta/models/{MODEL}:generateContent"
+    assert request.headers["x-goog-api-key"] == "test-key"
+    body = json.loads(request.content)
+    assert body["contents"][0]["parts"][0]["text"] == "What is photosynthesis?"
+    assert body["generationConfig"] == {"temperature": 0}
+    assert transport.stats()["requests"] == 1 and transport.stats()["errors"] == 0
+
+
+def refuse(request):
+    raise httpx.ConnectError("refused")
+
+
+@pytest.mark.parametrize("handler, status_code, message", [
+    (lambda request: httpx.Response(429, text="quota exceeded"), 429, "returned 429: quota exceeded"),
+    (lambda request: httpx.Response(500, text="x" * 2000), 500, "returned 500"),
+    (refuse, None, "request failed: refused"),
+])
+async def test_upstream_failures_become_gemini_errors(handler, status_code, message):
+    transport = make_transport(handler)
+    with pytest.raises(GeminiError, match=message) as caught:
+        await transport.generate(MODEL, "hi")
+    assert caught.value.status_code == status_code
+    assert len(str(caught.value)) < 600
+    stats = transport.stats()
+    assert (stats["requests"], stats["errors"], stats["in_flight"][MODEL]) == (1, 1, 0)
+
+
+async def test_blocked_prompt_is_returned_not_raised():
+    transport = make_transport(lambda request: httpx.Response(200, json={"promptFeedback": {"blockReason": "SAFETY"}}))
+    assert is_blocked(await transport.generate(MODEL, "hi"))
+
+
+async def test_generate_timeout_counts_and_frees_the_slot():
+    async def hang(request):
+        await asyncio.sleep(5)
+
+    transport = make_transport(hang, max_concurrency_per_model=1)
+    with pytest.raises(GeminiError, match="timed out"):
+        await transport.generate(MODEL, "hi", timeout=0.05)
+    assert transport.stats()["timeouts"] == 1
+    assert transport.stats()["in_flight"][MODEL] == 0
+    assert not transport._model_slots[MODEL].locked()
+
+
+async def test_per_model_slots_queue_calls_of_one_model_only():
+    release = asyncio.Event()
+    entered = []
+
+    async def handler(request):
+        entered.append(request.url.path.split("/")[-1])
+        await release.wait()
+        return httpx.Response(200, json=answer("ok"))
+
+    transport = make_transport(handler, max_concurrency=4, max_concurrency_per_model=1)
+    calls = [asyncio.create_task(transport.generate(model, "hi")) for model in (MODEL, MODEL, "other")]
+    await asyncio.sleep(0.05)
+
+    # The second call of MODEL waits for its slot, the other model's call does not
+    assert sorted(entered) == ["gemini-test:generateContent", "other:generateContent"]
+    assert transport.stats()["queued"] == 1
+    assert transport.stats()["in_flight"] == {MODEL: 1, "other": 1}
+    release.set()
+    await asyncio.gather(*calls)
+    stats = transport.stats()
+    assert stats["requests"] == 3 and stats["queued"] == 0
+    assert sum(stats["wait_histogram"].values()) == 3
+
+
+async def test_global_slots_bound_all_models():
+    release = asyncio.Event()
+    entered = []
+
+    async def handler(request):
+        entered.append(request)
+        await release.wait()
+        return httpx.Response(200, json=answer("ok"))
+
+    transport = make_transport(handler, max_concurrency=2, max_concurrency_per_model=2)
+    calls = [asyncio.create_task(transport.generate(f"model-{i}", "hi")) for i in range(3)]
+    await asyncio.sleep(0.05)
+    assert len(entered) == 2
+    release.set()
+    await asyncio.gather(*calls)
+    assert len(entered) == 3
+
+
+async def test_stream_yields_server_sent_events():
+    transport = make_transport(lambda request: httpx.Response(200, content=sse(answer("Light "), answer("energy."))))
+    events = [event async for event in transport.stream(MODEL, "hi")]
+    assert "".join(response_text(event) for event in events) == "Light energy."
+    assert transport.stats()["requests"] == 1
+
+
+async def test_stream_deadline_covers_the_first_event():
+    # Each read is quick on its own, but the first event never arrives within the deadline
+    async def keepalive():
+        for _ in range(20):
+            await asyncio.sleep(0.02)
+            yield b": keepalive\n\n"
+        yield f"data: {json.dumps(answer('late'))}\n\n".encode()
+
+    transport = make_transport(lambda request: httpx.Response(200, content=keepalive()))
+    with pytest.raises(GeminiError, match="sent no event within 0.1s"):
+        [event async for event in transport.stream(MODEL, "hi", timeout=0.1)]
+    assert transport.stats()["timeouts"] == 1
+    assert transport.stats()["in_flight"][MODEL] == 0
+
+
+async def test_stream_events_after_the_first_may_exceed_the_deadline():
+    transport = make_transport(lambda request: httpx.Response(200, content=sse(*[answer("x")] * 4, delay=0.04)))
+    events = [event async for event in transport.stream(MODEL, "hi", timeout=0.1)]
+    assert len(events) == 4
+
+
+async def test_stream_error_status_is_mapped():
+    transport = make_transport(lambda request: httpx.Response(503, text="overloaded"))
+    with pytest.raises(GeminiError, match="returned 503: overloaded") as caught:
+        await transport.stream(MODEL, "hi").__anext__()
+    assert caught.value.status_code == 503
+    assert transport.stats()["errors"] == 1
+
+
+async def test_closing_a_stream_early_releases_its_slot_without_an_error():
+    transport = make_transport(
+        lambda request: httpx.Response(200, content=sse(*[answer("x")] * 10)), max_concurrency_per_model=1
+    )
+    stream = transport.stream(MODEL, "hi")
+    await stream.__anext__()
+    assert transport.stats()["in_flight"][MODEL] == 1
+    await stream.aclose()
+    stats = transport.stats()
+    assert stats["in_flight"][MODEL] == 0 and stats["errors"] == 0
+    assert not transport._model_slots[MODEL].locked()
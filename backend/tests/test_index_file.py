@@ -0,0 +1,132 @@
+import os
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.ai import index_file
+from app.ai.embedding_codec import encode_embedding
+from app.ai.index_file import ALIGNMENT, MappedIndexFile, read_index_version, write_index_file
+from app.core.config import settings
+from app.models.content import Material, MaterialEmbedding
+from app.workers import export_vector_index
+
+DIMENSION = settings.VECTOR_DIMENSION
+
+
+def unit_rows(count, seed=0):
+    matrix = np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def write_snapshot(path, count=6, version=None, seed=0):
+    ids = np.arange(1, count + 1)
+    return write_index_file(
+        str(path), unit_rows(count, seed), ids, ids * 10, np.repeat([1, 2], count // 2), int(ids.max()), version
+    )
+
+
+def test_round_trip_maps_aligned_zero_copy_arrays(tmp_path):
+    path = tmp_path / "index.bin"
+    version = write_snapshot(path, version=42)
+
+    mapped = MappedIndexFile.open(str(path), DIMENSION)
+    assert (mapped.version, mapped.rows, mapped.dimension, mapped.high_water_id) == (42, 6, DIMENSION, 6)
+    assert version == 42 == read_index_version(str(path))
+    assert np.allclose(mapped.matrix, unit_rows(6))
+    assert mapped.ids.tolist() == [1, 2, 3, 4, 5, 6]
+    assert mapped.material_ids.tolist() == [10, 20, 30, 40, 50, 60]
+    assert mapped.subject_ids.tolist() == [1, 1, 1, 2, 2, 2]
+    assert not mapped.matrix.flags.writeable
+    for array in (mapped.matrix, mapped.ids, mapped.material_ids, mapped.subject_ids):
+        assert array.__array_interface__["data"][0] % ALIGNMENT == 0
+
+
+def test_unusable_files_are_ignored(tmp_path):
+    path = tmp_path / "index.bin"
+    assert MappedIndexFile.open(str(path), DIMENSION) is None
+    assert read_index_version(str(path)) is None
+
+    write_snapshot(path)
+    assert MappedIndexFile.open(str(path), DIMENSION + 1) is None
+
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    assert MappedIndexFile.open(str(path), DIMENSION) is None
+
+    path.write_bytes(b"not an index" + data[12:])
+    assert MappedIndexFile.open(str(path), DIMENSION) is None
+    assert read_index_version(str(path)) is None
+
+
+def test_rewrite_replaces_the_file_without_touching_open_mappings(tmp_path):
+    path = tmp_path / "index.bin"
+    write_snapshot(path, version=1)
+    old = MappedIndexFile.open(str(path), DIMENSION)
+    old_inode = os.stat(path).st_ino
+
+    write_snapshot(path, version=2, seed=1)
+    assert os.stat(path).st_ino != old_inode
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+    # The old mapping still reads the old snapshot
+    assert old.version == 1
+    assert np.allclose(old.matrix, unit_rows(6))
+    assert MappedIndexFile.open(str(path), DIMENSION).version == 2
+
+
+def test_failed_write_leaves_the_current_snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "index.bin"
+    write_snapshot(path, version=1)
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(index_file.os, "fsync", crash)
+    with pytest.raises(OSError):
+        write_snapshot(path, version=2)
+    assert read_index_version(str(path)) == 1
+    assert os.listdir(tmp_path) == ["index.bin"]
+
+
+def test_rag_remaps_only_when_the_version_changes(tmp_path, monkeypatch, db, rag):
+    path = tmp_path / "index.bin"
+    monkeypatch.setattr(settings, "RAG_INDEX_FILE", str(path))
+    monkeypatch.setattr(settings, "RAG_ANN_ENABLED", False)
+    assert not rag._remap_if_changed(db)
+
+    write_snapshot(path, version=1)
+    assert rag._remap_if_changed(db)
+    assert len(rag.vector_index) == 6
+    assert not rag._remap_if_changed(db)
+
+    write_snapshot(path, count=8, version=2, seed=1)
+    assert rag._remap_if_changed(db)
+    assert len(rag.vector_index) == 8
+    query = unit_rows(8, seed=1)[7]
+    assert rag.vector_index.search(query, limit=1, subject_id=2)[0][0] == 8
+
+
+def test_export_writes_what_the_database_holds(tmp_path, monkeypatch, db):
+    engine = db.get_bind()
+    monkeypatch.setattr(export_vector_index, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(settings, "RAG_ANN_ENABLED", False)
+    vectors = unit_rows(4)
+    for material_id, subject_id in ((1, 2), (2, 1)):
+        db.add(Material(id=material_id, title="m", subject_id=subject_id, uploaded_by=1))
+    for row_id, vector in enumerate(vectors, start=1):
+        db.add(MaterialEmbedding(
+            id=row_id, material_id=1 + row_id % 2, chunk_id=str(row_id), chunk_text="text",
+            embedding=encode_embedding(vector), embedding_dtype="float32"
+        ))
+    db.commit()
+
+    path = tmp_path / "export" / "index.bin"
+    result = export_vector_index.export_vector_index(str(path))
+    mapped = MappedIndexFile.open(str(path), DIMENSION)
+
+    assert result["embeddings"] == 4 and result["shards"] == 2
+    assert result["version"] == mapped.version
+    assert mapped.high_water_id == 4
+    # Sorted by subject: material 2 (subject 1) holds the odd rows
+    assert mapped.subject_ids.tolist() == [1, 1, 2, 2]
+    assert sorted(mapped.ids[:2].tolist()) == [1, 3]
+    for row, embedding_id in enumerate(mapped.ids.tolist()):
+        assert np.allclose(mapped.matrix[row], vectors[embedding_id - 1], atol=1e-6)
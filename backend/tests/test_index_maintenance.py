@@ -0,0 +1,83 @@
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.ai import vector_index as vector_index_module
+from app.ai.embedding_codec import encode_embedding
+from app.ai.vector_index import IndexSegment, VectorIndex
+from app.models.content import Material, MaterialEmbedding
+
+AXES = np.eye(4, dtype=np.float32)
+
+
+def insert(db, row_id, material_id, axis):
+    if db.get(Material, material_id) is None:
+        db.add(Material(id=material_id, title="m", subject_id=1, uploaded_by=1))
+    db.add(MaterialEmbedding(
+        id=row_id, material_id=material_id, chunk_id=f"{material_id}_{row_id}", chunk_text="text",
+        embedding=encode_embedding(AXES[axis]), embedding_dtype="float32"
+    ))
+    db.commit()
+
+
+def best(index, axis):
+    return index.search(AXES[axis], limit=1)[0][0]
+
+
+def test_rows_written_by_other_processes_arrive_as_deltas(db):
+    insert(db, 1, 10, 0)
+    index = VectorIndex(4)
+    index.load_from_db(db)
+    insert(db, 2, 11, 1)
+    insert(db, 3, 11, 2)
+
+    assert index.refresh_from_db(db) == 2
+    assert index.refresh_from_db(db) == 0
+    assert index.delta_stats()["delta_rows"] == 2
+    assert best(index, 2) == 3
+
+
+def test_reconcile_drops_materials_deleted_elsewhere(db):
+    insert(db, 1, 10, 0)
+    insert(db, 2, 11, 1)
+    index = VectorIndex(4)
+    index.load_from_db(db)
+
+    db.query(MaterialEmbedding).filter(MaterialEmbedding.material_id == 10).delete()
+    db.commit()
+    assert index.reconcile_with_db(db) == [10]
+    assert len(index) == 1
+    assert index.reconcile_with_db(db) == []
+
+
+def test_removal_while_compacting_is_not_lost(db, monkeypatch):
+    for row_id, material_id in ((1, 10), (2, 11), (3, 12)):
+        insert(db, row_id, material_id, row_id)
+    index = VectorIndex(4)
+    index.load_from_db(db)
+    index.remove_material(12)
+
+    merge = IndexSegment.merge
+
+    def merge_racing_a_delete(segments, ann=None, precision="float32"):
+        merged = merge(segments, ann, precision)
+        index.remove_material(11)
+        return merged
+
+    monkeypatch.setattr(vector_index_module.IndexSegment, "merge", staticmethod(merge_racing_a_delete))
+    assert index.compact()
+    assert len(index) == 1
+    assert [hit for hit, _ in index.search(AXES[2], limit=3)] == [1]
+
+
+def test_maintenance_pass_compacts_when_deltas_grow(db, rag, monkeypatch):
+    monkeypatch.setattr(settings, "RAG_INDEX_COMPACT_DELTA_SEGMENTS", 0)
+    rag.vector_index = VectorIndex(4)
+    insert(db, 1, 10, 0)
+    rag.vector_index.load_from_db(db)
+    insert(db, 2, 11, 3)
+
+    report = rag.run_index_maintenance(sessionmaker(bind=db.get_bind()))
+    assert report["added"] == 1
+    assert report["compacted"] == 1
+    assert rag.vector_index.delta_stats() == {"main_rows": 2, "delta_segments": 0, "delta_rows": 0, "tombstones": 0}
+    assert best(rag.vector_index, 3) == 2
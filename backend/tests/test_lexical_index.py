@@ -0,0 +1,130 @@
+import threading
+from app.ai.lexical_index import LexicalIndex, index_terms, query_terms, reciprocal_rank_fusion
+from app.models.content import Material, MaterialEmbedding
+
+
+def build_index():
+    index = LexicalIndex()
+    index.add_documents([
+        (1, 10, 1, "Chủ nghĩa duy vật biện chứng"),
+        (2, 20, 1, "CS101 introduction to Python programming"),
+        (3, 30, 2, "Chủ nghĩa xã hội khoa học"),
+        (4, 40, 1, "Python python python data structures"),
+    ])
+    return index
+
+
+def test_ascii_tokens_are_stored_once_folded():
+    assert index_terms("CS101 Python") == ["~cs101", "~python"]
+
+
+def test_accented_tokens_keep_raw_and_folded_forms():
+    assert index_terms("Vật") == ["vật", "~vat"]
+
+
+def test_query_terms_match_raw_only_when_typed_with_diacritics():
+    assert query_terms("vật lý") == ["vật", "lý"]
+    assert query_terms("vat ly") == ["~vat", "~ly"]
+
+
+def test_unaccented_query_finds_accented_text():
+    ids = [embedding_id for embedding_id, _ in build_index().search("chu nghia duy vat")]
+    assert ids[0] == 1
+
+
+def test_accented_query_prefers_exact_diacritics():
+    index = LexicalIndex()
+    index.add_documents([(1, 1, 1, "ma"), (2, 2, 1, "má")])
+    assert [embedding_id for embedding_id, _ in index.search("má")] == [2]
+
+
+def test_course_codes_and_term_frequency_rank():
+    index = build_index()
+    assert [embedding_id for embedding_id, _ in index.search("cs101")] == [2]
+    assert [embedding_id for embedding_id, _ in index.search("python")] == [4, 2]
+
+
+def test_document_length_counts_tokens_not_terms():
+    index = LexicalIndex()
+    index.add_documents([(1, 1, 1, "vật lý"), (2, 2, 1, "vat ly")])
+    assert list(index._doc_lengths) == [2, 2]
+
+
+def test_subject_filter():
+    ids = [embedding_id for embedding_id, _ in build_index().search("chu nghia", subject_id=2)]
+    assert ids == [3]
+
+
+def test_removed_materials_disappear_and_compact_keeps_results():
+    index = build_index()
+    index.remove_materials([20])
+    assert [embedding_id for embedding_id, _ in index.search("python")] == [4]
+    assert len(index) == 3
+
+    before = index.search("chu nghia")
+    assert index.compact()
+    assert index.stats()["tombstones"] == 0
+    assert index.search("chu nghia") == before
+    assert not index.compact()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    scores = dict(reciprocal_rank_fusion([[1, 2, 3], [2, 1, 4]], k=60))
+    assert scores[1] == scores[2] == 1 / 61 + 1 / 62
+    assert scores[3] == scores[4] == 1 / 63
+    assert [item for item, _ in reciprocal_rank_fusion([[5, 6], [6]])] == [6, 5]
+
+
+def test_writers_and_readers_can_interleave():
+    index = build_index()
+    errors = []
+    done = threading.Event()
+
+    def write():
+        try:
+            for i in range(2000):
+                index.add_documents([(100 + i, 100 + i, 1, f"python chunk {i}")])
+                if i % 50 == 0:
+                    index.remove_materials([100 + i - 25])
+        except Exception as exc:  # BufferError if a NumPy view outlived the lock
+            errors.append(exc)
+        finally:
+            done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                index.search("python chunk", limit=5)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write), threading.Thread(target=read), threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_reload_keeps_serving_the_old_index_until_swapped(db, monkeypatch):
+    db.add(Material(id=1, title="m", subject_id=1, uploaded_by=1))
+    for row_id, text in ((1, "photosynthesis in leaves"), (2, "photosynthesis needs light")):
+        db.add(MaterialEmbedding(id=row_id, material_id=1, chunk_id=str(row_id), chunk_text=text, embedding=b""))
+    db.commit()
+
+    index = LexicalIndex()
+    index.add_documents([(1, 1, 1, "photosynthesis in leaves")])
+    seen_during_reload = []
+    load_rows = LexicalIndex._load_rows
+
+    def observed_load_rows(self, *args, **kwargs):
+        seen_during_reload.append(index.search("photosynthesis"))
+        count = load_rows(self, *args, **kwargs)
+        seen_during_reload.append(index.search("photosynthesis"))
+        return count
+
+    monkeypatch.setattr(LexicalIndex, "_load_rows", observed_load_rows)
+    assert index.load_from_db(db) == 2
+    assert [[embedding_id for embedding_id, _ in hits] for hits in seen_during_reload] == [[1], [1]]
+    assert sorted(embedding_id for embedding_id, _ in index.search("photosynthesis")) == [1, 2]
+    assert index.high_water_id == 2
@@ -0,0 +1,59 @@
+import json
+from app.ai.llm_cache import LLMResponseCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get_cache(self, key):
+        value = self.data.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set_cache(self, key, value, ttl=None):
+        self.data[key] = json.dumps(value)
+        return True
+
+
+def test_key_covers_template_version_model_and_inputs():
+    key = LLMResponseCache.key("quiz", 1, "model", "text", 5)
+    assert key.startswith("llm_response:quiz:")
+    assert key == LLMResponseCache.key("quiz", 1, "model", "text", 5)
+    assert key != LLMResponseCache.key("quiz", 2, "model", "text", 5)
+    assert key != LLMResponseCache.key("quiz", 1, "other", "text", 5)
+    assert key != LLMResponseCache.key("quiz", 1, "model", "text", 6)
+
+
+def test_hits_return_independent_copies():
+    cache = LLMResponseCache({"quiz": 60})
+    questions = [{"question": "Why?", "options": ["a", "b"]}]
+    cache.set("quiz", "k", questions)
+    questions[0]["options"].append("mutated after set")
+
+    first = cache.get("quiz", "k")
+    first[0]["options"].append("mutated by a caller")
+    assert cache.get("quiz", "k") == [{"question": "Why?", "options": ["a", "b"]}]
+    assert cache.stats()["method_hits"] == {"quiz": 2}
+
+
+def test_bypass_and_disabled_miss():
+    cache = LLMResponseCache({"quiz": 60})
+    cache.set("quiz", "k", [1])
+    assert cache.get("quiz", "k", bypass=True) is None
+    assert cache.stats()["bypassed"] == 1
+
+    disabled = LLMResponseCache({"quiz": 60}, enabled=False)
+    disabled.set("quiz", "k", [1])
+    assert disabled.get("quiz", "k") is None
+
+
+def test_redis_tier_fills_the_local_tier():
+    redis = FakeRedis()
+    LLMResponseCache({"debate": 60}, redis_service=redis).set("debate", "k", {"topic": "Energy"})
+
+    cache = LLMResponseCache({"debate": 60}, redis_service=redis)
+    value = cache.get("debate", "k")
+    value["topic"] = "mutated"
+    redis.data.clear()
+    assert cache.get("debate", "k") == {"topic": "Energy"}
+    assert cache.stats()["redis_hits"] == 1
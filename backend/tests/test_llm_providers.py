@@ -0,0 +1,63 @@
+import json
+import pytest
+from app.ai import llm_providers
+from app.ai.gemini_transport import GeminiError, is_blocked, response_text
+from app.ai.llm_providers import FakeLLMProvider, build_llm_provider
+
+
+def fake(**options):
+    options = {"latency_distribution": "fixed", "latency_ms": 0.0, "tokens_per_second": 0.0, **options}
+    return FakeLLMProvider(**options)
+
+
+async def test_fake_answers_are_deterministic_per_prompt():
+    provider = fake()
+    first = response_text(await provider.generate("model", "Explain photosynthesis"))
+    assert first == response_text(await provider.generate("model", "Explain photosynthesis"))
+    assert first != response_text(await provider.generate("model", "Explain gravity"))
+
+
+async def test_fake_quiz_prompt_returns_parseable_questions():
+    payload = await fake().generate("model", "Generate 3 quiz questions from this material")
+    questions = json.loads(response_text(payload))
+    assert len(questions) == 3
+    assert {"question", "options", "correct_answer"} <= set(questions[0])
+
+
+async def test_fake_stream_chunks_add_up_to_the_answer():
+    provider = fake(chunk_tokens=4)
+    chunks = [response_text(payload) async for payload in provider.stream("model", "Explain energy")]
+    assert len(chunks) > 1
+    assert "".join(chunks) == response_text(await provider.generate("model", "Explain energy"))
+    assert provider.stats()["requests"] == 2
+
+
+async def test_fake_injects_errors_blocks_and_timeouts():
+    with pytest.raises(GeminiError):
+        await fake(error_rate=1.0).generate("model", "prompt")
+    assert is_blocked(await fake(block_rate=1.0).generate("model", "prompt"))
+
+    hung = fake(timeout_rate=1.0, timeout=0.01)
+    with pytest.raises(GeminiError, match="timed out"):
+        await hung.generate("model", "prompt")
+    assert hung.stats()["timeouts"] == 1
+
+
+def test_fake_sync_calls_match_async_shape():
+    provider = fake()
+    payload = provider.generate_sync("model", "Explain energy")
+    assert "".join(response_text(chunk) for chunk in provider.stream_sync("model", "Explain energy")) == response_text(payload)
+
+
+async def test_gemini_without_a_key_builds_but_fails_each_call(monkeypatch):
+    monkeypatch.setattr(llm_providers.settings, "LLM_PROVIDER", "gemini")
+    monkeypatch.setattr(llm_providers.settings, "GEMINI_API_KEY", "")
+    provider = build_llm_provider()
+    with pytest.raises(GeminiError, match="GEMINI_API_KEY"):
+        await provider.generate("gemini-pro", "hi")
+
+
+def test_unknown_provider_is_rejected(monkeypatch):
+    monkeypatch.setattr(llm_providers.settings, "LLM_PROVIDER", "other")
+    with pytest.raises(ValueError, match="Unknown LLM_PROVIDER"):
+        build_llm_provider()
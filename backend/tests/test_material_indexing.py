@@ -0,0 +1,57 @@
+import numpy as np
+from app.ai.embedding_codec import decode_embedding
+from app.models.content import Material, MaterialEmbedding
+
+
+def sentences(topic, count):
+    return " ".join(f"Sentence {i} about {topic} number {i * 7}." for i in range(count))
+
+
+def test_materials_share_encode_batches_and_insert_every_chunk(db, rag):
+    for material_id in (1, 2):
+        db.add(Material(id=material_id, title="m", subject_id=1, uploaded_by=1))
+    db.commit()
+
+    batches = []
+    encode = rag.generate_embeddings
+    rag.generate_embeddings = lambda texts, batch_size=None: batches.append(len(texts)) or encode(texts)
+
+    counts = rag.create_embeddings_for_materials([(1, sentences("cells", 30)), (2, sentences("atoms", 30))], db, batch_size=4)
+    stored = db.query(MaterialEmbedding).order_by(MaterialEmbedding.id).all()
+
+    assert counts[1] > 1 and counts[2] > 1
+    assert len(stored) == counts[1] + counts[2]
+    # Chunks of both materials are encoded together in full batches
+    assert batches[:-1] == [4] * (len(batches) - 1)
+    assert sum(batches) == len(stored)
+    assert {row.material_id for row in stored} == {1, 2}
+    assert all(row.metadata_["end_pos"] > row.metadata_["start_pos"] for row in stored)
+
+
+def test_stored_vectors_match_the_encoder(db, rag):
+    db.add(Material(id=1, title="m", subject_id=1, uploaded_by=1))
+    db.commit()
+    assert rag.create_embeddings_for_material("Mitochondria produce ATP for the cell.", 1, db)
+
+    row = db.query(MaterialEmbedding).one()
+    assert np.allclose(decode_embedding(row.embedding, row.embedding_dtype), rag.generate_embeddings([row.chunk_text])[0])
+
+
+def test_encode_failure_rolls_back_the_whole_call(db, rag):
+    db.add(Material(id=1, title="m", subject_id=1, uploaded_by=1))
+    db.commit()
+
+    encode = rag.generate_embeddings
+    calls = []
+
+    def fail_second_batch(texts, batch_size=None):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise RuntimeError("model crashed")
+        return encode(texts)
+
+    rag.generate_embeddings = fail_second_batch
+    assert rag.create_embeddings_for_materials([(1, sentences("cells", 30))], db, batch_size=2) is None
+    # The first batch was already inserted; it must not survive the failure
+    assert len(calls) == 2
+    assert db.query(MaterialEmbedding).count() == 0
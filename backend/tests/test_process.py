@@ -0,0 +1,35 @@
+import builtins
+import importlib
+import sys
+from app.utils import process
+
+
+def test_rss_is_measured_here():
+    assert process.current_rss_bytes() > 0
+    assert process.peak_rss_bytes() >= process.current_rss_bytes() // 2
+
+
+def test_unmeasurable_rss_formats_as_na():
+    assert process.rss_delta(None, 10) is None
+    assert process.bytes_to_mb(None) is None
+    assert process.format_mb(process.bytes_to_mb(3 * 1024 * 1024)) == "3 MB"
+    assert process.format_mb(None) == "n/a"
+
+
+def test_imports_without_resource_module(monkeypatch):
+    real_import = builtins.__import__
+
+    def no_resource(name, *args, **kwargs):
+        if name in ("resource", "psutil"):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_resource)
+    monkeypatch.delitem(sys.modules, "resource", raising=False)
+    try:
+        reloaded = importlib.reload(process)
+        assert reloaded.resource is None
+        assert reloaded.peak_rss_bytes() is None
+    finally:
+        monkeypatch.setattr(builtins, "__import__", real_import)
+        importlib.reload(process)
@@ -0,0 +1,83 @@
+import base64
+import time
+import numpy as np
+from app.ai.query_cache import QueryEmbeddingCache, normalize_query
+from app.utils.cache import LRUCache
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get_cache(self, key):
+        return self.data.get(key)
+
+    def set_cache(self, key, value, ttl=None):
+        self.data[key] = value
+        return True
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl=10)
+    cache.set("a", 1)
+    now[0] += 11
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_equivalent_questions_share_an_entry():
+    assert normalize_query("  What IS   photosynthesis? ") == normalize_query("what is photosynthesis?")
+    cache = QueryEmbeddingCache("model", max_size=8, ttl=60)
+    cache.set("What is photosynthesis?", np.array([1.0, 2.0]))
+    vector = cache.get("what  is PHOTOSYNTHESIS?")
+    assert vector.dtype == np.dtype("<f4")
+    assert vector.tolist() == [1.0, 2.0]
+    # Cached vectors are shared between callers, so they are read-only
+    assert not vector.flags.writeable
+
+
+def test_redis_tier_is_keyed_by_model_and_fills_the_local_tier():
+    redis = DictRedis()
+    QueryEmbeddingCache("model-a", max_size=8, ttl=60, redis_service=redis).set("question", np.array([0.5, 0.25]))
+
+    other_model = QueryEmbeddingCache("model-b", max_size=8, ttl=60, redis_service=redis)
+    assert other_model.get("question") is None
+
+    worker = QueryEmbeddingCache("model-a", max_size=8, ttl=60, redis_service=redis)
+    assert worker.get("question").tolist() == [0.5, 0.25]
+    redis.data.clear()
+    assert worker.get("question").tolist() == [0.5, 0.25]
+    assert worker.stats()["redis_hits"] == 1
+
+
+def test_corrupt_redis_entries_are_misses():
+    redis = DictRedis()
+    cache = QueryEmbeddingCache("model", max_size=8, ttl=60, redis_service=redis)
+    redis.data[cache._redis_key("question")] = base64.b64encode(b"\x00\x01\x02").decode("ascii")
+    assert cache.get("question") is None
+    assert cache.stats()["redis_misses"] == 1
+
+
+def test_repeated_queries_are_embedded_once(rag):
+    calls = []
+    encode = rag.generate_embeddings
+    rag.generate_embeddings = lambda texts, batch_size=None: calls.append(texts) or encode(texts)
+    rag.embedding_batcher = None
+
+    first = rag.embed_query("How do plants make food?")
+    second = rag.embed_query("how do plants  make food?")
+    assert np.array_equal(first, second)
+    assert len(calls) == 1
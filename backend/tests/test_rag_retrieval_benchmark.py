@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmark_smoke_run(tmp_path):
+    output = tmp_path / "report.json"
+    subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.rag_retrieval",
+            "--chunks", "300", "--subjects", "2", "--queries", "10", "--precision", "float32",
+            "--output", str(output)
+        ],
+        cwd=BACKEND_DIR,
+        check=True,
+        timeout=300
+    )
+
+    report = json.loads(output.read_text())
+    assert report["ingest"]["chunks"] > 0
+    vector = report["paths"]["search_similar_content[vector]"]
+    assert vector["p50_ms"] <= vector["p99_ms"]
+    # Exact search over the float32 index must find the brute-force top k
+    assert vector["recall_at_5"] == 1.0
+    assert "get_relevant_context" in report["paths"]
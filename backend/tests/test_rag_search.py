@@ -0,0 +1,50 @@
+import numpy as np
+from app.ai.vector_index import normalize_vectors, top_k
+from app.models.content import Material
+
+PHOTOSYNTHESIS = "Photosynthesis turns light energy into chemical energy inside the chloroplast."
+NEWTON = "Newton's second law relates force, mass and acceleration of a moving body."
+ROMANS = "The Roman republic elected two consuls every year to lead the senate."
+
+
+def add_material(db, material_id, subject_id, content):
+    db.add(Material(id=material_id, title=f"Material {material_id}", content=content, subject_id=subject_id, uploaded_by=1))
+    db.commit()
+
+
+def test_normalize_vectors_keeps_zero_rows():
+    vectors = normalize_vectors(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, [[0.6, 0.8], [0.0, 0.0]])
+
+
+def test_top_k_sorts_best_first():
+    ids, scores = top_k(np.array([10, 11, 12, 13]), np.array([0.1, 0.9, 0.5, 0.7]), 3)
+    assert ids.tolist() == [11, 13, 12]
+    assert scores.tolist() == [0.9, 0.7, 0.5]
+
+
+def test_search_finds_the_material_a_question_is_about(db, rag):
+    add_material(db, 1, 1, PHOTOSYNTHESIS)
+    add_material(db, 2, 1, NEWTON)
+    add_material(db, 3, 2, ROMANS)
+    rag.create_embeddings_for_materials([(1, PHOTOSYNTHESIS), (2, NEWTON), (3, ROMANS)], db)
+    assert rag.load_vector_index(db) == 3
+
+    results = rag.search_similar_content("light energy chloroplast", db, limit=2)
+    assert results[0]["material_id"] == 1
+    assert results[0]["chunk_text"] == PHOTOSYNTHESIS
+    assert results[0]["similarity"] > results[1]["similarity"]
+
+    # The subject filter never returns another subject's chunks
+    assert {result["material_id"] for result in rag.search_similar_content("consuls senate", db, subject_id=1)} == {1, 2}
+
+
+def test_similarity_threshold_drops_weak_matches(db, rag):
+    add_material(db, 1, 1, PHOTOSYNTHESIS)
+    rag.create_embeddings_for_materials([(1, PHOTOSYNTHESIS)], db)
+    rag.load_vector_index(db)
+
+    rag.similarity_threshold = 0.99
+    assert rag.search_similar_content("consuls senate", db) == []
+    assert rag.search_similar_content(PHOTOSYNTHESIS, db)[0]["material_id"] == 1
@@ -0,0 +1,103 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.models.content import Material, MaterialEmbedding
+from app.workers import embedding_backfill
+
+# Imports the RQ worker module, which needs the pinned rq 1.x
+reembed_corpus = pytest.importorskip("app.workers.reembed_corpus", exc_type=ImportError)
+
+TARGET = settings.RAG_INDEX_VERSION + 1
+
+
+class CrashAfter:
+    """write_page stand-in that fails once `pages` pages have been written"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.written = []
+
+    def __call__(self, material_ids, rows, index_version):
+        if len(self.written) == self.pages:
+            raise RuntimeError("worker killed")
+        self.written.append(material_ids)
+        write_page(material_ids, rows, index_version)
+
+
+write_page = reembed_corpus.write_page
+
+
+@pytest.fixture
+def corpus(db, rag, monkeypatch, tmp_path):
+    """Three materials, a thread pool in place of worker processes, and the checkpoint path"""
+    engine = db.get_bind()
+    monkeypatch.setattr(reembed_corpus, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(embedding_backfill, "engine", engine)
+    monkeypatch.setattr(reembed_corpus, "rag_service", rag)
+    monkeypatch.setattr(reembed_corpus, "ProcessPoolExecutor", lambda workers, mp_context=None: ThreadPoolExecutor(workers))
+    for material_id in (1, 2, 3):
+        db.add(Material(
+            id=material_id, title="m", subject_id=1, uploaded_by=1,
+            content=f"Material {material_id} covers enzymes. It also covers membranes.",
+            created_at=datetime(2024, 1, 1)
+        ))
+    db.commit()
+    return tmp_path / "reembed.json"
+
+
+def embedded(db, version=TARGET):
+    return sorted({row.material_id for row in db.query(MaterialEmbedding).filter(MaterialEmbedding.index_version == version)})
+
+
+def run(checkpoint, **kwargs):
+    return reembed_corpus.reembed_corpus(TARGET, workers=1, page_size=1, checkpoint_path=str(checkpoint), **kwargs)
+
+
+def test_serving_version_is_refused(corpus):
+    with pytest.raises(ValueError, match="being served"):
+        reembed_corpus.reembed_corpus(settings.RAG_INDEX_VERSION, checkpoint_path=str(corpus))
+
+
+def test_crashed_run_resumes_after_the_last_committed_page(db, corpus, monkeypatch):
+    crash = CrashAfter(pages=1)
+    monkeypatch.setattr(reembed_corpus, "write_page", crash)
+    with pytest.raises(RuntimeError):
+        run(corpus)
+    checkpoint = json.loads(corpus.read_text())
+    assert checkpoint["last_material_id"] == 1 and "finished" not in checkpoint
+    assert embedded(db) == [1]
+
+    resumed = CrashAfter(pages=100)
+    monkeypatch.setattr(reembed_corpus, "write_page", resumed)
+    result = run(corpus)
+    # Only the pages after the checkpoint are embedded again (plus nothing new for catch-up)
+    assert resumed.written == [[2], [3]]
+    assert result["materials"] == 3 and result["updated_materials"] == 0
+    assert embedded(db) == [1, 2, 3]
+    assert embedded(db, settings.RAG_INDEX_VERSION) == []
+
+    resumed.written.clear()
+    assert run(corpus)["finished"] == result["finished"]
+    assert resumed.written == []
+
+
+def test_checkpoint_of_another_model_is_refused_unless_restarted(db, corpus, monkeypatch):
+    run(corpus)
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", "another-model")
+    with pytest.raises(ValueError, match="another run"):
+        run(corpus)
+    assert run(corpus, restart=True)["model"] == "another-model"
+
+
+def test_catch_up_selects_materials_added_or_updated_since_the_start(db, corpus):
+    started = datetime.now(timezone.utc) - timedelta(minutes=1)
+    db.add(Material(id=4, title="new", subject_id=1, uploaded_by=1, content="Added during the run."))
+    db.get(Material, 2).updated_at = datetime.now(timezone.utc)
+    db.commit()
+    assert db.get(Material, 4).updated_at is None
+
+    pages = list(reembed_corpus.read_pages(0, 10, updated_since=started))
+    assert [material_id for _, page in pages for material_id, _ in page] == [2, 4]
@@ -0,0 +1,78 @@
+import numpy as np
+from app.ai.embedding_codec import encode_embedding
+from app.ai.vector_index import ShardedVectorIndex
+from app.models.content import Material, MaterialEmbedding
+
+# (embedding id, material id, subject id, vector)
+ROWS = [
+    (1, 10, 1, [1.0, 0.0, 0.0]),
+    (2, 10, 1, [0.9, 0.1, 0.0]),
+    (3, 20, 2, [1.0, 0.05, 0.0]),
+    (4, 30, 3, [0.0, 0.0, 1.0]),
+]
+
+
+def seed(db, rows=ROWS):
+    for row_id, material_id, subject_id, vector in rows:
+        if db.get(Material, material_id) is None:
+            db.add(Material(id=material_id, title="m", subject_id=subject_id, uploaded_by=1))
+        db.add(MaterialEmbedding(
+            id=row_id, material_id=material_id, chunk_id=str(row_id), chunk_text="text",
+            embedding=encode_embedding(vector), embedding_dtype="float32"
+        ))
+    db.commit()
+
+
+def test_each_subject_gets_its_own_shard(db):
+    seed(db)
+    index = ShardedVectorIndex(3)
+    assert index.load_from_db(db) == 4
+    assert {subject_id: len(shard) for subject_id, shard in index.shards.items()} == {1: 2, 2: 1, 3: 1}
+    assert index.delta_stats()["shards"] == 3
+
+
+def test_subject_search_stays_in_its_shard_and_global_search_merges(db):
+    seed(db)
+    index = ShardedVectorIndex(3)
+    index.load_from_db(db)
+    query = np.array([1.0, 0.0, 0.0])
+
+    assert [hit for hit, _ in index.search(query, limit=5, subject_id=1)] == [1, 2]
+    assert index.search(query, limit=5, subject_id=99) == []
+    assert [hit for hit, _ in index.search(query, limit=3)] == [1, 3, 2]
+
+
+def test_generation_moves_only_for_the_changed_subject(db):
+    seed(db)
+    index = ShardedVectorIndex(3)
+    index.load_from_db(db)
+    before = {subject_id: index.generation(subject_id) for subject_id in (1, 2, 3)}
+
+    index.remove_material(20)
+    index.add([5], [10], [1], np.array([[0.0, 1.0, 0.0]]))
+    assert index.generation(1) != before[1]
+    assert index.generation(2) != before[2]
+    assert index.generation(3) == before[3]
+    assert index.generation(None) == 0
+    assert index.high_water_id == 5
+
+
+def test_rows_for_a_new_subject_create_its_shard(db):
+    seed(db)
+    index = ShardedVectorIndex(3)
+    index.load_from_db(db)
+    index.add([7, 8], [40, 50], [4, 1], np.array([[0.0, 1.0, 0.0], [0.0, 0.9, 0.1]]))
+    assert index.search(np.array([0.0, 1.0, 0.0]), limit=1, subject_id=4)[0][0] == 7
+    assert len(index.shards[1]) == 3
+
+
+def test_rebuild_shard_reloads_one_subject(db):
+    seed(db)
+    index = ShardedVectorIndex(3)
+    index.load_from_db(db)
+    db.query(MaterialEmbedding).filter(MaterialEmbedding.id == 2).delete()
+    db.commit()
+
+    assert index.rebuild_shard(db, 1) == 1
+    assert len(index.shards[1]) == 1
+    assert len(index.shards[2]) == 1
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from app.utils.single_flight import SingleFlight, flight_key
+
+
+def test_flight_key_separates_parts():
+    assert flight_key("ab", "c") != flight_key("a", "bc")
+    assert flight_key("a", "b") == flight_key("a", "b")
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test")
+    release = asyncio.Event()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "answer"
+
+    waiters = [asyncio.ensure_future(flights.run("key", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters) == ["answer"] * 3
+    assert calls == 1
+    assert flights.stats()["coalesced_calls"] == 2
+    assert flights.stats()["in_flight_calls"] == 0
+
+
+async def test_finished_calls_are_not_reused():
+    flights = SingleFlight("test")
+    results = iter(["first", "second"])
+
+    async def work():
+        return next(results)
+
+    assert await flights.run("key", work) == "first"
+    assert await flights.run("key", work) == "second"
+
+
+async def test_errors_reach_every_waiter():
+    flights = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        raise RuntimeError("upstream failed")
+
+    waiters = [asyncio.ensure_future(flights.run("key", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_shared_call_is_cancelled_only_when_every_waiter_leaves():
+    flights = SingleFlight("test")
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.ensure_future(flights.run("key", work))
+    second = asyncio.ensure_future(flights.run("key", work))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+    second.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert flights.stats()["cancelled"] == 1
+    assert flights.stats()["in_flight_calls"] == 0
+
+
+async def test_late_stream_subscriber_replays_earlier_chunks():
+    flights = SingleFlight("test")
+    step = asyncio.Event()
+    produced = 0
+
+    async def chunks():
+        nonlocal produced
+        produced += 1
+        yield "a"
+        await step.wait()
+        yield "b"
+
+    async def collect():
+        return [chunk async for chunk in flights.stream("key", chunks)]
+
+    first = asyncio.ensure_future(collect())
+    while not flights._streams or not flights._streams["key"].chunks:
+        await asyncio.sleep(0)
+    second = asyncio.ensure_future(collect())
+    await asyncio.sleep(0)
+    step.set()
+    assert await first == ["a", "b"]
+    assert await second == ["a", "b"]
+    assert produced == 1
+    assert flights.stats()["coalesced_streams"] == 1
+
+
+async def test_stream_errors_reach_subscribers():
+    flights = SingleFlight("test")
+
+    async def chunks():
+        yield "a"
+        raise RuntimeError("stream broke")
+
+    received = []
+    with pytest.raises(RuntimeError, match="stream broke"):
+        async for chunk in flights.stream("key", chunks):
+            received.append(chunk)
+    assert received == ["a"]
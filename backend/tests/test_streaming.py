@@ -0,0 +1,121 @@
+import asyncio
+import anyio
+import pytest
+from app.utils.streaming import ClientDisconnected, aclose_shielded, iterate_until_disconnected
+
+
+class Client:
+    """is_disconnected() stand-in that can leave at any time"""
+
+    def __init__(self):
+        self.gone = False
+        self.polls = 0
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.gone
+
+
+class Upstream:
+    """Model stream that yields `chunks`, then waits forever, and records how it ended"""
+
+    def __init__(self, *chunks, hang=True):
+        self.chunks = chunks
+        self.hang = hang
+        self.cancelled = False
+        self.closed = False
+
+    async def __call__(self):
+        try:
+            for chunk in self.chunks:
+                yield chunk
+            if self.hang:
+                await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            await asyncio.sleep(0)
+            self.closed = True
+
+
+async def collect(stream, client, **kwargs):
+    return [item async for item in iterate_until_disconnected(stream, client.is_disconnected, **kwargs)]
+
+
+async def test_items_pass_through_until_the_stream_ends():
+    upstream = Upstream("a", "b", hang=False)
+    assert await collect(upstream(), Client()) == ["a", "b"]
+    assert upstream.closed and not upstream.cancelled
+
+
+async def test_client_leaving_before_the_first_token_cancels_the_upstream_call():
+    client, upstream = Client(), Upstream()
+
+    async def leave():
+        await asyncio.sleep(0.03)
+        client.gone = True
+
+    asyncio.get_running_loop().create_task(leave())
+    with anyio.fail_after(1):
+        with pytest.raises(ClientDisconnected):
+            await collect(upstream(), client, poll_interval=0.01)
+    assert upstream.cancelled and upstream.closed
+    assert client.polls > 1
+
+
+async def test_cancelled_consumer_waits_for_the_upstream_cleanup():
+    # Starlette cancels the response task when it sees the disconnect itself
+    upstream = Upstream()
+    consumer = asyncio.get_running_loop().create_task(collect(upstream(), Client(), poll_interval=10))
+    await asyncio.sleep(0.02)
+    consumer.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await consumer
+    assert upstream.cancelled and upstream.closed
+
+
+async def test_client_leaving_between_chunks_is_noticed():
+    client, upstream = Client(), Upstream("first")
+    received = []
+    with pytest.raises(ClientDisconnected):
+        async for chunk in iterate_until_disconnected(upstream(), client.is_disconnected, poll_interval=0.01):
+            received.append(chunk)
+            client.gone = True
+    assert received == ["first"]
+    assert upstream.cancelled
+
+
+async def test_upstream_errors_propagate_unwrapped():
+    async def failing():
+        yield "partial"
+        raise ValueError("upstream broke")
+
+    received = []
+    with pytest.raises(ValueError, match="upstream broke"):
+        async for chunk in iterate_until_disconnected(failing(), Client().is_disconnected):
+            received.append(chunk)
+    assert received == ["partial"]
+
+
+async def test_shielded_close_finishes_cleanup_inside_a_cancelled_task():
+    upstream = Upstream("a")
+    stream = upstream()
+    assert await stream.__anext__() == "a"
+
+    with anyio.CancelScope() as scope:
+        scope.cancel()
+        await aclose_shielded(stream)
+    assert upstream.closed
+
+
+async def test_unshielded_close_in_a_cancelled_task_is_cut_short():
+    # What aclose_shielded guards against: the cleanup's first await is cancelled
+    upstream = Upstream("a")
+    stream = upstream()
+    await stream.__anext__()
+
+    with anyio.CancelScope() as scope:
+        scope.cancel()
+        await stream.aclose()
+    assert not upstream.closed
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from app.ai.index_file import MappedIndexFile, write_index_file
+from app.ai.vector_index import ShardedVectorIndex, VectorIndex, normalize_vectors
+
+DIMENSION = 8
+
+
+def corpus(rows=40, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = normalize_vectors(rng.normal(size=(rows, DIMENSION)).astype(np.float32))
+    ids = np.arange(1, rows + 1, dtype=np.int64)
+    material_ids = ids // 4
+    subject_ids = material_ids % 2
+    return matrix, ids, material_ids, subject_ids
+
+
+def loaded_index(precision="float32"):
+    index = VectorIndex(DIMENSION, precision=precision)
+    index.load_arrays(*corpus())
+    return index
+
+
+def test_exact_search_finds_the_query_row():
+    matrix, ids, _, subject_ids = corpus()
+    index = loaded_index()
+    embedding_id, score = index.search(matrix[10], limit=1)[0]
+    assert embedding_id == ids[10]
+    assert score == pytest.approx(1.0, abs=1e-5)
+    hits = index.search(matrix[10], limit=40, subject_id=1)
+    assert {subject_ids[hit - 1] for hit, _ in hits} == {1}
+
+
+def test_tombstoned_materials_disappear_without_copying_the_matrix():
+    matrix, ids, material_ids, _ = corpus()
+    index = loaded_index()
+    main_matrix = index.segments[0].matrix
+    generation = index.generation
+
+    index.remove_material(int(material_ids[10]))
+    assert index.segments[0].matrix is main_matrix
+    assert index.generation != generation
+    assert len(index) == 40 - 4
+    assert all(material_ids[hit - 1] != material_ids[10] for hit, _ in index.search(matrix[10], limit=40))
+
+
+def test_compaction_folds_deltas_and_tombstones():
+    matrix, ids, material_ids, subject_ids = corpus()
+    index = VectorIndex(DIMENSION)
+    index.load_arrays(matrix[:30], ids[:30], material_ids[:30], subject_ids[:30])
+    index.add(ids[30:].tolist(), material_ids[30:].tolist(), subject_ids[30:].tolist(), matrix[30:])
+    index.remove_material(int(material_ids[0]))
+    before = index.search(matrix[35], limit=5)
+
+    assert index.delta_stats() == {"main_rows": 30, "delta_segments": 1, "delta_rows": 10, "tombstones": 3}
+    assert index.needs_compaction(max_delta_rows=100, max_delta_segments=100, max_dead_ratio=0.05)
+    assert index.compact()
+    assert index.delta_stats() == {"main_rows": 37, "delta_segments": 0, "delta_rows": 0, "tombstones": 0}
+    after = index.search(matrix[35], limit=5)
+    assert [hit for hit, _ in after] == [hit for hit, _ in before]
+    assert [score for _, score in after] == pytest.approx([score for _, score in before])
+    assert not index.compact()
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_quantised_index_uses_less_memory_and_rescores_exactly(precision):
+    matrix, ids, _, _ = corpus()
+    exact = loaded_index()
+    quantised = loaded_index(precision)
+    assert quantised.memory_bytes() < exact.memory_bytes()
+
+    def rescore(candidates):
+        return candidates, matrix[candidates - 1]
+
+    query = matrix[5] + 0.1 * matrix[6]
+    assert quantised.search(query, limit=3, rescore=rescore) == pytest.approx(exact.search(query, limit=3))
+
+
+def test_mapped_snapshot_is_split_by_subject(tmp_path):
+    matrix, ids, material_ids, subject_ids = corpus()
+    order = np.argsort(subject_ids, kind="stable")
+    path = str(tmp_path / "index.bin")
+    write_index_file(path, matrix[order], ids[order], material_ids[order], subject_ids[order], int(ids.max()))
+
+    index = ShardedVectorIndex(DIMENSION)
+    assert index.load_mapped(MappedIndexFile.open(path, DIMENSION)) == 40
+    assert sorted(index.shards) == [0, 1]
+    assert index.search(matrix[3], limit=1, subject_id=int(subject_ids[3]))[0][0] == ids[3]
+
+
+def test_mapped_snapshot_rejects_quantised_precision(tmp_path):
+    matrix, ids, material_ids, subject_ids = corpus()
+    order = np.argsort(subject_ids, kind="stable")
+    path = str(tmp_path / "index.bin")
+    write_index_file(path, matrix[order], ids[order], material_ids[order], subject_ids[order], int(ids.max()))
+
+    with pytest.raises(ValueError, match="float32"):
+        ShardedVectorIndex(DIMENSION, precision="int8").load_mapped(MappedIndexFile.open(path, DIMENSION))